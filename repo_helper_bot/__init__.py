@@ -32,9 +32,6 @@ __license__: str = "MIT License"
 __version__: str = "0.0.0"
 __email__: str = "dominic@davis-foster.co.uk"
 
-# TODO: Sign commit
-# See https://stackoverflow.com/questions/22968856/what-is-the-file-format-of-a-git-commit-object-data-structure
-
 # Temporary workaround for https://github.com/jelmer/dulwich/issues/1546
 
 # stdlib
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+#
+#  cache.py
+"""
+Per-process caches which let repeated runs of ``repo_helper`` skip work when their inputs haven't changed.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import copy
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Iterable, List, NamedTuple, Optional, Tuple, TypeVar, Union
+
+# 3rd party
+import jinja2
+from domdf_python_tools.paths import PathPlus
+from domdf_python_tools.typing import PathLike
+from dulwich.index import blob_from_path_and_stat, cleanup_mode
+from dulwich.objects import Blob, Tree
+from dulwich.porcelain import open_repo_closing
+from dulwich.repo import Repo
+from repo_helper.core import RepoHelper  # nodep
+
+# this package
+from repo_helper_bot.utils import get_repo_helper_version
+
+__all__ = [
+		"CACHE_SIZE",
+		"LRUCache",
+		"MemoryBytecodeCache",
+		"RenderedOutputs",
+		"bytecode_cache",
+		"changed_files",
+		"outputs_cache",
+		"run_repo_helper",
+		"settings_cache",
+		]
+
+_K = TypeVar("_K")
+_V = TypeVar("_V")
+
+#: The maximum number of entries in each cache.
+CACHE_SIZE: int = int(os.environ.get("RH_BOT_CACHE_SIZE", 128))
+
+
+class LRUCache(Generic[_K, _V]):
+	"""
+	A thread-safe, size-bounded cache which discards the least recently used entries first.
+
+	:param maxsize: The maximum number of entries.
+	"""
+
+	def __init__(self, maxsize: int = CACHE_SIZE):
+		self.maxsize = maxsize
+		self.hits = 0
+		self.misses = 0
+		self._data: "OrderedDict[_K, _V]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key: _K) -> Optional[_V]:
+		"""
+		Returns the value for ``key``, or :py:obj:`None` if it isn't cached.
+
+		:param key:
+		"""
+
+		with self._lock:
+			if key not in self._data:
+				self.misses += 1
+				return None
+
+			self.hits += 1
+			self._data.move_to_end(key)
+			return self._data[key]
+
+	def put(self, key: _K, value: _V) -> None:
+		"""
+		Cache ``value`` for ``key``, discarding the least recently used entry if the cache is full.
+
+		:param key:
+		:param value:
+		"""
+
+		with self._lock:
+			self._data[key] = value
+			self._data.move_to_end(key)
+
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+
+	def __len__(self) -> int:
+		return len(self._data)
+
+
+class MemoryBytecodeCache(jinja2.BytecodeCache):
+	"""
+	Stores compiled Jinja2 templates in memory so they can be shared between environments.
+	"""
+
+	def __init__(self) -> None:
+		self._data: Dict[str, bytes] = {}
+
+	def load_bytecode(self, bucket: jinja2.bccache.Bucket) -> None:  # noqa: D102
+		if bucket.key in self._data:
+			bucket.bytecode_from_string(self._data[bucket.key])
+
+	def dump_bytecode(self, bucket: jinja2.bccache.Bucket) -> None:  # noqa: D102
+		self._data[bucket.key] = bucket.bytecode_to_string()
+
+	def clear(self) -> None:  # noqa: D102
+		self._data.clear()
+
+
+class RenderedOutputs(NamedTuple):
+	"""
+	The effect of running ``repo_helper`` on a tree.
+	"""
+
+	#: The files managed by ``repo_helper``, as returned by :meth:`RepoHelper.run() <repo_helper.core.RepoHelper.run>`.
+	managed_files: List[str]
+
+	#: The new content of files which differ from the tree. :py:obj:`None` indicates the file was deleted.
+	changes: Dict[str, Optional[bytes]]
+
+
+#: Template globals after loading ``repo_helper.yml``, keyed by ``repo_helper`` version and config blob SHA.
+settings_cache: LRUCache[Tuple[str, bytes], Dict[str, Any]] = LRUCache()
+
+#: The result of running ``repo_helper``, keyed by ``repo_helper`` version and tree SHA.
+outputs_cache: LRUCache[Tuple[str, bytes], RenderedOutputs] = LRUCache()
+
+#: Compiled templates, shared by every :class:`~repo_helper.core.RepoHelper`.
+bytecode_cache = MemoryBytecodeCache()
+
+
+def _tree_blob(repo: Repo, tree: Tree, path: str) -> Optional[bytes]:
+	try:
+		_, sha = tree.lookup_path(repo.object_store.__getitem__, path.encode("UTF-8"))
+	except KeyError:
+		return None
+
+	obj = repo[sha]
+	return obj.data if isinstance(obj, Blob) else None
+
+
+def _record_outputs(repo: Repo, tree: Tree, managed_files: List[str]) -> RenderedOutputs:
+	target = PathPlus(repo.path)
+	changes: Dict[str, Optional[bytes]] = {}
+
+	for filename in managed_files:
+		path = target / filename
+		if path.is_file():
+			content = path.read_bytes()
+			if content != _tree_blob(repo, tree, filename):
+				changes[filename] = content
+		elif not path.exists() and _tree_blob(repo, tree, filename) is not None:
+			changes[filename] = None
+
+	return RenderedOutputs(managed_files, changes)
+
+
+def _replay_outputs(repo: Repo, outputs: RenderedOutputs) -> None:
+	target = PathPlus(repo.path)
+
+	for filename, content in outputs.changes.items():
+		path = target / filename
+		if content is None:
+			path.unlink()
+		else:
+			path.parent.maybe_make(parents=True)
+			path.write_bytes(content)
+
+
+def run_repo_helper(repo: Union[Repo, PathLike]) -> List[str]:
+	"""
+	Run ``repo_helper`` on the checked-out working tree of ``repo``.
+
+	The parsed settings and compiled templates are reused between runs.
+	If ``repo_helper`` has already been run on an identical tree its outputs are written
+	without running it again.
+
+	The working tree must be clean.
+
+	:param repo:
+
+	:returns: The files managed by ``repo_helper``.
+	"""
+
+	with open_repo_closing(repo) as repo:  # pylint: disable=redefined-argument-from-local
+		return _run_repo_helper(repo)
+
+
+def _run_repo_helper(repo: Repo) -> List[str]:
+	version = get_repo_helper_version()
+	tree: Tree = repo[repo[repo.head()].tree]
+	outputs_key = (version, tree.id)
+
+	outputs = outputs_cache.get(outputs_key)
+	if outputs is not None:
+		_replay_outputs(repo, outputs)
+		return list(outputs.managed_files)
+
+	rh = RepoHelper(repo.path)
+	rh.templates.bytecode_cache = bytecode_cache
+
+	config_file = rh.target_repo / "repo_helper.yml"
+	config_sha = None
+	if not (rh.target_repo / "git_helper.yml").exists():
+		# Renaming the old config file has side effects, so don't cache it.
+		config_sha = Blob.from_string(config_file.read_bytes()).id
+
+	settings = settings_cache.get((version, config_sha)) if config_sha else None
+
+	if settings is None:
+		rh.load_settings()
+
+		# Loading the settings also rewrites configs which use removed keys, and the rewrite
+		# is part of the update, so only cache the settings of configs which are left alone.
+		if config_sha and Blob.from_string(config_file.read_bytes()).id == config_sha:
+			settings_cache.put((version, config_sha), copy.deepcopy(dict(rh.templates.globals)))
+	else:
+		rh.templates.globals.update(copy.deepcopy(settings))
+
+	managed_files = rh.run()
+	outputs_cache.put(outputs_key, _record_outputs(repo, tree, managed_files))
+
+	return managed_files
+
+
+def changed_files(repo: Repo, managed_files: Iterable[PathLike]) -> List[str]:
+	"""
+	Returns which of the files managed by ``repo_helper`` differ from the tree of the current head.
+
+	The git blob hash and mode of each file is compared with its entry in the tree,
+	so unlike ``git status`` neither the index nor the rest of the working tree is read.
+
+	:param repo:
+	:param managed_files: The files managed by ``repo_helper``, relative to the root of the repository.
+
+	:returns: The paths of the files which were added, modified or deleted, relative to the root of the repository.
+	"""
+
+	tree: Tree = repo[repo[repo.head()].tree]
+	target = PathPlus(repo.path)
+	changed = []
+
+	for filename in managed_files:
+		filename = PathPlus(filename)
+		if filename.is_absolute():
+			filename = filename.relative_to(target)
+
+		path = target / filename
+
+		try:
+			mode, sha = tree.lookup_path(repo.object_store.__getitem__, filename.as_posix().encode("UTF-8"))
+		except KeyError:
+			mode, sha = None, None
+
+		try:
+			st = os.lstat(path)
+		except FileNotFoundError:
+			if sha is not None:
+				changed.append(filename.as_posix())
+			continue
+
+		if path.is_dir():
+			continue
+
+		if sha is None or cleanup_mode(st.st_mode) != mode:
+			changed.append(filename.as_posix())
+		elif blob_from_path_and_stat(os.fsencode(path), st).id != sha:
+			changed.append(filename.as_posix())
+
+	return changed
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+#
+#  cli.py
+"""
+Command line interface for running the bot's workers and sweeps.
+
+Run ``python -m repo_helper_bot.cli worker`` to start a worker process,
+and ``python -m repo_helper_bot.cli sweep`` to sweep the installed repositories now.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import time
+
+# 3rd party
+import click  # type: ignore[import-untyped]
+
+# this package
+from repo_helper_bot.cluster import node, run_sweep
+
+__all__ = ["main"]
+
+
+@click.group()
+def main() -> None:
+	"""
+	Run the bot across several processes and hosts.
+	"""
+
+
+@main.command()
+def worker() -> None:
+	"""
+	Run queued updates until interrupted.
+	"""
+
+	# this package
+	from repo_helper_bot.scheduler import scheduler
+
+	node.role = "worker"
+	scheduler.run_jobs = True
+	scheduler.start()
+
+	while True:
+		time.sleep(60)
+
+
+@click.option("--full", is_flag=True, default=False, help="Update every installed repository.")
+@main.command()
+def sweep(full: bool = False) -> None:
+	"""
+	Queue updates for the installed repositories, unless another process is already running a sweep.
+	"""
+
+	run_sweep(full=full)
+
+
+if __name__ == "__main__":
+	main()
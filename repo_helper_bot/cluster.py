@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+#
+#  cluster.py
+"""
+Coordination between the processes running the bot, through the database.
+
+Dedicated worker processes are started with ``python -m repo_helper_bot.cli worker``.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import os
+import socket
+import threading
+import time
+from typing import Optional
+
+# 3rd party
+import sqlalchemy.exc
+from sqlalchemy import create_engine, or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+# this package
+from repo_helper_bot.constants import app
+from repo_helper_bot.db import Lease, QueuedUpdate, UpdateJob, UpdateLock, WorkerNode, db
+from repo_helper_bot.updater import run_update
+from repo_helper_bot.utils import log
+
+__all__ = [
+		"HEARTBEAT_INTERVAL",
+		"MAX_ATTEMPTS",
+		"ROLE",
+		"SWEEP_INTERVAL",
+		"SWEEP_LEASE",
+		"WORKER_TIMEOUT",
+		"Node",
+		"acquire_lease",
+		"node",
+		"recover_jobs",
+		"release_lease",
+		"run_sweep",
+		"worker_id",
+		]
+
+#: What this process does: ``web`` only queues updates, ``worker`` only runs them, and ``all`` does both.
+ROLE: str = os.environ.get("RH_BOT_ROLE", "all")
+
+#: The number of seconds between heartbeats.
+HEARTBEAT_INTERVAL: float = float(os.environ.get("RH_BOT_HEARTBEAT_INTERVAL", 10))
+
+#: The number of seconds without a heartbeat after which a process is considered dead,
+#: and its updates are returned to the queue. Also the length of the leader's lease.
+WORKER_TIMEOUT: float = float(os.environ.get("RH_BOT_WORKER_TIMEOUT", 60))
+
+#: The number of times an update is claimed before it is abandoned.
+MAX_ATTEMPTS: int = int(os.environ.get("RH_BOT_MAX_ATTEMPTS", 3))
+
+#: The number of seconds between sweeps started by the leader.
+#: ``0`` leaves sweeps to ``python -m repo_helper_bot.cli sweep``.
+SWEEP_INTERVAL: float = float(os.environ.get("RH_BOT_SWEEP_INTERVAL", 0))
+
+#: The maximum number of seconds a sweep is expected to take, after which another may start.
+SWEEP_LEASE: float = float(os.environ.get("RH_BOT_SWEEP_LEASE", 6 * 60 * 60))
+
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+
+def _heartbeat_engine() -> Engine:
+	# Heartbeats get a connection of their own, so a process which is busy with updates
+	# (or waiting for the application's pool) isn't mistaken for a dead one.
+
+	global _engine
+
+	with _engine_lock:
+		if _engine is None:
+			url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+			connect_args = {"check_same_thread": False} if url.drivername.startswith("sqlite") else {}
+			_engine = create_engine(
+					url,
+					poolclass=QueuePool,
+					pool_size=1,
+					max_overflow=0,
+					pool_pre_ping=True,
+					connect_args=connect_args,
+					)
+
+		return _engine
+
+
+def worker_id() -> str:
+	"""
+	Returns the ID of this process (``hostname:pid``), which prefixes the holder of its :class:`~.RepositoryLock`.
+	"""
+
+	return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_lease(name: str, holder: str, duration: float, session: Optional[Session] = None) -> bool:
+	"""
+	Acquire or renew the lease with the given name.
+
+	:param name:
+	:param holder: The ID of the holder of the lease.
+	:param duration: The number of seconds the lease is held for, unless renewed.
+	:param session: The session to use. Defaults to the application's session.
+
+	:returns: Whether the lease is held by ``holder``.
+	"""
+
+	session = session or db.session
+	now = time.time()
+
+	try:
+		taken = session.query(Lease).filter(
+				Lease.name == name,
+				or_(Lease.expires < now, Lease.holder == holder),
+				).update(
+						{"holder": holder, "expires": now + duration},
+						synchronize_session=False,
+						)
+
+		if not taken:
+			# Fails with an IntegrityError if another process holds the lease.
+			session.add(Lease(name=name, holder=holder, expires=now + duration))
+
+		session.commit()
+
+	except sqlalchemy.exc.IntegrityError:
+		session.rollback()
+		return False
+
+	return True
+
+
+def release_lease(name: str, holder: str) -> None:
+	"""
+	Release the lease with the given name, if it is held by ``holder``.
+
+	:param name:
+	:param holder: The ID of the holder of the lease.
+	"""
+
+	# Expire rather than delete the lease, to keep the time its task last ran.
+	Lease.query.filter_by(name=name, holder=holder).update({"expires": 0}, synchronize_session=False)
+	db.session.commit()
+
+
+def recover_jobs(session: Optional[Session] = None) -> int:
+	"""
+	Return updates claimed by processes which have stopped sending heartbeats to the queue.
+
+	Updates which have already been claimed :data:`~.MAX_ATTEMPTS` times are abandoned instead,
+	in case they are what is killing the workers.
+
+	An update is left alone while its process is still renewing its :class:`~.RepositoryLock`,
+	as the process is alive even if its heartbeats aren't getting through.
+
+	:param session: The session to use. Defaults to the application's session.
+
+	:returns: The number of updates recovered or abandoned.
+	"""
+
+	session = session or db.session
+	now = time.time()
+	cutoff = now - WORKER_TIMEOUT
+	alive = [worker.id for worker in session.query(WorkerNode).filter(WorkerNode.heartbeat >= cutoff)]
+
+	orphans = session.query(QueuedUpdate).filter(
+			QueuedUpdate.status == "running",
+			QueuedUpdate.claimed < cutoff,
+			~QueuedUpdate.claimed_by.in_(alive),
+			).all()
+
+	recovered = 0
+
+	for update in orphans:
+		locks = session.query(UpdateLock).filter(
+				UpdateLock.repo_id == update.repo_id,
+				UpdateLock.holder.startswith(f"{update.claimed_by}:"),
+				)
+
+		if locks.filter(UpdateLock.expires >= now).count():
+			continue
+
+		log(f"Recovering the update of {update.full_name} from {update.claimed_by}", type="WARNING")
+		recovered += 1
+
+		# The lock has expired, so no other update can be relying on it.
+		locks.delete(synchronize_session=False)
+
+		if update.attempts >= MAX_ATTEMPTS:
+			update.status = "error"
+			update.finished = now
+			update.error = f"Abandoned after {update.attempts} attempts, as the workers running it died."
+		else:
+			update.status = "queued"
+			update.claimed_by = None
+			update.claimed = None
+
+		if update.job_id is not None:
+			job: Optional[UpdateJob] = session.query(UpdateJob).get(update.job_id)
+			if job is not None:
+				job.status = update.status
+				job.stage = None
+				if update.status == "error":
+					job.finished = now
+					job.ret = 1
+					job.msg = update.error
+
+	session.query(WorkerNode).filter(WorkerNode.heartbeat < cutoff).delete(synchronize_session=False)
+	session.commit()
+
+	return recovered
+
+
+def run_sweep(full: bool = False) -> bool:
+	"""
+	Run a sweep over the installed repositories, unless another process is already running one.
+
+	:param full: Update every installed repository, rather than only those whose inputs have changed.
+
+	:returns: Whether the sweep ran.
+	"""
+
+	holder = worker_id()
+
+	if not acquire_lease("sweep", holder, SWEEP_LEASE):
+		log("A sweep is already running on another worker. Skipping.")
+		return False
+
+	Lease.query.filter_by(name="sweep").update({"last_run": time.time()}, synchronize_session=False)
+	db.session.commit()
+
+	try:
+		for _ in run_update(full=full):
+			pass
+	finally:
+		release_lease("sweep", holder)
+
+	return True
+
+
+class Node:
+	"""
+	Sends this process's heartbeats and, if it is elected leader, recovers updates from dead workers
+	and starts periodic sweeps.
+
+	:param role: ``web``, ``worker`` or ``all``.
+	"""
+
+	def __init__(self, role: str = ROLE):
+		self.role = role
+		self._thread: Optional[threading.Thread] = None
+		self._sweep: Optional[threading.Thread] = None
+		self._lock = threading.Lock()
+
+	def start(self) -> None:
+		"""
+		Start sending heartbeats, if this process isn't already.
+		"""
+
+		# The thread is started lazily so it is created in the gunicorn worker, not the master.
+		with self._lock:
+			if self._thread is None or not self._thread.is_alive():
+				self._thread = threading.Thread(target=self._loop, name="repo-helper-node", daemon=True)
+				self._thread.start()
+
+	def _loop(self) -> None:
+		started = time.time()
+
+		while True:
+			session = Session(bind=_heartbeat_engine())
+
+			try:
+				self.tick(started, session)
+			except sqlalchemy.exc.SQLAlchemyError as e:
+				log(f"Heartbeat failed: {e}", type="ERROR")
+				session.rollback()
+			finally:
+				session.close()
+
+			time.sleep(HEARTBEAT_INTERVAL)
+
+	def tick(self, started: float, session: Optional[Session] = None) -> None:
+		"""
+		Send a heartbeat, and carry out the leader's duties if this process is the leader.
+
+		:param started: The time this process started.
+		:param session: The session to use. Defaults to the application's session.
+		"""
+
+		session = session or db.session
+		now = time.time()
+		holder = worker_id()
+
+		session.merge(WorkerNode(id=holder, role=self.role, started=started, heartbeat=now))
+		session.commit()
+
+		if not acquire_lease("leader", holder, WORKER_TIMEOUT, session=session):
+			return
+
+		recover_jobs(session=session)
+
+		if SWEEP_INTERVAL and (self._sweep is None or not self._sweep.is_alive()):
+			sweep: Optional[Lease] = session.query(Lease).get("sweep")
+
+			if sweep is None or (sweep.last_run or 0) + SWEEP_INTERVAL <= now:
+				self._sweep = threading.Thread(target=self._run_sweep, name="repo-helper-sweep", daemon=True)
+				self._sweep.start()
+
+	@staticmethod
+	def _run_sweep() -> None:
+		try:
+			with app.app_context():
+				run_sweep()
+		except Exception as e:
+			log(f"Sweep failed: {e}", type="ERROR")
+		finally:
+			db.session.remove()
+
+
+#: Heartbeats and leader election for this process.
+node = Node()
@@ -28,13 +28,14 @@ Configuration constants.
 
 # stdlib
 import os
+import threading
 from http import HTTPStatus
 from typing import TYPE_CHECKING, Optional
 
 # 3rd party
 from flask import Flask, redirect, request, url_for
 from flask_githubapp import GitHubApp  # type: ignore
-from github3 import GitHub
+from github3 import GitHub, GitHubEnterprise
 from github3_utils.apps import ContextSwitcher
 
 if TYPE_CHECKING:
@@ -53,9 +54,13 @@ else:
 	with open(os.environ["GITHUBAPP_KEY_PATH"], "rb") as key_file:
 		GITHUBAPP_KEY = app.config["GITHUBAPP_KEY"] = key_file.read()
 
+#: The URL of a GitHub Enterprise server to use instead of github.com, such as the stand-in used by the load test.
+GITHUBAPP_URL: Optional[str] = os.environ.get("GITHUBAPP_URL")
+app.config["GITHUBAPP_URL"] = GITHUBAPP_URL
+
 github_app = GitHubApp(app)
 
-client: GitHub = GitHub()
+client: GitHub = GitHubEnterprise(GITHUBAPP_URL) if GITHUBAPP_URL else GitHub()
 
 context_switcher = ContextSwitcher(
 		client=client,
@@ -63,6 +68,9 @@ context_switcher = ContextSwitcher(
 		app_id=GITHUBAPP_ID,
 		)
 
+#: Held while using :data:`~.client` as a particular installation, as the client is shared between threads.
+client_lock = threading.RLock()
+
 if not os.environ.get("RH_BOT_IMPORTCHECK", 0):
 	context_switcher.login_as_app()
 
@@ -96,6 +104,8 @@ __all__ = [
 		"GITHUBAPP_ID",
 		"GITHUBAPP_SECRET",
 		"GITHUBAPP_KEY",
+		"GITHUBAPP_URL",
 		"BRANCH_NAME",
 		"context_switcher",
+		"client_lock",
 		]
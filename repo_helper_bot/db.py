@@ -29,25 +29,122 @@ Database connection.
 # stdlib
 import json
 import os
-from typing import List
+import sqlite3
+from typing import Any, Dict, List, Optional
 
 # 3rd party
 from domdf_python_tools.paths import PathPlus
 from flask_sqlalchemy import SQLAlchemy  # type: ignore[import-untyped]
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
 
 # this package
 from repo_helper_bot.constants import app
 
-__all__ = ["Repository"]
+__all__ = [
+		"CommitChecks",
+		"InstallationTurn",
+		"LabelBootstrap",
+		"Lease",
+		"ProfileArtifact",
+		"QueuedUpdate",
+		"Repository",
+		"RepositoryState",
+		"Rollout",
+		"SQLITE_BUSY_TIMEOUT",
+		"SQLITE_POOL_SIZE",
+		"ThrottleEvent",
+		"UpdateJob",
+		"UpdateLock",
+		"UpdateRun",
+		"UpdateRunRollup",
+		"WorkerNode",
+		]
 
-if "DATABASE_URL" in os.environ:
-	app.config["SQLALCHEMY_DATABASE_URI"] = os.environ["DATABASE_URL"]
-else:
-	app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{PathPlus.cwd()/'repo_helper.sqlite'}"
+#: The number of seconds to wait for a lock on the local SQLite database before giving up.
+SQLITE_BUSY_TIMEOUT: int = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 30))
+
+#: The number of connections each process keeps open to the local SQLite database.
+SQLITE_POOL_SIZE: int = int(os.environ.get("SQLITE_POOL_SIZE", 5))
+
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get(
+		"DATABASE_URL",
+		f"sqlite:///{PathPlus.cwd()/'repo_helper.sqlite'}",
+		)
+
+if make_url(app.config["SQLALCHEMY_DATABASE_URI"]).get_backend_name() == "sqlite":
+	# Each thread gets its own connection, so a long transaction in one can't starve the others.
+	# WAL lets readers run alongside the writer, and _begin_sqlite_write() makes sure there is only one writer.
+	app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+			"poolclass": QueuePool,
+			"pool_size": SQLITE_POOL_SIZE,
+			"max_overflow": SQLITE_POOL_SIZE,
+			"pool_timeout": SQLITE_BUSY_TIMEOUT,
+			"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT, "check_same_thread": False},
+			}
 
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-db = SQLAlchemy(app)
+# Don't expire objects on commit, otherwise reading an attribute afterwards
+# opens a new transaction which is held (along with the connection) until the next commit.
+db = SQLAlchemy(app, session_options={"expire_on_commit": False})
+
+
+@event.listens_for(Engine, "connect")
+def _configure_sqlite(dbapi_connection: Any, connection_record: Any) -> None:
+	"""
+	Enable write-ahead logging for SQLite databases so readers don't block the writer.
+
+	:param dbapi_connection:
+	:param connection_record:
+	"""
+
+	if not isinstance(dbapi_connection, sqlite3.Connection):
+		return
+
+	cursor = dbapi_connection.cursor()
+	cursor.execute("PRAGMA journal_mode=WAL")
+	cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT * 1000}")
+	# Durable across application crashes; only a power loss can roll back the last transaction.
+	cursor.execute("PRAGMA synchronous=NORMAL")
+	cursor.close()
+
+	# Don't let the driver start transactions, so reads don't hold a snapshot which a write would have to upgrade.
+	dbapi_connection.isolation_level = None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _begin_sqlite_write(
+		conn: Connection,
+		cursor: Any,
+		statement: str,
+		parameters: Any,
+		context: Any,
+		executemany: bool,
+		) -> None:
+	"""
+	Start a write transaction with ``BEGIN IMMEDIATE`` before the first write to a SQLite database.
+
+	The write lock is taken up front, waiting for the busy timeout if another connection holds it,
+	so there is only ever one writer and a transaction can't fail with ``database is locked``
+	when it tries to upgrade a read lock. Reads before the first write run without a transaction.
+
+	:param conn:
+	:param cursor:
+	:param statement:
+	:param parameters:
+	:param context:
+	:param executemany:
+	"""
+
+	dbapi_connection = conn.connection.connection
+	if not isinstance(dbapi_connection, sqlite3.Connection) or dbapi_connection.in_transaction:
+		return
+
+	if statement.lstrip()[:6].upper() not in {"SELECT", "PRAGMA"}:
+		cursor.execute("BEGIN IMMEDIATE")
 
 
 class Repository(db.Model):  # type: ignore
@@ -90,3 +187,438 @@ class Repository(db.Model):  # type: ignore
 		"""
 
 		return json.loads(self.pull_requests or "[]")
+
+
+class UpdateLock(db.Model):  # type: ignore
+	"""
+	A lease on updating a GitHub Repository, shared between all workers using the database.
+	"""
+
+	repo_id = db.Column(db.INTEGER, primary_key=True)
+
+	#: Identifies the process and thread holding the lease.
+	holder = db.Column(db.String(128), nullable=False)
+
+	#: Timestamp after which the lease may be taken over by another worker.
+	expires: float = db.Column(db.FLOAT, nullable=False)
+
+	#: Whether another update was requested while the lease was held.
+	pending = db.Column(db.BOOLEAN, nullable=False, default=False)
+
+	#: Whether any of the updates requested while the lease was held recreates the branch.
+	pending_recreate = db.Column(db.BOOLEAN, nullable=False, default=False)
+
+	def __repr__(self) -> str:
+		return f"<UpdateLock {self.repo_id} held by {self.holder!r}>"
+
+
+class RepositoryState(db.Model):  # type: ignore
+	"""
+	The inputs to the last update of a GitHub Repository, used to skip repositories which haven't changed.
+	"""
+
+	repo_id = db.Column(db.INTEGER, primary_key=True)
+
+	#: The SHA of the default branch's head which was last updated.
+	head_sha = db.Column(db.String(40))
+
+	#: The version of ``repo_helper`` last applied to the repository.
+	repo_helper_version = db.Column(db.String(128))
+
+	#: Whether the bot's pull request was open after the last update. :py:obj:`None` if unknown.
+	pr_open = db.Column(db.BOOLEAN)
+
+	def __repr__(self) -> str:
+		return f"<RepositoryState {self.repo_id} at {self.head_sha!r}>"
+
+
+class CommitChecks(db.Model):  # type: ignore
+	"""
+	The check results of a commit, as last used to label its pull requests.
+	"""
+
+	repo_id = db.Column(db.INTEGER, primary_key=True)
+	sha = db.Column(db.String(40), primary_key=True)
+
+	#: JSON list of the IDs of the check suites whose completion has been handled.
+	suites = db.Column(db.Text, nullable=False, default="[]")
+
+	#: JSON lists of the names of the failing and successful check runs.
+	failing = db.Column(db.Text, nullable=False, default="[]")
+	successful = db.Column(db.Text, nullable=False, default="[]")
+
+	updated: float = db.Column(db.FLOAT, index=True)
+
+
+class LabelBootstrap(db.Model):  # type: ignore
+	"""
+	Records that the bot's labels have been created in a GitHub Repository.
+	"""
+
+	repo_id = db.Column(db.INTEGER, primary_key=True)
+	full_name = db.Column(db.String(256))
+
+	#: :data:`~.LABELS_VERSION` when the labels were created, so changes to the labels are rolled out.
+	version = db.Column(db.String(16), nullable=False)
+
+	updated: float = db.Column(db.FLOAT)
+
+
+class ProfileArtifact(db.Model):  # type: ignore
+	"""
+	The profile of a single update of a GitHub Repository.
+	"""
+
+	id = db.Column(db.INTEGER, primary_key=True)  # noqa: A003  # pylint: disable=redefined-builtin
+	repo_id = db.Column(db.INTEGER, index=True)
+	full_name = db.Column(db.String(256))
+	created: float = db.Column(db.FLOAT, index=True)
+
+	#: The total duration of the update, in seconds.
+	duration: float = db.Column(db.FLOAT)
+
+	#: The peak resident set size during the update, in bytes, including that of the ``repo_helper`` worker.
+	peak_rss = db.Column(db.BigInteger)
+
+	#: The peak disk usage of the temporary clone, in bytes.
+	disk_usage = db.Column(db.BigInteger)
+
+	#: JSON mapping of stage names to their duration in seconds.
+	stages = db.Column(db.Text)
+
+	#: :mod:`cProfile` statistics, in the format written by :meth:`pstats.Stats.dump_stats`.
+	pstats = db.Column(db.LargeBinary)
+
+	#: Sampled stacks in the collapsed format used by ``flamegraph.pl`` and speedscope.
+	folded = db.Column(db.Text)
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""
+		Returns a summary of the profile, without the profiler output.
+		"""
+
+		return {
+				"id": self.id,
+				"repository": self.full_name,
+				"created": self.created,
+				"duration": self.duration,
+				"peak_rss": self.peak_rss,
+				"disk_usage": self.disk_usage,
+				"stages": json.loads(self.stages or "{}"),
+				}
+
+
+class Rollout(db.Model):  # type: ignore
+	"""
+	The staged rollout of a new version of ``repo_helper`` to the installed repositories.
+	"""
+
+	id = db.Column(db.INTEGER, primary_key=True)  # noqa: A003  # pylint: disable=redefined-builtin
+
+	#: The pip requirement the version is installed from.
+	requirement = db.Column(db.String(256), nullable=False)
+
+	#: The version of ``repo_helper`` being rolled out, as reported by :func:`~.get_repo_helper_version`.
+	version = db.Column(db.String(128), nullable=False)
+
+	#: ``active``, ``paused``, ``complete`` or ``aborted``.
+	status = db.Column(db.String(16), nullable=False, default="active", index=True)
+
+	#: JSON list of the percentage of repositories the version is applied to at each step.
+	steps = db.Column(db.Text, nullable=False)
+
+	#: The index of the current step in :attr:`~.Rollout.steps`.
+	step = db.Column(db.INTEGER, nullable=False, default=0)
+
+	#: JSON list of owners and ``owner/name`` full names the version is applied to from the first step.
+	cohort = db.Column(db.Text, nullable=False, default="[]")
+
+	created: float = db.Column(db.FLOAT)
+	step_started: float = db.Column(db.FLOAT)
+
+	#: The number of runs needed at each step before it can be widened.
+	min_runs = db.Column(db.INTEGER, nullable=False)
+
+	#: The fraction of runs at each step which must succeed for it to be widened.
+	min_success_rate: float = db.Column(db.FLOAT, nullable=False)
+
+	#: The minimum time, in seconds, spent at each step.
+	min_step_duration: float = db.Column(db.FLOAT, nullable=False)
+
+	#: The number of successful runs at the current step.
+	successes = db.Column(db.INTEGER, nullable=False, default=0)
+
+	#: The number of failed runs at the current step.
+	failures = db.Column(db.INTEGER, nullable=False, default=0)
+
+	@property
+	def percentage(self) -> float:
+		"""
+		The percentage of repositories the version is currently applied to.
+		"""
+
+		return json.loads(self.steps)[self.step]
+
+	def __repr__(self) -> str:
+		return f"<Rollout {self.id} of {self.version!r} at {self.percentage}% ({self.status})>"
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""
+		Returns a summary of the rollout.
+		"""
+
+		return {
+				"id": self.id,
+				"requirement": self.requirement,
+				"version": self.version,
+				"status": self.status,
+				"percentage": self.percentage,
+				"steps": json.loads(self.steps),
+				"cohort": json.loads(self.cohort),
+				"created": self.created,
+				"step_started": self.step_started,
+				"successes": self.successes,
+				"failures": self.failures,
+				}
+
+
+class UpdateJob(db.Model):  # type: ignore
+	"""
+	An update requested through the job API, and its progress.
+	"""
+
+	id = db.Column(db.String(32), primary_key=True)  # noqa: A003  # pylint: disable=redefined-builtin
+	full_name = db.Column(db.String(256))
+
+	#: ``queued``, ``running``, ``done``, ``error`` or ``cancelled``.
+	status = db.Column(db.String(16), nullable=False, default="queued")
+
+	#: The stage of the update currently running, e.g. ``clone`` or ``push``.
+	stage = db.Column(db.String(32))
+
+	#: JSON list of the stages started so far, with the time each started.
+	stages = db.Column(db.Text, nullable=False, default="[]")
+
+	submitted: float = db.Column(db.FLOAT, index=True)
+	started: float = db.Column(db.FLOAT)
+	finished: float = db.Column(db.FLOAT)
+
+	#: The fields of the :class:`~.UpdateResult`, once finished.
+	ret = db.Column(db.INTEGER)
+	pr_number = db.Column(db.INTEGER)
+	msg = db.Column(db.Text)
+
+	#: The full traceback of the exception which caused the update to fail, if any.
+	traceback = db.Column(db.Text)
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""
+		Returns the progress of the job, and its result once finished.
+		"""
+
+		return {
+				"id": self.id,
+				"repository": self.full_name,
+				"status": self.status,
+				"stage": self.stage,
+				"stages": json.loads(self.stages or "[]"),
+				"submitted": self.submitted,
+				"started": self.started,
+				"finished": self.finished,
+				"result": None if self.finished is None else {
+						"ret": self.ret,
+						"pr_number": self.pr_number,
+						"msg": self.msg,
+						"traceback": self.traceback,
+						},
+				}
+
+
+class UpdateRun(db.Model):  # type: ignore
+	"""
+	The outcome and measurements of a single update of a GitHub Repository.
+	"""
+
+	__table_args__ = (db.Index("ix_update_run_full_name_started", "full_name", "started"), )
+
+	id = db.Column(db.INTEGER, primary_key=True)  # noqa: A003  # pylint: disable=redefined-builtin
+	repo_id = db.Column(db.INTEGER)
+	full_name = db.Column(db.String(256))
+
+	#: What requested the update, e.g. ``push``, ``sweep`` or ``comment``.
+	trigger = db.Column(db.String(16))
+
+	started: float = db.Column(db.FLOAT, index=True)
+
+	#: The total duration of the update, in seconds.
+	duration: float = db.Column(db.FLOAT)
+
+	#: JSON mapping of stage names to their duration in seconds.
+	stages = db.Column(db.Text)
+
+	#: The number of bytes downloaded by the clone.
+	bytes_cloned = db.Column(db.BigInteger)
+
+	#: The number of files changed by ``repo_helper``.
+	files_changed = db.Column(db.INTEGER)
+
+	#: The number of requests made to the GitHub API.
+	api_calls = db.Column(db.INTEGER)
+
+	#: The fields of the :class:`~.UpdateResult`.
+	ret = db.Column(db.INTEGER)
+	pr_number = db.Column(db.INTEGER)
+	msg = db.Column(db.Text)
+
+	#: The type of the exception which caused the update to fail, if any.
+	error = db.Column(db.String(128))
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""
+		Returns the run as a dictionary.
+		"""
+
+		return {
+				"id": self.id,
+				"repository": self.full_name,
+				"trigger": self.trigger,
+				"started": self.started,
+				"duration": self.duration,
+				"stages": json.loads(self.stages or "{}"),
+				"bytes_cloned": self.bytes_cloned,
+				"files_changed": self.files_changed,
+				"api_calls": self.api_calls,
+				"ret": self.ret,
+				"pr_number": self.pr_number,
+				"msg": self.msg,
+				"error": self.error,
+				}
+
+
+class UpdateRunRollup(db.Model):  # type: ignore
+	"""
+	A day's :class:`~.UpdateRun` entries for a GitHub Repository, summarised once they are too old to keep.
+	"""
+
+	#: The UTC date of the runs, as ``YYYY-MM-DD``.
+	day = db.Column(db.String(10), primary_key=True)
+	full_name = db.Column(db.String(256), primary_key=True)
+
+	runs = db.Column(db.INTEGER, nullable=False)
+	failures = db.Column(db.INTEGER, nullable=False)
+
+	#: The median and 95th percentile duration of the runs, in seconds.
+	p50: Optional[float] = db.Column(db.FLOAT)
+	p95: Optional[float] = db.Column(db.FLOAT)
+
+
+class QueuedUpdate(db.Model):  # type: ignore
+	"""
+	An update waiting for, or claimed by, one of the bot's workers.
+	"""
+
+	__table_args__ = (db.Index("ix_queued_update_status_priority", "status", "priority", "submitted"), )
+
+	id = db.Column(db.String(32), primary_key=True)  # noqa: A003  # pylint: disable=redefined-builtin
+	repo_id = db.Column(db.INTEGER)
+	full_name = db.Column(db.String(256))
+
+	#: The account the repository belongs to.
+	installation = db.Column(db.String(128))
+
+	#: The repository, as returned by the GitHub API, as JSON.
+	repository = db.Column(db.Text, nullable=False)
+
+	#: The :class:`~.Priority` of the update.
+	priority = db.Column(db.INTEGER, nullable=False)
+	recreate = db.Column(db.BOOLEAN, nullable=False, default=False)
+	wait = db.Column(db.FLOAT, nullable=False, default=0)
+	trigger = db.Column(db.String(16))
+
+	#: The :class:`~.UpdateJob` following the update, if it was requested through the job API.
+	job_id = db.Column(db.String(32))
+
+	#: ``queued``, ``running``, ``done``, ``error`` or ``cancelled``.
+	status = db.Column(db.String(16), nullable=False, default="queued")
+
+	submitted: float = db.Column(db.FLOAT, nullable=False)
+
+	#: The worker running the update, and when it claimed it.
+	claimed_by = db.Column(db.String(256), index=True)
+	claimed: float = db.Column(db.FLOAT)
+
+	#: The number of times the update has been claimed.
+	attempts = db.Column(db.INTEGER, nullable=False, default=0)
+
+	finished: float = db.Column(db.FLOAT, index=True)
+
+	#: The fields of the :class:`~.UpdateResult`, once finished.
+	ret = db.Column(db.INTEGER)
+	pr_number = db.Column(db.INTEGER)
+	msg = db.Column(db.Text)
+
+	#: The exception which caused the update to fail, if any.
+	error = db.Column(db.Text)
+
+
+class InstallationTurn(db.Model):  # type: ignore
+	"""
+	When each installation last had a queued update claimed, so workers in every process take turns between them.
+	"""
+
+	#: The login of the account the installation belongs to.
+	installation = db.Column(db.String(128), primary_key=True)
+
+	served: float = db.Column(db.FLOAT, nullable=False)
+
+
+class WorkerNode(db.Model):  # type: ignore
+	"""
+	A process running the bot, and when it was last known to be alive.
+	"""
+
+	#: ``hostname:pid``.
+	id = db.Column(db.String(256), primary_key=True)  # noqa: A003  # pylint: disable=redefined-builtin
+
+	#: ``web``, ``worker`` or ``all``.
+	role = db.Column(db.String(16))
+
+	started: float = db.Column(db.FLOAT)
+	heartbeat: float = db.Column(db.FLOAT, index=True)
+
+
+class Lease(db.Model):  # type: ignore
+	"""
+	A named, time-limited lease held by one process, used to elect a leader.
+	"""
+
+	name = db.Column(db.String(64), primary_key=True)
+	holder = db.Column(db.String(256), nullable=False)
+	expires: float = db.Column(db.FLOAT, nullable=False)
+
+	#: The last time the holder's periodic task ran.
+	last_run: float = db.Column(db.FLOAT)
+
+
+class ThrottleEvent(db.Model):  # type: ignore
+	"""
+	A pull request created or updated by the bot, counted against the throttles of its repository and installation.
+	"""
+
+	__table_args__ = (db.Index("ix_throttle_event_scope_key_created", "scope", "key", "created"), )
+
+	id = db.Column(db.INTEGER, primary_key=True)  # noqa: A003  # pylint: disable=redefined-builtin
+
+	#: ``repository`` or ``installation``.
+	scope = db.Column(db.String(16), nullable=False)
+
+	#: The ID of the repository, or the login of the account the installation belongs to.
+	key = db.Column(db.String(256), nullable=False)
+
+	#: When the pull request was created or updated, as a UTC Unix timestamp.
+	created: float = db.Column(db.FLOAT, nullable=False)
+
+
+if not os.environ.get("RH_BOT_IMPORTCHECK", 0):
+	# Create any tables added since the database was first set up.
+	db.create_all()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+#
+#  graphql.py
+"""
+Helpers for the GitHub GraphQL API.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set
+
+# 3rd party
+from github3.session import GitHubSession
+from github3_utils.check_labels import Checks
+
+# this package
+from repo_helper_bot.constants import GITHUBAPP_URL
+from repo_helper_bot.utils import log
+
+__all__ = [
+		"GRAPHQL_URL",
+		"CommitState",
+		"GraphQLError",
+		"PullRequestState",
+		"fetch_commit",
+		"graphql",
+		]
+
+if GITHUBAPP_URL:
+	GRAPHQL_URL = f"{GITHUBAPP_URL.rstrip('/')}/api/graphql"
+else:
+	GRAPHQL_URL = "https://api.github.com/graphql"
+
+
+class GraphQLError(Exception):
+	"""
+	Raised when a GraphQL query fails.
+
+	:param errors: The errors returned by the API.
+	"""
+
+	def __init__(self, errors: List[Dict[str, Any]]):
+		self.errors = errors
+		super().__init__("; ".join(error.get("message", str(error)) for error in errors))
+
+
+def graphql(session: GitHubSession, query: str, **variables: Any) -> Dict[str, Any]:
+	"""
+	Run a GraphQL query and return its data.
+
+	If the query partially succeeds (for example one of several repositories can't be found)
+	the errors are logged and the data returned.
+
+	:param session: An authenticated session, such as :attr:`github3.GitHub.session`.
+	:param query:
+	:param variables: The values of the query's variables.
+
+	:raises GraphQLError: If the query returned no data.
+	"""
+
+	response = session.post(GRAPHQL_URL, json={"query": query, "variables": variables})
+	response.raise_for_status()
+	body = response.json()
+
+	errors = body.get("errors") or []
+
+	if body.get("data") is None:
+		raise GraphQLError(errors or [{"message": "No data returned."}])
+
+	for error in errors:
+		log(f"GraphQL error: {error.get('message', error)}", type="WARNING")
+
+	return body["data"]
+
+
+class PullRequestState(NamedTuple):
+	"""
+	The labels and check status of a pull request.
+	"""
+
+	number: int
+
+	#: The names of the labels on the pull request.
+	labels: Set[str]
+
+	#: The check runs on the pull request's head commit. :py:obj:`None` if they weren't requested.
+	checks: Optional[Checks] = None
+
+
+def _make_checks(check_runs: Iterable[Dict[str, Any]]) -> Checks:
+	# Equivalent to github3_utils.check_labels.get_checks_for_pr, for GraphQL check runs.
+
+	failing = set()
+	running = set()
+	successful = set()
+	skipped = set()
+	neutral = set()
+
+	for check_run in check_runs:
+		status = (check_run["status"] or '').lower()
+		conclusion = (check_run["conclusion"] or '').lower()
+
+		if status != "completed":
+			running.add(check_run["name"])
+		elif conclusion in {"failure", "cancelled", "timed_out", "action_required", "startup_failure"}:
+			failing.add(check_run["name"])
+		elif conclusion == "success":
+			successful.add(check_run["name"])
+		elif conclusion == "skipped":
+			skipped.add(check_run["name"])
+		elif conclusion == "neutral":
+			neutral.add(check_run["name"])
+
+	return Checks(
+			successful=successful - failing - running,
+			failing=failing,
+			running=running - failing,
+			skipped=skipped - running - failing - successful,
+			neutral=neutral - running - failing - successful,
+			)
+
+
+_commit_query = """
+query($owner: String!, $name: String!, $sha: GitObjectID!) {
+  repository(owner: $owner, name: $name) {
+    object(oid: $sha) {
+      ... on Commit {
+        checkSuites(first: 50) {
+          nodes { checkRuns(first: 100) { nodes { name status conclusion } } }
+        }
+        associatedPullRequests(first: 20) {
+          nodes { number state headRefOid labels(first: 100) { nodes { name } } }
+        }
+      }
+    }
+  }
+}
+"""
+
+
+class CommitState(NamedTuple):
+	"""
+	The result of :func:`~.fetch_commit`.
+	"""
+
+	#: The check runs on the commit.
+	checks: Checks
+
+	#: The open pull requests whose head is the commit, each with the commit's checks.
+	pull_requests: List[PullRequestState]
+
+
+def fetch_commit(session: GitHubSession, owner: str, name: str, sha: str) -> CommitState:
+	"""
+	Fetch the check runs on a commit, and the open pull requests whose head it is, in a single query.
+
+	Unlike the ``pull_requests`` of a ``check_suite`` webhook, this includes pull requests from forks.
+
+	:param session: An authenticated session, such as :attr:`github3.GitHub.session`.
+	:param owner: The owner of the repository.
+	:param name: The name of the repository.
+	:param sha: The SHA of the commit.
+	"""
+
+	commit = graphql(session, _commit_query, owner=owner, name=name, sha=sha)["repository"]["object"]
+
+	if not commit:
+		return CommitState(checks=_make_checks([]), pull_requests=[])
+
+	checks = _make_checks(
+			check_run for check_suite in commit["checkSuites"]["nodes"]
+			for check_run in check_suite["checkRuns"]["nodes"]
+			)
+
+	pull_requests = [
+			PullRequestState(
+					number=node["number"],
+					labels={label["name"] for label in node["labels"]["nodes"]},
+					checks=checks,
+					)
+			for node in commit["associatedPullRequests"]["nodes"]
+			if node["state"] == "OPEN" and node["headRefOid"] == sha
+			]
+
+	return CommitState(checks=checks, pull_requests=pull_requests)
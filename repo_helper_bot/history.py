@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+#
+#  history.py
+"""
+Persisted history of updates, for latency and failure analytics.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+# this package
+from repo_helper_bot.db import UpdateRun, UpdateRunRollup, db
+from repo_helper_bot.utils import log
+
+if TYPE_CHECKING:
+	# this package
+	from repo_helper_bot.profiling import UpdateProfiler
+	from repo_helper_bot.updater import UpdateResult
+
+__all__ = ["ROLLUP_INTERVAL", "RUN_RETENTION", "maybe_rollup", "record_run", "rollup_runs", "run_stats"]
+
+#: The time, in seconds, individual runs are kept for before being summarised into daily rollups.
+RUN_RETENTION: float = float(os.environ.get("RH_BOT_RUN_RETENTION", 30 * 24 * 60 * 60))
+
+#: The minimum time, in seconds, between runs of :func:`~.rollup_runs` by :func:`~.maybe_rollup`.
+ROLLUP_INTERVAL: float = float(os.environ.get("RH_BOT_RUN_ROLLUP_INTERVAL", 60 * 60))
+
+_BUCKETS = {"hour": "%Y-%m-%dT%H:00", "day": "%Y-%m-%d"}
+
+_last_rollup = 0.0
+_rollup_lock = threading.Lock()
+
+
+def _percentile(values: List[float], percent: float) -> Optional[float]:
+	# Nearest-rank percentile of already sorted values.
+
+	if not values:
+		return None
+
+	return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def _combine(old: Optional[float], old_runs: int, new: Optional[float], new_runs: int) -> Optional[float]:
+	# Approximate a percentile of two sets of runs by the mean of each set's, weighted by the number of runs.
+
+	if old is None:
+		return new
+	if new is None:
+		return old
+
+	return (old * old_runs + new * new_runs) / (old_runs + new_runs)
+
+
+def _bucket(timestamp: float, bucket: str) -> str:
+	return datetime.fromtimestamp(timestamp, timezone.utc).strftime(_BUCKETS[bucket])
+
+
+def record_run(
+		repository: Dict,
+		trigger: str,
+		profiler: "UpdateProfiler",
+		result: Optional["UpdateResult"] = None,
+		exception: Optional[BaseException] = None,
+		) -> UpdateRun:
+	"""
+	Record the outcome and measurements of an update.
+
+	:param repository: The repository, as returned by the GitHub API.
+	:param trigger: What requested the update, e.g. ``push``, ``sweep`` or ``comment``.
+	:param profiler: The profiler the update ran under.
+	:param result: The result of the update, if it returned.
+	:param exception: The exception raised by the update, if it didn't.
+	"""
+
+	if exception is None and result is not None:
+		exception = result.exception
+
+	run = UpdateRun(
+			repo_id=repository["id"],
+			full_name=repository["full_name"],
+			trigger=trigger,
+			started=time.time() - profiler.duration,
+			duration=profiler.duration,
+			stages=json.dumps(profiler.stages),
+			bytes_cloned=profiler.bytes_cloned,
+			files_changed=profiler.files_changed,
+			api_calls=profiler.api_calls,
+			ret=result.ret if result is not None else None,
+			pr_number=result.pr_number if result is not None else None,
+			msg=result.msg if result is not None else None,
+			error=type(exception).__name__ if exception is not None else None,
+			)
+
+	db.session.add(run)
+	db.session.commit()
+
+	maybe_rollup()
+
+	return run
+
+
+def rollup_runs(before: Optional[float] = None) -> int:
+	"""
+	Summarise runs older than :data:`~.RUN_RETENTION` into one :class:`~.UpdateRunRollup`
+	per repository per day, and delete them.
+
+	Only whole days are rolled up, so each day's percentiles are computed from all of its runs.
+
+	:param before: Roll up runs which started before this time. Defaults to :data:`~.RUN_RETENTION` ago.
+
+	:returns: The number of runs rolled up.
+	"""
+
+	if before is None:
+		before = time.time() - RUN_RETENTION
+
+	# Align to the start of the (UTC) day.
+	before -= before % (24 * 60 * 60)
+
+	query = UpdateRun.query.filter(UpdateRun.started < before)
+
+	groups: Dict[Tuple[str, str], List[UpdateRun]] = defaultdict(list)
+	for run in query:
+		groups[(_bucket(run.started, "day"), run.full_name)].append(run)
+
+	for (day, full_name), runs in groups.items():
+		durations = sorted(run.duration for run in runs)
+		failures = sum(run.error is not None for run in runs)
+		rollup: Optional[UpdateRunRollup] = UpdateRunRollup.query.get((day, full_name))
+
+		if rollup is None:
+			db.session.add(
+					UpdateRunRollup(
+							day=day,
+							full_name=full_name,
+							runs=len(runs),
+							failures=failures,
+							p50=_percentile(durations, 50),
+							p95=_percentile(durations, 95),
+							)
+					)
+		else:
+			# Runs recorded after the day was rolled up; the percentiles can only be approximated.
+			rollup.p50 = _combine(rollup.p50, rollup.runs, _percentile(durations, 50), len(runs))
+			rollup.p95 = _combine(rollup.p95, rollup.runs, _percentile(durations, 95), len(runs))
+			rollup.runs += len(runs)
+			rollup.failures += failures
+
+	count = query.delete(synchronize_session=False)
+	db.session.commit()
+
+	if count:
+		log(f"Rolled up {count} update runs.")
+
+	return count
+
+
+def maybe_rollup() -> None:
+	"""
+	Run :func:`~.rollup_runs` if it hasn't been run by this process in the last :data:`~.ROLLUP_INTERVAL` seconds.
+	"""
+
+	global _last_rollup
+
+	with _rollup_lock:
+		if time.time() - _last_rollup < ROLLUP_INTERVAL:
+			return
+
+		_last_rollup = time.time()
+
+	rollup_runs()
+
+
+def _summarise(durations: List[float], failures: int) -> Dict[str, Any]:
+	durations.sort()
+
+	return {
+			"runs": len(durations),
+			"failures": failures,
+			"p50": _percentile(durations, 50),
+			"p95": _percentile(durations, 95),
+			}
+
+
+def run_stats(
+		group: str = "repository",
+		days: float = 7,
+		bucket: Optional[str] = None,
+		full_name: Optional[str] = None,
+		) -> List[Dict[str, Any]]:
+	"""
+	Returns the number of runs, failures, and the median and 95th percentile duration (in seconds) of recent updates.
+
+	:param group: Group the runs by ``repository``, ``stage`` or ``trigger``.
+	:param days: The number of days of history to include.
+	:param bucket: Also group the runs by ``hour`` or ``day`` (UTC).
+	:param full_name: Only include runs for this repository.
+
+	Runs older than :data:`~.RUN_RETENTION` are only available grouped by repository and day.
+	"""
+
+	if group not in {"repository", "stage", "trigger"}:
+		raise ValueError(f"Unknown group {group!r}")
+	if bucket is not None and bucket not in _BUCKETS:
+		raise ValueError(f"Unknown bucket {bucket!r}")
+
+	since = time.time() - days * 24 * 60 * 60
+
+	query = UpdateRun.query.filter(UpdateRun.started >= since)
+	if full_name is not None:
+		query = query.filter(UpdateRun.full_name == full_name)
+
+	durations: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+	failures: Dict[Tuple[str, str], int] = defaultdict(int)
+
+	def add(key: Tuple[str, str], duration: float, failed: bool) -> None:
+		durations[key].append(duration)
+		failures[key] += failed
+
+	run: UpdateRun
+	for run in query:
+		when = _bucket(run.started, bucket) if bucket is not None else ''
+		failed = run.error is not None
+
+		if group == "stage":
+			for stage, duration in json.loads(run.stages or "{}").items():
+				add((stage, when), duration, failed)
+		else:
+			add((run.full_name if group == "repository" else run.trigger, when), run.duration, failed)
+
+	stats = [
+			{group: key, "bucket": when or None, **_summarise(values, failures[(key, when)])}
+			for (key, when), values in durations.items()
+			]
+
+	if group == "repository" and bucket == "day":
+		rollups = UpdateRunRollup.query.filter(UpdateRunRollup.day >= _bucket(since, "day"))
+		if full_name is not None:
+			rollups = rollups.filter(UpdateRunRollup.full_name == full_name)
+
+		rollup: UpdateRunRollup
+		for rollup in rollups:
+			if (rollup.full_name, rollup.day) not in durations:
+				stats.append({
+						"repository": rollup.full_name,
+						"bucket": rollup.day,
+						"runs": rollup.runs,
+						"failures": rollup.failures,
+						"p50": rollup.p50,
+						"p95": rollup.p95,
+						})
+
+	stats.sort(key=lambda s: (s["bucket"] or '', s[group] or ''))
+
+	return stats
@@ -27,21 +27,39 @@ Functions to handle GitHub webhooks.
 #
 
 # stdlib
-from typing import Iterable, Set, Union
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
 
 # 3rd party
+import sqlalchemy.exc
 from apeye.requests_url import RequestsURL
-from github3.issues import Issue
-from github3.pulls import PullRequest, ShortPullRequest
-from github3.repos import Repository
-from github3_utils.check_labels import Label, _python_dev_re, get_checks_for_pr
+from github3 import GitHub
+from github3.exceptions import GitHubError
+from github3_utils.check_labels import _python_dev_re
 
 # this package
-from repo_helper_bot.constants import BRANCH_NAME, github_app
-from repo_helper_bot.updater import update_repository
-from repo_helper_bot.utils import commit_as_bot, log
-
-__all__ = ["assign_issue", "assign_pr", "on_issue_comment", "on_push"]
+from repo_helper_bot.constants import BRANCH_NAME, app, github_app
+from repo_helper_bot.db import CommitChecks, db
+from repo_helper_bot.graphql import PullRequestState, fetch_commit
+from repo_helper_bot.labels import automerge_label, bootstrap_labels
+from repo_helper_bot.scheduler import Priority, scheduler
+from repo_helper_bot.utils import log
+
+__all__ = [
+		"CHECKS_RETENTION",
+		"assign_issue",
+		"assign_pr",
+		"on_check_suite_completed",
+		"on_installation",
+		"on_issue_comment",
+		"on_push",
+		]
+
+#: The time, in seconds, the check results of a commit are kept for.
+CHECKS_RETENTION: float = float(os.environ.get("RH_BOT_CHECKS_RETENTION", 7 * 24 * 60 * 60))
 
 
 @github_app.on("push")
@@ -67,8 +85,7 @@ def on_push() -> str:
 		return ''
 
 	if pusher not in {"repo-helper", "repo-helper[bot]"}:
-		with commit_as_bot():
-			print(update_repository(github_app.payload["repository"]).msg)
+		scheduler.submit(github_app.payload["repository"], Priority.PUSH)
 
 	return ''
 
@@ -85,15 +102,23 @@ I'm a bot. If you think I've done this in error please \
 """
 
 
+def _is_diff_empty(pull_request: Dict) -> bool:
+	if "changed_files" in pull_request:
+		return not pull_request["changed_files"]
+
+	# Only read as much of the diff as is needed to tell whether it's empty.
+	with RequestsURL(pull_request["diff_url"]).get(stream=True) as response:
+		return not any(response.iter_content(1024))
+
+
 @github_app.on("pull_request.synchronize")
 def close_empty_pull_requests() -> None:
 	owner = github_app.payload["repository"]["owner"]["login"]
 	repo_name = github_app.payload["repository"]["name"]
 	num = github_app.payload["pull_request"]["number"]
-	pr: PullRequest = github_app.installation_client.pull_request(owner, repo_name, num)
 
-	if not RequestsURL(pr.diff_url).get().text:
-		issue = pr.issue()
+	if _is_diff_empty(github_app.payload["pull_request"]):
+		issue = github_app.installation_client.issue(owner, repo_name, num)
 
 		issue.close()
 		issue.create_comment(empty_pr_close_message)
@@ -131,18 +156,30 @@ def assign_pr() -> None:
 
 	owner = github_app.payload["repository"]["owner"]["login"]
 	repo = github_app.payload["repository"]["name"]
-	num = github_app.payload["pull_request"]["number"]
+	pull_request = github_app.payload["pull_request"]
+	num = pull_request["number"]
 
-	pr: PullRequest = github_app.installation_client.pull_request(owner, repo, num)
-	issue: Issue = github_app.installation_client.issue(owner, repo, num)
+	# The payload already has the author and reviewers, so there's nothing to fetch.
+	author = pull_request["user"]["login"]
+	log(f"PR #{num} opened by {author} in {owner}/{repo}!")
 
-	log(f"PR #{num} opened by {pr.user} in {owner}/{repo}!")
+	gh = github_app.installation_client
 
-	# TODO: parse assignee from repo_helper.yml
-	issue.add_assignees(["domdfcoding"])
+	# Each request is attempted even if the other fails.
+
+	try:
+		# TODO: parse assignee from repo_helper.yml
+		gh._json(gh._post(_issue_url(owner, repo, num, "assignees"), data={"assignees": ["domdfcoding"]}), 201)
+	except GitHubError as e:
+		log(f"Unable to assign PR #{num} in {owner}/{repo}: {e}", type="ERROR")
+
+	if not pull_request.get("requested_reviewers") and author != "domdfcoding":
+		url = gh._build_url("repos", owner, repo, "pulls", str(num), "requested_reviewers")
 
-	if not pr.requested_reviewers and pr.user.login != "domdfcoding":
-		pr.create_review_requests(["domdfcoding"])
+		try:
+			gh._json(gh._post(url, data={"reviewers": ["domdfcoding"]}), 201)
+		except GitHubError as e:
+			log(f"Unable to request a review of PR #{num} in {owner}/{repo}: {e}", type="ERROR")
 
 
 @github_app.on("pull_request.closed")
@@ -192,23 +229,43 @@ def on_issue_comment() -> str:
 		#: TODO: org members show as "CONTRIBUTOR"
 		if comment["author_association"] in {"OWNER", "COLLABORATOR", "CONTRIBUTOR", "MEMBER"}:
 			if "@repo-helper recreate" in comment["body"]:
-
-				with commit_as_bot():
-					print(update_repository(github_app.payload["repository"], recreate=True).msg)
+				# Wait for any running update to finish rather than skipping the command.
+				scheduler.submit(
+						github_app.payload["repository"],
+						Priority.INTERACTIVE,
+						recreate=True,
+						wait=60,
+						trigger="comment",
+						)
 
 	return ''
 
 
-def label_pr_failures(pull: Union[PullRequest, ShortPullRequest]) -> Set[str]:
+def _issue_url(owner: str, repo: str, number: int, *parts: str) -> str:
+	return github_app.installation_client._build_url("repos", owner, repo, "issues", str(number), *parts)
+
+
+def _fetch_labels(owner: str, repo: str, number: int) -> Set[str]:
+	gh = github_app.installation_client
+	labels = gh._json(gh._get(_issue_url(owner, repo, number, "labels"), params={"per_page": 100}), 200)
+	return {label["name"] for label in labels or ()}
+
+
+def label_pr_failures(owner: str, repo: str, pull: PullRequestState) -> Set[str]:
 	"""
 	Labels the given pull request to indicate which checks are failing.
 
-	:param pull:
+	:param owner: The owner of the repository.
+	:param repo: The name of the repository.
+	:param pull: The pull request, fetched with its checks by :func:`~.fetch_commit`.
 
 	:return: The new labels set for the pull request.
+
+	:raises github3.exceptions.GitHubError: If the labels couldn't be changed.
 	"""
 
-	pr_checks = get_checks_for_pr(pull)
+	assert pull.checks is not None
+	pr_checks = pull.checks
 
 	failure_labels: Set[str] = set()
 	success_labels: Set[str] = set()
@@ -230,47 +287,125 @@ def label_pr_failures(pull: Union[PullRequest, ShortPullRequest]) -> Set[str]:
 	determine_labels(pr_checks.failing, failure_labels)
 	determine_labels(pr_checks.successful, success_labels)
 
-	issue: Issue = pull.issue()
-
-	current_labels = {label.name for label in issue.labels()}
+	gh = github_app.installation_client
+	current_labels = pull.labels
 
 	for label in success_labels:
 		if label in current_labels and label not in failure_labels:
-			issue.remove_label(label)
+			# A 404 means the label has already been removed.
+			gh._boolean(gh._delete(_issue_url(owner, repo, pull.number, "labels", label)), 200, 404)
 
 	new_labels = current_labels - success_labels
 	new_labels.update(failure_labels)
 
-	if new_labels != current_labels:
-		issue.add_labels(*new_labels)
+	if failure_labels - current_labels:
+		url = _issue_url(owner, repo, pull.number, "labels")
+		gh._json(gh._post(url, data={"labels": sorted(failure_labels)}), 200)
 
 	return new_labels
 
 
-@github_app.on("check_run.completed")
-def on_check_run_completed() -> str:
+@github_app.on("check_suite.completed")
+def on_check_suite_completed() -> str:
 	"""
-	Hook to respond to the completion of check runs.
+	Hook to label pull requests with their failing checks once a suite of check runs completes.
 	"""
 
-	repo_name = github_app.payload["repository"]["full_name"]
-	repo: Repository = github_app.installation_client.repository(*repo_name.split('/'))
-	head_branch = github_app.payload["check_run"]["check_suite"]["head_branch"]
+	owner = github_app.payload["repository"]["owner"]["login"]
+	repo_name = github_app.payload["repository"]["name"]
+	repo_id = github_app.payload["repository"]["id"]
+	check_suite = github_app.payload["check_suite"]
+	sha = check_suite["head_sha"]
 
-	print(f"New check status for repository {repo_name}:")
+	print(f"Check suite completed for {owner}/{repo_name} at {sha}")
+
+	now = time.time()
+	CommitChecks.query.filter(CommitChecks.updated < now - CHECKS_RETENTION).delete(synchronize_session=False)
+	db.session.commit()
+
+	cached: Optional[CommitChecks] = CommitChecks.query.get((repo_id, sha))
+	suites = json.loads(cached.suites) if cached is not None else []
+	previous = (json.loads(cached.failing), json.loads(cached.successful)) if cached is not None else ([], [])
+
+	# Don't hold a transaction, or the connection, while calling the API.
+	db.session.commit()
+
+	if check_suite["id"] in suites:
+		# A redelivery of a suite which has already been handled.
+		return ''
 
-	pr: PullRequest
-	for pr in repo.pull_requests(state="open", head=head_branch):
-		label_pr_failures(pr)
+	state = fetch_commit(github_app.installation_client.session, owner, repo_name, sha)
+
+	# The payload only lists pull requests from branches of this repository, so those from forks are found by SHA.
+	# The query only returns the first few pull requests for the commit, so any others in the payload are added.
+	pulls = list(state.pull_requests)
+	found = {pull.number for pull in pulls}
+
+	for pull in check_suite["pull_requests"]:
+		if pull["number"] not in found:
+			labels = _fetch_labels(owner, repo_name, pull["number"])
+			pulls.append(PullRequestState(pull["number"], labels, state.checks))
+
+	failing = sorted(state.checks.failing)
+	successful = sorted(state.checks.successful)
+
+	if (failing, successful) != previous:
+		if pulls:
+			bootstrap_labels(github_app.installation_client, [github_app.payload["repository"]])
+
+		for pull in pulls:
+			label_pr_failures(owner, repo_name, pull)
+
+	cached = CommitChecks.query.populate_existing().get((repo_id, sha))
+	if cached is None:
+		cached = CommitChecks(repo_id=repo_id, sha=sha, suites="[]")
+		db.session.add(cached)
+
+	cached.suites = json.dumps([*json.loads(cached.suites), check_suite["id"]])
+	cached.failing = json.dumps(failing)
+	cached.successful = json.dumps(successful)
+	cached.updated = now
+
+	try:
+		db.session.commit()
+	except sqlalchemy.exc.IntegrityError:
+		# Another worker handled a suite for the same commit at the same time.
+		db.session.rollback()
+
+	return ''
+
+
+@github_app.on("installation.created")
+@github_app.on("installation_repositories.added")
+def on_installation() -> str:
+	"""
+	Hook to create the bot's labels in newly installed repositories.
+	"""
+
+	payload = github_app.payload
+	repositories = payload.get("repositories") or payload.get("repositories_added") or []
+
+	log(f"Installed on {len(repositories)} repositories for {payload['installation']['account']['login']}")
+
+	# Creating the labels can take a while for large installations, so don't hold up the webhook.
+	threading.Thread(
+			target=_bootstrap_in_background,
+			args=(github_app.installation_client, repositories),
+			name="repo-helper-labels",
+			daemon=True,
+			).start()
 
 	return ''
 
 
-automerge_label = Label(
-		name="🤖 automerge",
-		color="#87ceeb",
-		description="Auto merge is enabled for this pull request.",
-		)
+def _bootstrap_in_background(gh: GitHub, repositories: List[Dict]) -> None:
+	try:
+		with app.app_context():
+			bootstrap_labels(gh, repositories)
+	except Exception as e:
+		log(f"Unable to create labels: {e}", type="ERROR")
+	finally:
+		db.session.remove()
 
 
 @github_app.on("pull_request.auto_merge_enabled")
@@ -279,22 +414,14 @@ def pull_request_auto_merge_enabled() -> None:
 	repo_name = github_app.payload["repository"]["name"]
 	num = github_app.payload["pull_request"]["number"]
 
-	print(f"auto merge disabled for {owner}/{repo_name}#{num}")
-
-	repo: Repository = github_app.installation_client.repository(owner, repo_name)
-
-	current_repo_labels = {label.name for label in repo.labels()}
+	print(f"auto merge enabled for {owner}/{repo_name}#{num}")
 
-	if automerge_label.name not in current_repo_labels:
-		print(f"creating {automerge_label.name} label")
-		automerge_label.create(repo)
+	current_pr_labels = {label["name"] for label in github_app.payload["pull_request"]["labels"]}
 
-	pr: PullRequest = github_app.installation_client.pull_request(owner, repo_name, num)
-	issue: Issue = pr.issue()
-
-	current_pr_labels = {label.name for label in issue.labels()}
-	current_pr_labels.add(automerge_label.name)
-	issue.add_labels(*current_pr_labels)
+	if automerge_label.name not in current_pr_labels:
+		gh = github_app.installation_client
+		bootstrap_labels(gh, [github_app.payload["repository"]])
+		gh._post(_issue_url(owner, repo_name, num, "labels"), data={"labels": [automerge_label.name]})
 
 
 @github_app.on("pull_request.auto_merge_disabled")
@@ -305,10 +432,7 @@ def pull_request_auto_merge_disabled() -> None:
 
 	print(f"auto merge disabled for {owner}/{repo_name}#{num}")
 
-	pr: PullRequest = github_app.installation_client.pull_request(owner, repo_name, num)
-	issue: Issue = pr.issue()
-
-	current_pr_labels = {label.name for label in issue.labels()}
+	current_pr_labels = {label["name"] for label in github_app.payload["pull_request"]["labels"]}
 
 	if automerge_label.name in current_pr_labels:
-		issue.remove_label(automerge_label.name)
+		github_app.installation_client._delete(_issue_url(owner, repo_name, num, "labels", automerge_label.name))
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+#
+#  jobs.py
+"""
+Tracking the progress and results of updates requested through the job API.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import json
+import os
+import time
+import traceback
+import uuid
+from typing import TYPE_CHECKING
+
+# this package
+from repo_helper_bot.db import UpdateJob, db
+
+if TYPE_CHECKING:
+	# this package
+	from repo_helper_bot.updater import UpdateResult
+
+__all__ = ["JOB_RETENTION", "JobTracker", "create_job", "format_traceback"]
+
+#: The time, in seconds, finished jobs are kept for.
+JOB_RETENTION: float = float(os.environ.get("RH_BOT_JOB_RETENTION", 24 * 60 * 60))
+
+
+def format_traceback(exception: BaseException) -> str:
+	"""
+	Returns the full traceback of the given exception, including any chained exceptions.
+
+	:param exception:
+	"""
+
+	return ''.join(traceback.format_exception(type(exception), exception, exception.__traceback__))
+
+
+def create_job(full_name: str) -> UpdateJob:
+	"""
+	Record a new job to update the given repository, and forget jobs which finished long ago.
+
+	:param full_name: The full name of the repository (``owner/name``).
+	"""
+
+	now = time.time()
+	UpdateJob.query.filter(UpdateJob.finished < now - JOB_RETENTION).delete(synchronize_session=False)
+
+	job = UpdateJob(id=uuid.uuid4().hex, full_name=full_name, status="queued", submitted=now)
+	db.session.add(job)
+	db.session.commit()
+
+	return job
+
+
+class JobTracker:
+	"""
+	Records the progress and result of an update in its :class:`~.UpdateJob`.
+
+	Calling the tracker with the name of a stage records that the stage has started.
+
+	:param job_id:
+	"""
+
+	def __init__(self, job_id: str):
+		self.job_id = job_id
+
+	def _get(self) -> UpdateJob:
+		return UpdateJob.query.get(self.job_id)
+
+	def __call__(self, stage: str) -> None:
+		job = self._get()
+		job.stage = stage
+		job.stages = json.dumps([*json.loads(job.stages), {"name": stage, "started": time.time()}])
+		db.session.commit()
+
+	def started(self) -> None:
+		"""
+		Record that the update has started.
+		"""
+
+		job = self._get()
+		job.status = "running"
+		job.started = time.time()
+		db.session.commit()
+
+	def finished(self, result: "UpdateResult") -> None:
+		"""
+		Record the result of the update.
+
+		:param result:
+		"""
+
+		job = self._get()
+		job.status = "done"
+		job.stage = None
+		job.finished = time.time()
+		job.ret = result.ret
+		job.pr_number = result.pr_number
+		job.msg = result.msg
+		if result.exception is not None:
+			job.traceback = format_traceback(result.exception)
+		db.session.commit()
+
+	def failed(self, exception: BaseException) -> None:
+		"""
+		Record that the update raised an exception.
+
+		:param exception:
+		"""
+
+		db.session.rollback()
+
+		job = self._get()
+		job.status = "error"
+		job.stage = None
+		job.finished = time.time()
+		job.ret = 1
+		job.msg = str(exception)
+		job.traceback = format_traceback(exception)
+		db.session.commit()
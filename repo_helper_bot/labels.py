@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+#
+#  labels.py
+"""
+The labels the bot applies to pull requests, and their creation in each repository.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import hashlib
+import json
+import time
+from itertools import groupby
+from typing import Dict, Iterable, List
+
+# 3rd party
+import requests
+from github3 import GitHub
+from github3.exceptions import GitHubException
+from github3_utils.check_labels import Label, check_status_labels
+
+# this package
+from repo_helper_bot.constants import client, client_lock, context_switcher
+from repo_helper_bot.db import LabelBootstrap, db
+from repo_helper_bot.graphql import GraphQLError, graphql
+from repo_helper_bot.utils import log
+
+__all__ = [
+		"BATCH_SIZE",
+		"BOT_LABELS",
+		"LABELS_VERSION",
+		"automerge_label",
+		"bootstrap_installations",
+		"bootstrap_labels",
+		]
+
+automerge_label = Label(
+		name="🤖 automerge",
+		color="#87ceeb",
+		description="Auto merge is enabled for this pull request.",
+		)
+
+#: The labels applied to pull requests by the bot.
+BOT_LABELS: Dict[str, Label] = {**check_status_labels, automerge_label.name: automerge_label}
+
+#: A hash of :data:`~.BOT_LABELS`, so repositories are bootstrapped again when the labels change.
+LABELS_VERSION: str = hashlib.sha256(
+		json.dumps([label.to_dict() for label in BOT_LABELS.values()], sort_keys=True).encode("UTF-8"),
+		).hexdigest()[:16]
+
+#: The number of repositories whose labels are checked with each GraphQL query.
+BATCH_SIZE: int = 25
+
+
+def _labels_query(count: int) -> str:
+	label_variables = ", ".join(f"$l{j}: String!" for j in range(len(BOT_LABELS)))
+	repository_variables = ", ".join(f"$o{i}: String!, $n{i}: String!" for i in range(count))
+	labels = ' '.join(f"l{j}: label(name: $l{j}) {{ name }}" for j in range(len(BOT_LABELS)))
+	repositories = ' '.join(f"r{i}: repository(owner: $o{i}, name: $n{i}) {{ {labels} }}" for i in range(count))
+
+	return f"query({label_variables}, {repository_variables}) {{ {repositories} }}"
+
+
+def bootstrap_labels(gh: GitHub, repositories: Iterable[Dict]) -> int:
+	"""
+	Create any of the bot's labels which are missing from the given repositories.
+
+	Repositories which have already been bootstrapped with the current labels are skipped
+	without calling the API, so this is cheap to call before applying a label.
+	The rest are checked in batches of :data:`~.BATCH_SIZE` with a single query each.
+
+	:param gh: A client logged in as the installation the repositories belong to.
+	:param repositories: The repositories, as returned by the GitHub API. Only ``id`` and ``full_name`` are used.
+
+	:returns: The number of repositories which were checked.
+	"""
+
+	repositories = list(repositories)
+	done = {
+			bootstrap.repo_id
+			for bootstrap in LabelBootstrap.query.filter(
+					LabelBootstrap.repo_id.in_([repository["id"] for repository in repositories]),
+					LabelBootstrap.version == LABELS_VERSION,
+					)
+			}
+	pending = [repository for repository in repositories if repository["id"] not in done]
+
+	# Don't hold a transaction, or the connection, while calling the API.
+	db.session.commit()
+
+	for start in range(0, len(pending), BATCH_SIZE):
+		batch = pending[start:start + BATCH_SIZE]
+		bootstrapped = []
+
+		variables = {f"l{j}": name for j, name in enumerate(BOT_LABELS)}
+		for i, repository in enumerate(batch):
+			variables[f"o{i}"], variables[f"n{i}"] = repository["full_name"].split('/', 1)
+
+		data = graphql(gh.session, _labels_query(len(batch)), **variables)
+
+		for i, repository in enumerate(batch):
+			node = data.get(f"r{i}")
+			if node is None:
+				# The repository has been deleted, or the bot can no longer access it.
+				continue
+
+			created = True
+
+			for j, label in enumerate(BOT_LABELS.values()):
+				if node[f"l{j}"] is None:
+					log(f"Creating the {label.name!r} label in {repository['full_name']}")
+					url = gh._build_url("repos", variables[f"o{i}"], variables[f"n{i}"], "labels")
+					response = gh._post(url, data=label.to_dict())
+
+					# An existing label (created by a concurrent bootstrap) gives 422, which is fine.
+					if response.status_code not in {201, 422}:
+						log(
+								f"Unable to create the {label.name!r} label in {repository['full_name']}: "
+								f"HTTP {response.status_code}",
+								type="ERROR",
+								)
+						# Leave the repository to be bootstrapped again next time.
+						created = False
+
+			if created:
+				bootstrapped.append(repository)
+
+		for repository in bootstrapped:
+			db.session.merge(
+					LabelBootstrap(
+							repo_id=repository["id"],
+							full_name=repository["full_name"],
+							version=LABELS_VERSION,
+							updated=time.time(),
+							)
+					)
+
+		db.session.commit()
+
+	return len(pending)
+
+
+def bootstrap_installations(repositories: Iterable[Dict]) -> None:
+	"""
+	Create any of the bot's labels which are missing from the given repositories, for each installation in turn.
+
+	Failures are logged, so they don't interrupt the caller.
+
+	:param repositories: The repositories, as returned by the GitHub API.
+	"""
+
+	def owner(repository: Dict) -> str:
+		return repository["owner"]["login"]
+
+	for login, group in groupby(sorted(repositories, key=owner), key=owner):
+		installed = list(group)
+
+		try:
+			with client_lock:
+				context_switcher.login_as_repo_installation(owner=login, repository=installed[0]["name"])
+				bootstrap_labels(client, installed)
+		except (GitHubException, GraphQLError, requests.RequestException) as e:
+			log(f"Unable to create labels for {login}: {e}", type="ERROR")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+#
+#  limits.py
+"""
+Resource limits which stop a huge repository from exhausting the worker's disk or memory.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import os
+import shutil
+from typing import Dict
+
+# this package
+from repo_helper_bot.utils import disk_usage
+
+__all__ = [
+		"LARGE_REPOSITORY_SIZE",
+		"LimitExceeded",
+		"MAX_DISK_USAGE",
+		"MAX_REPOSITORY_SIZE",
+		"MAX_WORKER_MEMORY",
+		"check_disk_usage",
+		"check_repository_size",
+		"is_large_repository",
+		"limit_memory",
+		]
+
+_MiB = 1024 * 1024
+
+#: Repositories larger than this many bytes (as reported by GitHub) are cloned without their history.
+LARGE_REPOSITORY_SIZE: int = int(os.environ.get("RH_BOT_LARGE_REPO_SIZE", 200 * _MiB))
+
+#: Repositories larger than this many bytes (as reported by GitHub) are skipped.
+MAX_REPOSITORY_SIZE: int = int(os.environ.get("RH_BOT_MAX_REPO_SIZE", 2048 * _MiB))
+
+#: The maximum number of bytes a clone may occupy on disk.
+MAX_DISK_USAGE: int = int(os.environ.get("RH_BOT_MAX_DISK_USAGE", 4096 * _MiB))
+
+#: The maximum address space, in bytes, of a worker process running ``repo_helper``.
+MAX_WORKER_MEMORY: int = int(os.environ.get("RH_BOT_MAX_WORKER_MEMORY", 2048 * _MiB))
+
+
+class LimitExceeded(Exception):
+	"""
+	Raised when updating a repository would exceed one of the resource limits.
+	"""
+
+
+def _repository_size(repository: Dict) -> int:
+	# The API reports the size in kilobytes.
+	return int(repository.get("size") or 0) * 1024
+
+
+def is_large_repository(repository: Dict) -> bool:
+	"""
+	Returns whether the repository is large enough that it should be cloned without its history.
+
+	:param repository: The repository, as returned by the GitHub API.
+	"""
+
+	return _repository_size(repository) > LARGE_REPOSITORY_SIZE
+
+
+def check_repository_size(repository: Dict, directory: str) -> None:
+	"""
+	Check that the repository isn't too large to clone into ``directory``.
+
+	:param repository: The repository, as returned by the GitHub API.
+	:param directory: The directory the repository will be cloned into.
+
+	:raises LimitExceeded: If the repository is larger than :data:`~.MAX_REPOSITORY_SIZE`,
+		or there isn't enough free disk space for it.
+	"""
+
+	size = _repository_size(repository)
+
+	if size > MAX_REPOSITORY_SIZE:
+		raise LimitExceeded(
+				f"the repository is {size // _MiB} MiB, which is more than the limit of {MAX_REPOSITORY_SIZE // _MiB} MiB."
+				)
+
+	# Allow for the working tree as well as the packed history.
+	free = shutil.disk_usage(directory).free
+	if size * 2 > free:
+		raise LimitExceeded(f"only {free // _MiB} MiB of disk space is free, but the repository is {size // _MiB} MiB.")
+
+
+def check_disk_usage(directory: str, baseline: int = 0) -> None:
+	"""
+	Check the clone in ``directory`` isn't using more than :data:`~.MAX_DISK_USAGE` bytes.
+
+	:param directory:
+	:param baseline: The number of bytes ``directory`` used beforehand, which don't count towards the limit.
+
+	:raises LimitExceeded: If it is.
+	"""
+
+	used = disk_usage(directory) - baseline
+
+	if used > MAX_DISK_USAGE:
+		raise LimitExceeded(
+				f"the clone uses {used // _MiB} MiB of disk space, which is more than the limit of {MAX_DISK_USAGE // _MiB} MiB."
+				)
+
+
+def limit_memory(max_bytes: int = MAX_WORKER_MEMORY) -> None:
+	"""
+	Limit the address space of the current process, so running out raises :exc:`MemoryError`
+	rather than invoking the kernel's OOM killer on the whole dyno.
+
+	Does nothing if the limit is ``0`` or the platform doesn't support it.
+
+	:param max_bytes:
+	"""
+
+	if max_bytes <= 0:
+		return
+
+	try:
+		# stdlib
+		import resource
+	except ImportError:  # pragma: no cover (Windows)
+		return
+
+	_, hard = resource.getrlimit(resource.RLIMIT_AS)
+	if hard != resource.RLIM_INFINITY:
+		max_bytes = min(max_bytes, hard)
+
+	try:
+		resource.setrlimit(resource.RLIMIT_AS, (max_bytes, hard))
+	except (ValueError, OSError):
+		pass
@@ -0,0 +1,632 @@
+#!/usr/bin/env python3
+#
+#  loadtest.py
+"""
+Load test the webhook endpoint under gunicorn, against a stand-in for the GitHub API.
+
+Run ``python -m repo_helper_bot.loadtest --help`` for the scenarios and gunicorn configurations it can compare.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import hashlib
+import hmac
+import json
+import os
+import queue
+import random
+import re
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# 3rd party
+import click  # type: ignore[import-untyped]
+import requests
+from domdf_python_tools.paths import PathPlus
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+__all__ = [
+		"SCENARIOS",
+		"Delivery",
+		"FakeGitHub",
+		"LoadResult",
+		"main",
+		"make_deliveries",
+		"run_load",
+		"worker_memory",
+		]
+
+#: Log messages which indicate the workers were contending for the database.
+_CONTENTION_RE = re.compile(
+		r"database is locked|QueuePool limit|deadlock detected|could not serialize|Lock wait timeout",
+		re.IGNORECASE,
+		)
+
+#: The owner of the repositories in the generated deliveries.
+_OWNER = "loadtest"
+
+
+class Delivery(NamedTuple):
+	"""
+	A webhook delivery.
+	"""
+
+	#: The ``X-GitHub-Event`` header.
+	event: str
+
+	payload: Dict[str, Any]
+
+	#: Whether the delivery should queue an update.
+	queues_update: bool = False
+
+	def sign(self, secret: str) -> Tuple[Dict[str, str], bytes]:
+		"""
+		Returns the headers and body of the delivery, signed with the webhook secret.
+
+		:param secret:
+		"""
+
+		body = json.dumps(self.payload).encode("UTF-8")
+		signature = hmac.new(secret.encode("UTF-8"), body, hashlib.sha256).hexdigest()
+
+		headers = {
+				"Content-Type": "application/json",
+				"X-GitHub-Event": self.event,
+				"X-GitHub-Delivery": str(uuid.uuid4()),
+				"X-Hub-Signature-256": f"sha256={signature}",
+				}
+
+		return headers, body
+
+
+class _FakeGitHubHandler(BaseHTTPRequestHandler):
+	server: "_FakeGitHubServer"
+
+	def log_message(self, format: str, *args: Any) -> None:  # noqa: A002  # pylint: disable=redefined-builtin
+		pass
+
+	def _respond(self, status: int, body: Any = None) -> None:
+		data = json.dumps(body).encode("UTF-8") if body is not None else b''
+
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(data)))
+		self.end_headers()
+		self.wfile.write(data)
+
+	def _handle(self) -> None:
+		length = int(self.headers.get("Content-Length") or 0)
+		body = self.rfile.read(length) if length else b''
+		path = self.path.split('?')[0]
+
+		with self.server.lock:
+			self.server.calls[f"{self.command} {re.sub(r'/[^/]*[0-9][^/]*', '/_', path)}"] += 1
+
+		if self.server.latency:
+			time.sleep(self.server.latency)
+
+		if path.endswith("/access_tokens"):
+			self._respond(201, {"token": "ghs_loadtest", "expires_at": "2099-01-01T00:00:00Z", "permissions": {}})
+		elif path.endswith("/graphql"):
+			self._respond(200, self._graphql(json.loads(body or b"{}")))
+		elif self.command == "DELETE":
+			self._respond(204)
+		elif self.command == "POST":
+			self._respond(201, {})
+		else:
+			self._respond(200, {})
+
+	@staticmethod
+	def _graphql(request: Dict[str, Any]) -> Dict[str, Any]:
+		variables = request.get("variables", {})
+
+		if "associatedPullRequests" in request.get("query", ''):
+			check_runs = [
+					{"name": "ubuntu-latest / 3.9", "status": "COMPLETED", "conclusion": "FAILURE"},
+					{"name": "windows-latest / 3.9", "status": "COMPLETED", "conclusion": "SUCCESS"},
+					{"name": "docs", "status": "COMPLETED", "conclusion": "SUCCESS"},
+					]
+			pull_request = {"number": 1, "state": "OPEN", "headRefOid": variables.get("sha"), "labels": {"nodes": []}}
+
+			return {
+					"data": {
+							"repository": {
+									"object": {
+											"checkSuites": {"nodes": [{"checkRuns": {"nodes": check_runs}}]},
+											"associatedPullRequests": {"nodes": [pull_request]},
+											}
+									}
+							}
+					}
+
+		return {"data": {"repository": {"label": None, "pullRequest": None, "pullRequests": {"nodes": []}}}}
+
+	do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _handle
+
+
+class _FakeGitHubServer(ThreadingHTTPServer):
+	daemon_threads = True
+
+	def __init__(self, latency: float):
+		super().__init__(("127.0.0.1", 0), _FakeGitHubHandler)
+		self.latency = latency
+		self.calls: Counter = Counter()
+		self.lock = threading.Lock()
+
+
+class FakeGitHub:
+	"""
+	A stand-in for the GitHub API (and GitHub Enterprise's GraphQL endpoint), which answers every request.
+
+	:param latency: The number of seconds to wait before answering each request.
+	"""
+
+	def __init__(self, latency: float = 0):
+		self._server = _FakeGitHubServer(latency)
+		self._thread = threading.Thread(target=self._server.serve_forever, name="fake-github", daemon=True)
+
+	@property
+	def url(self) -> str:
+		"""
+		The URL to use as ``GITHUBAPP_URL``.
+		"""
+
+		return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+	@property
+	def calls(self) -> Counter:
+		"""
+		The number of requests made to each endpoint, with path components replaced by ``_``.
+		"""
+
+		return self._server.calls
+
+	def __enter__(self) -> "FakeGitHub":
+		self._thread.start()
+		return self
+
+	def __exit__(self, *args: Any) -> None:
+		self._server.shutdown()
+		self._server.server_close()
+
+
+def _repository(index: int, github_url: str) -> Dict[str, Any]:
+	return {
+			"id": 1000 + index,
+			"name": f"repo-{index}",
+			"full_name": f"{_OWNER}/repo-{index}",
+			"owner": {"login": _OWNER},
+			"html_url": f"{github_url}/{_OWNER}/repo-{index}",
+			"default_branch": "master",
+			}
+
+
+def _push(rng: random.Random, repository: Dict[str, Any]) -> Iterator[Delivery]:
+	yield Delivery(
+			"push",
+			{
+					"ref": "refs/heads/master",
+					"after": f"{rng.getrandbits(160):040x}",
+					"pusher": {"name": "octocat"},
+					"commits": [{"committer": {"username": "octocat"}}],
+					"repository": repository,
+					"installation": {"id": 1},
+					},
+			queues_update=True,
+			)
+
+
+def _checks(rng: random.Random, repository: Dict[str, Any]) -> Iterator[Delivery]:
+	# A CI matrix: a check run for each job, then the suite.
+
+	sha = f"{rng.getrandbits(160):040x}"
+	suite_id = rng.getrandbits(31)
+	check_suite = {"id": suite_id, "head_sha": sha, "head_branch": "feature", "pull_requests": [{"number": 1}]}
+
+	for platform in ("ubuntu", "windows", "macos"):
+		for python in ("3.7", "3.8", "3.9", "3.10"):
+			yield Delivery(
+					"check_run",
+					{
+							"action": "completed",
+							"check_run": {"name": f"{platform}-latest / {python}", "check_suite": check_suite},
+							"repository": repository,
+							"installation": {"id": 1},
+							},
+					)
+
+	yield Delivery(
+			"check_suite",
+			{"action": "completed", "check_suite": check_suite, "repository": repository, "installation": {"id": 1}},
+			)
+
+
+def _comments(rng: random.Random, repository: Dict[str, Any]) -> Iterator[Delivery]:
+	for _ in range(rng.randint(2, 5)):
+		recreate = rng.random() < 0.5
+		yield Delivery(
+				"issue_comment",
+				{
+						"action": "created",
+						"issue": {"number": 1},
+						"comment": {
+								"body": "@repo-helper recreate" if recreate else "Looks good to me.",
+								"author_association": "OWNER",
+								},
+						"sender": {"login": "octocat"},
+						"repository": repository,
+						"installation": {"id": 1},
+						},
+				queues_update=recreate,
+				)
+
+
+#: The mixes of deliveries which can be generated, as weights for each kind of burst.
+SCENARIOS: Dict[str, Dict[Callable[[random.Random, Dict[str, Any]], Iterator[Delivery]], float]] = {
+		"push": {_push: 1},
+		"checks": {_checks: 1},
+		"comments": {_comments: 1},
+		"mixed": {_push: 5, _checks: 1, _comments: 1},
+		}
+
+
+def make_deliveries(
+		scenario: str,
+		count: int,
+		repositories: int,
+		github_url: str,
+		seed: int = 0,
+		) -> List[Delivery]:
+	"""
+	Generate a reproducible sequence of webhook deliveries.
+
+	:param scenario: One of the keys of :data:`~.SCENARIOS`.
+	:param count: The number of deliveries.
+	:param repositories: The number of repositories the deliveries are spread over.
+	:param github_url: The URL of the fake GitHub, used in the repositories' URLs.
+	:param seed: The seed for the random number generator.
+	"""
+
+	rng = random.Random(seed)
+	bursts, weights = zip(*SCENARIOS[scenario].items())
+	deliveries: List[Delivery] = []
+
+	while len(deliveries) < count:
+		burst = rng.choices(bursts, weights)[0]
+		deliveries.extend(burst(rng, _repository(rng.randrange(repositories), github_url)))
+
+	return deliveries[:count]
+
+
+class LoadResult(NamedTuple):
+	"""
+	The result of :func:`~.run_load`.
+	"""
+
+	#: The number of seconds taken to send every delivery.
+	duration: float
+
+	#: The latency of each delivery, in seconds.
+	latencies: List[float]
+
+	#: The number of responses with each status code, with ``0`` for connection errors and timeouts.
+	statuses: Counter
+
+	@property
+	def errors(self) -> int:
+		"""
+		The number of deliveries which failed.
+		"""
+
+		return sum(count for status, count in self.statuses.items() if not 200 <= status < 300)
+
+	def percentile(self, percent: float) -> float:
+		"""
+		Returns the given percentile of the latencies.
+
+		:param percent:
+		"""
+
+		latencies = sorted(self.latencies)
+		return latencies[min(len(latencies) - 1, int(percent / 100 * len(latencies)))] if latencies else 0.0
+
+
+def run_load(
+		url: str,
+		deliveries: List[Delivery],
+		secret: str,
+		concurrency: int = 16,
+		timeout: float = 120,
+		) -> LoadResult:
+	"""
+	Send the deliveries to the webhook endpoint, as fast as ``concurrency`` clients can.
+
+	:param url: The URL of the webhook endpoint.
+	:param deliveries:
+	:param secret: The webhook secret.
+	:param concurrency: The number of deliveries in flight at once.
+	:param timeout: The number of seconds to wait for each response.
+	"""
+
+	pending: "queue.Queue[Delivery]" = queue.Queue()
+	for delivery in deliveries:
+		pending.put(delivery)
+
+	latencies: List[float] = []
+	statuses: Counter = Counter()
+	lock = threading.Lock()
+
+	def client() -> None:
+		with requests.Session() as session:
+			while True:
+				try:
+					delivery = pending.get_nowait()
+				except queue.Empty:
+					return
+
+				headers, body = delivery.sign(secret)
+				start = time.perf_counter()
+
+				try:
+					status = session.post(url, data=body, headers=headers, timeout=timeout).status_code
+				except requests.RequestException:
+					status = 0
+
+				with lock:
+					latencies.append(time.perf_counter() - start)
+					statuses[status] += 1
+
+	start = time.perf_counter()
+	clients = [threading.Thread(target=client) for _ in range(concurrency)]
+	for thread in clients:
+		thread.start()
+	for thread in clients:
+		thread.join()
+
+	return LoadResult(time.perf_counter() - start, latencies, statuses)
+
+
+def worker_memory(master_pid: int) -> Dict[int, int]:
+	"""
+	Returns the peak resident set size, in bytes, of each of the gunicorn master's workers.
+
+	Only supported on Linux; elsewhere an empty dictionary is returned.
+
+	:param master_pid:
+	"""
+
+	memory = {}
+
+	for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+		if not entry.isdigit():
+			continue
+
+		try:
+			with open(f"/proc/{entry}/stat", encoding="UTF-8") as fp:
+				# The command may contain spaces, so split after its closing parenthesis.
+				ppid = int(fp.read().rsplit(')', 1)[1].split()[1])
+
+			if ppid != master_pid:
+				continue
+
+			with open(f"/proc/{entry}/status", encoding="UTF-8") as fp:
+				for line in fp:
+					if line.startswith("VmHWM:"):
+						memory[int(entry)] = int(line.split()[1]) * 1024
+		except (OSError, IndexError, ValueError):
+			continue
+
+	return memory
+
+
+def _free_port() -> int:
+	with socket.socket() as sock:
+		sock.bind(("127.0.0.1", 0))
+		return sock.getsockname()[1]
+
+
+def _queued_updates(database: str) -> Optional[int]:
+	try:
+		with sqlite3.connect(database) as connection:
+			return connection.execute("SELECT COUNT(*) FROM queued_update").fetchone()[0]
+	except sqlite3.Error:
+		return None
+
+
+def _generate_key() -> str:
+	key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+	return key.private_bytes(
+			serialization.Encoding.PEM,
+			serialization.PrivateFormat.TraditionalOpenSSL,
+			serialization.NoEncryption(),
+			).decode("UTF-8")
+
+
+def _run_config(
+		workers: int,
+		threads: int,
+		deliveries: List[Delivery],
+		github: FakeGitHub,
+		concurrency: int,
+		timeout: int,
+		app_dir: str,
+		) -> Dict[str, Any]:
+	secret = uuid.uuid4().hex
+	port = _free_port()
+
+	with tempfile.TemporaryDirectory() as tmpdir:
+		database = os.path.join(tmpdir, "loadtest.sqlite")
+		log_file = os.path.join(tmpdir, "gunicorn.log")
+
+		env = {
+				**os.environ,
+				"GITHUBAPP_ID": "1",
+				"GITHUBAPP_SECRET": secret,
+				"GITHUBAPP_KEY": _generate_key(),
+				"GITHUBAPP_URL": github.url,
+				"DATABASE_URL": f"sqlite:///{database}",
+				"RH_BOT_ROLE": "web",
+				}
+		env.pop("RH_BOT_IMPORTCHECK", None)
+
+		# Create the tables before the workers race to.
+		subprocess.run([sys.executable, "-c", "import app"], cwd=app_dir, env=env, check=True)
+
+		command = [
+				sys.executable,
+				"-m",
+				"gunicorn",
+				"app:app",
+				"--workers",
+				str(workers),
+				"--threads",
+				str(threads),
+				"--timeout",
+				str(timeout),
+				"--bind",
+				f"127.0.0.1:{port}",
+				]
+
+		with open(log_file, 'w', encoding="UTF-8") as log:
+			server = subprocess.Popen(command, cwd=app_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+		try:
+			url = f"http://127.0.0.1:{port}/"
+			deadline = time.monotonic() + 60
+
+			while True:
+				try:
+					requests.get(url, timeout=1)
+					break
+				except requests.RequestException:
+					if server.poll() is not None or time.monotonic() > deadline:
+						raise click.ClickException(f"gunicorn didn't start:\n{PathPlus(log_file).read_text()}")
+					time.sleep(0.2)
+
+			github.calls.clear()
+			result = run_load(url, deliveries, secret, concurrency=concurrency, timeout=timeout)
+			memory = worker_memory(server.pid)
+
+		finally:
+			server.terminate()
+			server.wait()
+
+		contention = len(_CONTENTION_RE.findall(PathPlus(log_file).read_text()))
+
+		queued = _queued_updates(database)
+
+	expected = sum(delivery.queues_update for delivery in deliveries)
+
+	return {
+			"workers": workers,
+			"threads": threads,
+			"requests": len(deliveries),
+			"throughput": len(deliveries) / result.duration if result.duration else 0.0,
+			"p50": result.percentile(50),
+			"p95": result.percentile(95),
+			"p99": result.percentile(99),
+			"max": max(result.latencies, default=0.0),
+			"error_rate": result.errors / len(deliveries) if deliveries else 0.0,
+			"statuses": dict(result.statuses),
+			"db_contention": contention,
+			"updates_queued": queued,
+			"updates_expected": expected,
+			"github_calls": sum(github.calls.values()),
+			"worker_peak_rss": sorted(memory.values()),
+			}
+
+
+@click.option(
+		"--config",
+		"configs",
+		multiple=True,
+		default=["2x1", "2x4", "4x1"],
+		show_default=True,
+		help="A gunicorn configuration to test, as WORKERSxTHREADS. May be given multiple times.",
+		)
+@click.option("--scenario", type=click.Choice(sorted(SCENARIOS)), default="mixed", show_default=True)
+@click.option("--requests", "count", type=click.INT, default=2000, show_default=True, help="Deliveries per config.")
+@click.option("--repositories", type=click.INT, default=50, show_default=True)
+@click.option("--concurrency", type=click.INT, default=32, show_default=True, help="Deliveries in flight at once.")
+@click.option("--github-latency", type=click.FLOAT, default=0.05, show_default=True, help="Seconds per API call.")
+@click.option("--timeout", type=click.INT, default=120, show_default=True, help="gunicorn's worker timeout.")
+@click.option("--seed", type=click.INT, default=0, show_default=True)
+@click.option("--app-dir", default='.', show_default=True, help="The directory containing app.py.")
+@click.option("--json", "as_json", is_flag=True, default=False, help="Print the results as JSON.")
+@click.command()
+def main(
+		configs: List[str],
+		scenario: str,
+		count: int,
+		repositories: int,
+		concurrency: int,
+		github_latency: float,
+		timeout: int,
+		seed: int,
+		app_dir: str,
+		as_json: bool,
+		) -> None:
+	"""
+	Fire signed webhook deliveries at the app under gunicorn, and report how each configuration copes.
+	"""
+
+	results = []
+
+	with FakeGitHub(latency=github_latency) as github:
+		deliveries = make_deliveries(scenario, count, repositories, github.url, seed=seed)
+
+		for config in configs:
+			workers, threads = map(int, config.lower().split('x'))
+			results.append(_run_config(workers, threads, deliveries, github, concurrency, timeout, app_dir))
+
+			if not as_json:
+				result = results[-1]
+				rss = ", ".join(f"{value / 1024 / 1024:.0f}" for value in result["worker_peak_rss"])
+				click.echo(
+						f"{workers} workers x {threads} threads: "
+						f"{result['throughput']:.1f} req/s, "
+						f"p50 {result['p50'] * 1000:.0f}ms, p95 {result['p95'] * 1000:.0f}ms, "
+						f"p99 {result['p99'] * 1000:.0f}ms, max {result['max'] * 1000:.0f}ms, "
+						f"errors {result['error_rate']:.1%}, "
+						f"DB contention {result['db_contention']}, "
+						f"updates queued {result['updates_queued']}/{result['updates_expected']}, "
+						f"GitHub calls {result['github_calls']}, "
+						f"peak RSS [{rss}] MiB"
+						)
+
+	if as_json:
+		click.echo(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+#
+#  locks.py
+"""
+Per-repository locks which prevent concurrent updates racing on the same branch.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import os
+import socket
+import threading
+import time
+import uuid
+from types import TracebackType
+from typing import Optional, Type
+
+# 3rd party
+import sqlalchemy.exc
+from sqlalchemy import or_
+
+# this package
+from repo_helper_bot.constants import app
+from repo_helper_bot.db import UpdateLock, db
+from repo_helper_bot.utils import log
+
+__all__ = ["LOCK_LEASE", "LOCK_POLL_INTERVAL", "RepositoryLock"]
+
+#: The number of seconds a lock is held for without being renewed before another worker may take it over.
+#: The holder renews it every third of this while the update runs.
+LOCK_LEASE: int = int(os.environ.get("RH_BOT_LOCK_LEASE", 120))
+
+#: The number of seconds to wait between attempts to acquire a lock.
+LOCK_POLL_INTERVAL: float = 2
+
+
+class RepositoryLock:
+	"""
+	A lease-based lock on updating a repository, stored in the database
+	so it is respected by all gunicorn workers and hosts.
+
+	The lease is renewed from a background thread for as long as the lock is held,
+	so it only expires if the holder's process dies or loses its connection to the database.
+
+	If the lock is already held, :meth:`~.acquire` either waits for it or gives up
+	after recording that another update is pending. The holder then calls
+	:meth:`~.take_pending` and runs again, collapsing any number of concurrent requests into one rerun.
+
+	:param repo_id: The ID of the GitHub repository.
+	:param lease: The number of seconds the lock is held for without being renewed
+		before it is considered abandoned by a crashed worker.
+	"""
+
+	def __init__(self, repo_id: int, lease: float = LOCK_LEASE):
+		self.repo_id = repo_id
+		self.lease = lease
+		self.holder = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}:{uuid.uuid4().hex[:8]}"
+		self.held = False
+		self._renewer: Optional[threading.Thread] = None
+		self._stop_renewing = threading.Event()
+
+	def _try_acquire(self) -> bool:
+		now = time.time()
+
+		try:
+			# Take over the lease if it has expired.
+			taken = UpdateLock.query.filter(
+					UpdateLock.repo_id == self.repo_id,
+					or_(UpdateLock.expires < now, UpdateLock.holder == self.holder),
+					).update(
+							{
+									"holder": self.holder,
+									"expires": now + self.lease,
+									"pending": False,
+									"pending_recreate": False,
+									},
+							synchronize_session=False,
+							)
+
+			if not taken:
+				# Fails with an IntegrityError if another worker holds the lease.
+				db.session.add(
+						UpdateLock(
+								repo_id=self.repo_id,
+								holder=self.holder,
+								expires=now + self.lease,
+								pending=False,
+								pending_recreate=False,
+								)
+						)
+
+			db.session.commit()
+
+		except sqlalchemy.exc.IntegrityError:
+			db.session.rollback()
+			return False
+
+		self.held = True
+		self._start_renewing()
+		return True
+
+	def acquire(self, wait: float = 0, recreate: bool = False) -> bool:
+		"""
+		Acquire the lock.
+
+		:param wait: The maximum number of seconds to wait for the lock if it is held by another worker.
+		:param recreate: Whether the update recreates the branch, which is passed on to the holder's rerun
+			if the lock isn't acquired.
+
+		:returns: Whether the lock was acquired. If not, the holder is asked to run again once it finishes.
+		"""
+
+		deadline = time.monotonic() + wait
+
+		while not self._try_acquire():
+			if time.monotonic() >= deadline:
+				values = {"pending": True}
+				if recreate:
+					values["pending_recreate"] = True
+
+				flagged = UpdateLock.query.filter_by(repo_id=self.repo_id).update(
+						values,
+						synchronize_session=False,
+						)
+				db.session.commit()
+
+				if flagged:
+					return False
+				else:
+					# The lock was released in the meantime.
+					continue
+
+			time.sleep(LOCK_POLL_INTERVAL)
+
+		return True
+
+	def take_pending(self) -> Optional[bool]:
+		"""
+		Release the lock, unless another update was requested while it was held.
+
+		Releasing the lock only succeeds if no update is pending, in the same statement,
+		so a request can't be recorded on a lock which is about to be released.
+
+		:returns: :py:obj:`None` if the lock was released. Otherwise the lock is kept for the rerun,
+			the request is cleared, and whether any of the requests recreates the branch is returned.
+		"""
+
+		released = UpdateLock.query.filter_by(
+				repo_id=self.repo_id,
+				holder=self.holder,
+				pending=False,
+				).delete(synchronize_session=False)
+		db.session.commit()
+
+		if released:
+			self._released()
+			return None
+
+		while True:
+			row = db.session.query(UpdateLock.pending_recreate).filter_by(
+					repo_id=self.repo_id,
+					holder=self.holder,
+					).first()
+
+			if row is None:
+				# The lease was taken over, so the new holder's update takes care of the request.
+				db.session.commit()
+				self._released()
+				return None
+
+			recreate = bool(row.pending_recreate)
+
+			# Another request may have asked for a recreate since the row was read, in which case go again.
+			cleared = UpdateLock.query.filter_by(
+					repo_id=self.repo_id,
+					holder=self.holder,
+					pending_recreate=recreate,
+					).update(
+							{"pending": False, "pending_recreate": False, "expires": time.time() + self.lease},
+							synchronize_session=False,
+							)
+			db.session.commit()
+
+			if cleared:
+				return recreate
+
+	def release(self) -> None:
+		"""
+		Release the lock, if it is held.
+		"""
+
+		if not self.held:
+			return
+
+		UpdateLock.query.filter_by(repo_id=self.repo_id, holder=self.holder).delete(synchronize_session=False)
+		db.session.commit()
+		self._released()
+
+	def _released(self) -> None:
+		self.held = False
+		self._stop_renewing.set()
+
+	def _start_renewing(self) -> None:
+		if self._renewer is not None and self._renewer.is_alive():
+			return
+
+		self._stop_renewing.clear()
+		self._renewer = threading.Thread(
+				target=self._renew,
+				name=f"repo-helper-lock-{self.repo_id}",
+				daemon=True,
+				)
+		self._renewer.start()
+
+	def _renew(self) -> None:
+		while not self._stop_renewing.wait(self.lease / 3):
+			try:
+				with app.app_context():
+					renewed = UpdateLock.query.filter_by(
+							repo_id=self.repo_id,
+							holder=self.holder,
+							).update(
+									{"expires": time.time() + self.lease},
+									synchronize_session=False,
+									)
+					db.session.commit()
+			except sqlalchemy.exc.SQLAlchemyError as e:
+				log(f"Unable to renew the lock on repository {self.repo_id}: {e}", type="ERROR")
+				continue
+			finally:
+				db.session.remove()
+
+			if not renewed:
+				log(f"The lock on repository {self.repo_id} was taken over by another worker.", type="WARNING")
+				return
+
+	def __enter__(self) -> "RepositoryLock":
+		return self
+
+	def __exit__(
+			self,
+			exc_type: Optional[Type[BaseException]],
+			exc_val: Optional[BaseException],
+			exc_tb: Optional[TracebackType],
+			) -> None:
+		self.release()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+#
+#  mirrors.py
+"""
+Local mirrors of the installed repositories, which share a single object store.
+
+Each repository has a bare mirror which borrows objects from the shared store through ``objects/info/alternates``.
+A repository is first fetched straight into the shared store, and later fetches into its mirror.
+Periodic maintenance moves the mirrors' objects into the shared store and repacks it,
+so blobs common to many repositories, such as CI workflows and documentation configuration, are only stored once.
+The shared store's refs are also offered to GitHub when fetching, so objects it already has aren't downloaded again.
+
+Run ``python -m repo_helper_bot.mirrors`` to run maintenance now.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+# 3rd party
+import click  # type: ignore[import-untyped]
+from domdf_python_tools.paths import PathPlus
+
+# this package
+from repo_helper_bot.limits import LimitExceeded, check_disk_usage
+from repo_helper_bot.utils import disk_usage, log
+
+__all__ = [
+		"MAINTENANCE_INTERVAL",
+		"MIRROR_CACHE",
+		"main",
+		"maintain",
+		"maybe_maintain",
+		"mirror_path",
+		"update_mirror",
+		]
+
+#: The directory containing the mirrors and the shared object store.
+MIRROR_CACHE = PathPlus(
+		os.environ.get("RH_BOT_MIRROR_CACHE", os.path.join(tempfile.gettempdir(), "repo-helper-bot-mirrors"))
+		)
+
+#: The minimum time, in seconds, between runs of :func:`~.maintain` by :func:`~.maybe_maintain`.
+MAINTENANCE_INTERVAL: float = float(os.environ.get("RH_BOT_MIRROR_MAINTENANCE_INTERVAL", 24 * 60 * 60))
+
+
+def _git(directory: PathPlus, *args: str) -> str:
+	return subprocess.run(
+			["git", *args],
+			cwd=directory,
+			check=True,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.PIPE,
+			).stdout.decode("UTF-8", errors="replace")
+
+
+def _fetch(mirror: PathPlus, *args: str) -> None:
+	# Like clone(), poll the disk usage so a huge repository can't fill the disk through the mirror.
+	# Only what this fetch adds counts towards the limit, as the mirror is kept between updates.
+
+	baseline = disk_usage(os.fspath(mirror))
+	command = ["git", "fetch", "--quiet", *args]
+
+	with tempfile.TemporaryFile() as stderr:
+		process = subprocess.Popen(command, cwd=mirror, stdout=subprocess.DEVNULL, stderr=stderr)
+
+		try:
+			while True:
+				try:
+					process.wait(timeout=5)
+					break
+				except subprocess.TimeoutExpired:
+					check_disk_usage(os.fspath(mirror), baseline)
+
+			check_disk_usage(os.fspath(mirror), baseline)
+
+		except LimitExceeded:
+			if process.poll() is None:
+				process.kill()
+				process.wait()
+
+			# A killed fetch leaves its partial pack behind.
+			for tmp_pack in (mirror / "objects" / "pack").glob("tmp_*"):
+				tmp_pack.unlink()
+
+			raise
+
+		stderr.seek(0)
+		output = stderr.read()
+
+	sys.stderr.write(output.decode("UTF-8", errors="replace"))
+
+	if process.returncode:
+		# The output is kept so the error can be classified as transient or not.
+		raise subprocess.CalledProcessError(process.returncode, command, stderr=output)
+
+
+@contextmanager
+def _lock(cache_dir: PathPlus, exclusive: bool = False) -> Iterator[None]:
+	# Mirrors are fetched under a shared lock, and maintenance takes an exclusive lock.
+
+	try:
+		# stdlib
+		import fcntl
+	except ImportError:  # pragma: no cover (Windows)
+		yield
+		return
+
+	cache_dir.maybe_make(parents=True)
+
+	with open(cache_dir / ".lock", 'w') as fp:
+		fcntl.flock(fp, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+		try:
+			yield
+		finally:
+			fcntl.flock(fp, fcntl.LOCK_UN)
+
+
+def _shared_store(cache_dir: PathPlus) -> PathPlus:
+	store = cache_dir / "shared.git"
+
+	if not (store / "objects").is_dir():
+		_git(cache_dir, "init", "--quiet", "--bare", "--template=", store.name)
+
+	return store
+
+
+def mirror_path(repository: Dict, cache_dir: PathPlus = MIRROR_CACHE) -> PathPlus:
+	"""
+	Returns the path to the bare mirror of the given repository, which may not exist yet.
+
+	:param repository: The repository, as returned by the GitHub API.
+	:param cache_dir:
+	"""
+
+	return cache_dir / "mirrors" / f"{repository['id']}.git"
+
+
+def update_mirror(repository: Dict, cache_dir: PathPlus = MIRROR_CACHE) -> PathPlus:
+	"""
+	Create or update the bare mirror of the given repository.
+
+	Only the branches and tags are mirrored.
+
+	:param repository: The repository, as returned by the GitHub API.
+	:param cache_dir:
+
+	:returns: The path to the mirror.
+
+	:raises LimitExceeded: If a fetch adds more than :data:`~.MAX_DISK_USAGE` bytes to the mirror or the store.
+	:raises subprocess.CalledProcessError: If ``git fetch`` fails.
+	"""
+
+	mirror = mirror_path(repository, cache_dir)
+
+	with _lock(cache_dir):
+		store = _shared_store(cache_dir)
+
+		if not (mirror / "objects").is_dir():
+			# Fetch the repository straight into the store, as maintenance would, so it isn't downloaded into the
+			# mirror and copied to the store later, and other new mirrors can offer its objects as haves right away.
+			# The mirror then already has every object through its alternates.
+			_fetch(
+					store,
+					"--force",
+					"--no-tags",
+					"--no-auto-gc",
+					repository["html_url"],
+					f"refs/heads/*:refs/mirrors/{mirror.stem}/heads/*",
+					f"refs/tags/*:refs/mirrors/{mirror.stem}/tags/*",
+					)
+
+			mirror.parent.maybe_make(parents=True)
+			_git(mirror.parent, "init", "--quiet", "--bare", "--template=", mirror.name)
+			(mirror / "objects" / "info" / "alternates").write_clean(os.fspath(store.abspath() / "objects"))
+
+			# Repacking a single mirror would copy the shared objects back into it.
+			_git(mirror, "config", "gc.auto", '0')
+
+			# Keep fetched objects in packs, which maintenance can drop once they're in the store.
+			_git(mirror, "config", "fetch.unpackLimit", '1')
+
+		_fetch(
+				mirror,
+				"--prune",
+				"--force",
+				repository["html_url"],
+				"refs/heads/*:refs/heads/*",
+				"refs/tags/*:refs/tags/*",
+				)
+
+		# So clones of the mirror check out the default branch.
+		_git(mirror, "symbolic-ref", "HEAD", f"refs/heads/{repository['default_branch']}")
+
+	return mirror
+
+
+def maintain(cache_dir: PathPlus = MIRROR_CACHE) -> None:
+	"""
+	Move the objects of every mirror into the shared object store, then repack it.
+
+	:param cache_dir:
+	"""
+
+	with _lock(cache_dir, exclusive=True):
+		store = _shared_store(cache_dir)
+		mirrors = {mirror.stem: mirror for mirror in (cache_dir / "mirrors").glob("*.git")}
+
+		for name, mirror in mirrors.items():
+			# The refs keep the objects reachable in the store, and are offered as haves when fetching.
+			_git(
+					store,
+					"fetch",
+					"--quiet",
+					"--prune",
+					"--force",
+					"--no-tags",
+					os.fspath(mirror.abspath()),
+					f"refs/*:refs/mirrors/{name}/*",
+					)
+
+			# Drop the mirror's copies of objects which are now in the store.
+			_git(mirror, "repack", "-a", "-d", "-l", "-q")
+
+		# Forget mirrors which have been deleted.
+		stale_refs = [
+				f"delete {ref}\n" for ref in _git(store, "for-each-ref", "--format=%(refname)", "refs/mirrors/").split()
+				if ref.split('/')[2] not in mirrors
+				]
+
+		if stale_refs:
+			subprocess.run(
+					["git", "update-ref", "--stdin"],
+					cwd=store,
+					input=''.join(stale_refs).encode("UTF-8"),
+					check=True,
+					)
+
+		_git(store, "gc", "--quiet")
+		(cache_dir / ".maintained").touch()
+
+	log(f"Repacked the shared object store for {len(mirrors)} mirrors.")
+
+
+def maybe_maintain(cache_dir: PathPlus = MIRROR_CACHE) -> None:
+	"""
+	Run :func:`~.maintain` if it hasn't been run in the last :data:`~.MAINTENANCE_INTERVAL` seconds.
+
+	:param cache_dir:
+	"""
+
+	stamp = cache_dir / ".maintained"
+
+	if not stamp.exists() or time.time() - stamp.stat().st_mtime >= MAINTENANCE_INTERVAL:
+		maintain(cache_dir)
+
+
+@click.command()
+def main() -> None:
+	"""
+	Move the mirrors' objects into the shared object store and repack it.
+	"""
+
+	maintain()
+
+
+if __name__ == "__main__":
+	main()
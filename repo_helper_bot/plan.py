@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+#
+#  plan.py
+"""
+Preview the changes ``repo_helper`` would make, without pushing, opening pull requests or writing to the database.
+
+Run ``python -m repo_helper_bot.plan`` to preview the changes for every installed repository.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import IO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# 3rd party
+import click  # type: ignore[import-untyped]
+from domdf_python_tools.paths import PathPlus
+
+# this package
+from repo_helper_bot.cache import run_repo_helper
+from repo_helper_bot.limits import LimitExceeded
+from repo_helper_bot.mirrors import update_mirror
+from repo_helper_bot.pool import get_context
+from repo_helper_bot.utils import log
+
+__all__ = ["CHECKOUT_CACHE", "PlanResult", "main", "plan_repositories", "plan_repository", "update_checkout"]
+
+#: The directory in which checkouts are cached between plans.
+CHECKOUT_CACHE = PathPlus(
+		os.environ.get("RH_BOT_CHECKOUT_CACHE", os.path.join(tempfile.gettempdir(), "repo-helper-bot-checkouts"))
+		)
+
+
+class PlanResult(NamedTuple):
+	"""
+	The changes ``repo_helper`` would make to a repository.
+	"""
+
+	#: The full name of the repository (``owner/name``).
+	full_name: str
+
+	#: The changes as a unified diff.
+	diff: str = ''
+
+	#: The files which would change, with the number of lines added and removed. Binary files have ``-1``.
+	files: List[Tuple[str, int, int]] = []
+
+	#: The reason the plan couldn't be made, if it failed.
+	error: Optional[str] = None
+
+	@property
+	def summary(self) -> str:
+		"""
+		A one-line summary of the plan.
+		"""
+
+		if self.error:
+			return f"{self.full_name}: error: {self.error}"
+		elif not self.files:
+			return f"{self.full_name}: up to date"
+
+		added = sum(max(a, 0) for _, a, _ in self.files)
+		removed = sum(max(r, 0) for _, _, r in self.files)
+		return f"{self.full_name}: {len(self.files)} files changed, {added} insertions(+), {removed} deletions(-)"
+
+
+def _git(directory: PathPlus, *args: str) -> str:
+	return subprocess.run(
+			["git", *args],
+			cwd=directory,
+			check=True,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.PIPE,
+			).stdout.decode("UTF-8", errors="replace")
+
+
+def update_checkout(repository: Dict, cache_dir: PathPlus = CHECKOUT_CACHE) -> PathPlus:
+	"""
+	Clone the repository into the cache, or update an existing checkout,
+	and check out a clean copy of the default branch.
+
+	:param repository: The repository, as returned by the GitHub API.
+	:param cache_dir:
+
+	:returns: The path to the checkout.
+	"""
+
+	checkout = cache_dir / repository["full_name"]
+	mirror = os.fspath(update_mirror(repository))
+
+	if (checkout / ".git").is_dir():
+		_git(checkout, "remote", "set-url", "origin", mirror)
+		_git(checkout, "fetch", "--quiet", "--prune", "origin")
+	else:
+		checkout.parent.maybe_make(parents=True)
+		_git(checkout.parent, "clone", "--quiet", "--no-checkout", "--shared", mirror, checkout.name)
+
+	_git(checkout, "checkout", "--quiet", "--force", "--detach", f"origin/{repository['default_branch']}")
+	_git(checkout, "clean", "--quiet", "-ffdx")
+
+	return checkout
+
+
+def plan_repository(repository: Dict, cache_dir: PathPlus = CHECKOUT_CACHE) -> PlanResult:
+	"""
+	Run ``repo_helper`` on a cached checkout of the repository's default branch and return the changes it made.
+
+	The checkout is left clean afterwards.
+
+	:param repository: The repository, as returned by the GitHub API.
+	:param cache_dir: The directory in which checkouts are cached.
+	"""
+
+	full_name = repository["full_name"]
+
+	try:
+		checkout = update_checkout(repository, cache_dir)
+	except subprocess.CalledProcessError as e:
+		return PlanResult(full_name, error=f"Unable to clone: {e.stderr.decode('UTF-8', errors='replace').strip()}")
+	except (LimitExceeded, OSError) as e:
+		return PlanResult(full_name, error=f"Unable to clone: {e}")
+
+	try:
+		managed_files = run_repo_helper(checkout)
+
+		_git(checkout, "add", "--all", '.')
+		diff = _git(
+				checkout,
+				"diff",
+				"--cached",
+				f"--src-prefix=a/{full_name}/",
+				f"--dst-prefix=b/{full_name}/",
+				"--",
+				*managed_files,
+				)
+		numstat = _git(checkout, "diff", "--cached", "--numstat", "--", *managed_files)
+
+	except FileNotFoundError:
+		return PlanResult(full_name, error="repo_helper.yml not found")
+	except Exception as e:
+		return PlanResult(full_name, error=f"{type(e).__name__}: {e}")
+	finally:
+		try:
+			_git(checkout, "reset", "--quiet", "--hard")
+			_git(checkout, "clean", "--quiet", "-ffdx")
+		except (subprocess.CalledProcessError, OSError) as e:
+			# Not fatal, as update_checkout() cleans the checkout before it is next used.
+			log(f"Unable to clean the checkout of {full_name}: {e}", type="WARNING")
+
+	files = []
+	for line in numstat.splitlines():
+		added, removed, filename = line.split('\t', 2)
+		files.append((filename, int(added) if added != '-' else -1, int(removed) if removed != '-' else -1))
+
+	return PlanResult(full_name, diff=diff, files=files)
+
+
+def plan_repositories(
+		repositories: Iterable[Dict],
+		jobs: int = os.cpu_count() or 1,
+		cache_dir: PathPlus = CHECKOUT_CACHE,
+		) -> Iterator[PlanResult]:
+	"""
+	Plan the given repositories in parallel, yielding the results as they complete.
+
+	:param repositories: Repositories, as returned by the GitHub API.
+	:param jobs: The number of repositories to plan at once.
+	:param cache_dir: The directory in which checkouts are cached.
+	"""
+
+	# Each repository is planned in its own process, as repo_helper changes the current working directory.
+	with ProcessPoolExecutor(max_workers=jobs, mp_context=get_context()) as executor:
+		futures = [executor.submit(plan_repository, repository, cache_dir) for repository in repositories]
+
+		for future in as_completed(futures):
+			yield future.result()
+
+
+@click.option(
+		"-j",
+		"--jobs",
+		type=click.INT,
+		default=os.cpu_count() or 1,
+		help="The number of repositories to plan at once.",
+		)
+@click.option("-o", "--output", type=click.File('w'), default='-', help="Write the combined diff to this file.")
+@click.option("-r", "--repository", "names", multiple=True, help="Only plan these repositories (owner/name).")
+@click.command()
+def main(jobs: int, output: IO[str], names: List[str]) -> None:
+	"""
+	Preview the changes repo_helper would make to every installed repository.
+	"""
+
+	# 3rd party
+	from github3_utils.apps import iter_installed_repos
+
+	# this package
+	from repo_helper_bot.constants import context_switcher
+
+	repositories = list(iter_installed_repos(context_switcher=context_switcher))
+	if names:
+		repositories = [r for r in repositories if r["full_name"] in names]
+
+	changed = failed = 0
+
+	for result in plan_repositories(repositories, jobs=jobs):
+		click.echo(result.summary, err=True)
+
+		if result.error:
+			failed += 1
+		elif result.files:
+			changed += 1
+			output.write(result.diff)
+
+	click.echo(f"{len(repositories)} repositories planned: {changed} would change, {failed} failed.", err=True)
+
+
+if __name__ == "__main__":
+	main()
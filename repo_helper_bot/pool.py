@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+#
+#  pool.py
+"""
+A pool of warm worker processes which run ``repo_helper``.
+
+Each worker imports ``repo_helper`` and :mod:`dulwich` and compiles the templates once,
+then handles many jobs before being replaced.
+Running ``repo_helper`` in a separate process also isolates the bot from
+its changes to the current working directory.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import multiprocessing
+import os
+import sys
+import threading
+from multiprocessing.connection import Connection
+from typing import Any, Callable, List, Optional, TypeVar
+
+# this package
+from repo_helper_bot.limits import MAX_WORKER_MEMORY, limit_memory
+from repo_helper_bot.utils import get_rss, log
+
+__all__ = ["POOL_SIZE", "PRELOAD", "WorkerDied", "WorkerPool", "get_context", "pool"]
+
+_T = TypeVar("_T")
+
+#: The number of worker processes. ``0`` runs jobs in the current process.
+POOL_SIZE: int = int(os.environ.get("RH_BOT_POOL_SIZE", 1))
+
+#: Modules imported by the fork server, so workers start with them already loaded.
+PRELOAD: List[str] = [
+		"dulwich.porcelain",
+		"jinja2",
+		"repo_helper.core",
+		"repo_helper.utils",
+		"repo_helper_bot.cache",
+		]
+
+
+class WorkerDied(RuntimeError):
+	"""
+	Raised when a worker process exits before finishing a job, for example if it ran out of memory.
+	"""
+
+
+def _warm_up() -> None:
+	# Compile every template into the shared bytecode cache.
+
+	# 3rd party
+	import jinja2
+	from repo_helper.core import import_registered_functions  # nodep
+	from repo_helper.templates import Environment, template_dir  # nodep
+
+	# this package
+	from repo_helper_bot.cache import bytecode_cache
+
+	import_registered_functions()
+
+	environment = Environment(  # nosec: B701
+		loader=jinja2.FileSystemLoader(str(template_dir)),
+		bytecode_cache=bytecode_cache,
+		)
+
+	for name in environment.list_templates():
+		try:
+			environment.get_template(name)
+		except (jinja2.TemplateError, UnicodeDecodeError):
+			# Not every file in the template directory is a template.
+			pass
+
+
+def _worker_main(conn: Connection, max_memory: int, path: Optional[str] = None) -> None:
+	if path is not None:
+		# Import repo_helper, and anything else not yet imported, from the given environment.
+		sys.path.insert(0, path)
+
+	limit_memory(max_memory)
+	_warm_up()
+
+	while True:
+		try:
+			message = conn.recv()
+		except EOFError:
+			return
+
+		if message is None:
+			return
+
+		func, args, kwargs = message
+
+		try:
+			conn.send((True, func(*args, **kwargs), get_rss()))
+		except Exception as e:
+			conn.send((False, e, get_rss()))
+
+
+def get_context() -> Any:
+	"""
+	Returns the :mod:`multiprocessing` context used to start worker processes.
+
+	Where possible workers are forked from a server which has already imported the :data:`~.PRELOAD` modules.
+	Forking the web process itself isn't safe, as it has other threads running.
+	"""
+
+	if "forkserver" in multiprocessing.get_all_start_methods():
+		context = multiprocessing.get_context("forkserver")
+		context.set_forkserver_preload(PRELOAD)
+		return context
+	else:
+		return multiprocessing.get_context("spawn")
+
+
+class _Worker:
+
+	def __init__(self, context: Any, max_memory: int, path: Optional[str] = None):
+		self.conn, child_conn = context.Pipe()
+		self.process = context.Process(target=_worker_main, args=(child_conn, max_memory, path), daemon=True)
+		self.process.start()
+		child_conn.close()
+		self.jobs = 0
+		self.rss = 0
+
+	def stop(self) -> None:
+		try:
+			self.conn.send(None)
+		except OSError:
+			pass
+
+		self.process.join(5)
+		if self.process.is_alive():
+			self.process.terminate()
+
+		self.conn.close()
+
+
+class WorkerPool:
+	"""
+	A pool of long-lived worker processes.
+
+	:param size: The number of worker processes.
+	:param max_jobs: The number of jobs after which a worker is replaced.
+	:param max_rss: The resident set size, in bytes, above which a worker is replaced after its current job.
+	:param max_memory: The address space, in bytes, above which a worker raises :exc:`MemoryError`.
+	:param path: A directory containing a different version of ``repo_helper`` for the workers to import.
+		These workers are started afresh rather than from the fork server, which has already imported the default version.
+	"""
+
+	def __init__(
+			self,
+			size: int = POOL_SIZE,
+			max_jobs: int = 100,
+			max_rss: int = 512 * 1024 * 1024,
+			max_memory: int = MAX_WORKER_MEMORY,
+			path: Optional[str] = None,
+			):
+		self.size = size
+		self.max_jobs = max_jobs
+		self.max_rss = max_rss
+		self.max_memory = max_memory
+		self.path = path
+		self._context: Any = None
+		self._idle: List[_Worker] = []
+		self._started = 0
+		self._condition = threading.Condition()
+
+	def _get_context(self) -> Any:
+		if self._context is None:
+			if self.path is None:
+				self._context = get_context()
+			else:
+				self._context = multiprocessing.get_context("spawn")
+
+		return self._context
+
+	def _checkout(self) -> _Worker:
+		with self._condition:
+			while not self._idle and self._started >= self.size:
+				self._condition.wait()
+
+			if self._idle:
+				return self._idle.pop()
+
+			self._started += 1
+
+		try:
+			return _Worker(self._get_context(), self.max_memory, self.path)
+		except BaseException:
+			self._discard()
+			raise
+
+	def _checkin(self, worker: _Worker) -> None:
+		if worker.jobs >= self.max_jobs or worker.rss >= self.max_rss:
+			log(f"Recycling worker {worker.process.pid} after {worker.jobs} jobs ({worker.rss // 1048576} MiB)")
+			worker.stop()
+			self._discard()
+		else:
+			with self._condition:
+				self._idle.append(worker)
+				self._condition.notify()
+
+	def _discard(self) -> None:
+		with self._condition:
+			self._started -= 1
+			self._condition.notify()
+
+	def run(self, func: Callable[..., _T], *args: Any, **kwargs: Any) -> _T:
+		"""
+		Call ``func(*args, **kwargs)`` in a worker process and return the result.
+
+		``func``, its arguments and its return value must be picklable.
+		Exceptions raised by ``func`` are re-raised in the calling process.
+
+		:param func:
+		:param args:
+		:param kwargs:
+		"""
+
+		if self.size <= 0:
+			return func(*args, **kwargs)
+
+		worker = self._checkout()
+
+		try:
+			worker.conn.send((func, args, kwargs))
+			success, result, worker.rss = worker.conn.recv()
+		except (EOFError, OSError) as e:
+			worker.stop()
+			self._discard()
+			raise WorkerDied(f"Worker {worker.process.pid} exited with code {worker.process.exitcode}") from e
+
+		worker.jobs += 1
+		self._checkin(worker)
+
+		if not success:
+			raise result
+
+		return result
+
+	def shutdown(self) -> None:
+		"""
+		Stop all idle workers.
+		"""
+
+		with self._condition:
+			idle, self._idle = self._idle, []
+			self._started -= len(idle)
+
+		for worker in idle:
+			worker.stop()
+
+
+#: The worker pool for this process.
+pool = WorkerPool()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+#
+#  profiling.py
+"""
+Opt-in profiling of repository updates.
+
+Set :envvar:`RH_BOT_PROFILE_REPOS` to a comma-separated list of repositories (``owner/name``) to profile,
+and/or :envvar:`RH_BOT_PROFILE_SAMPLE_RATE` to profile that fraction of all updates.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import cProfile
+import json
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from types import TracebackType
+from typing import Any, Callable, Dict, Iterator, Optional, Type, TypeVar
+
+# 3rd party
+from requests import Response
+
+# this package
+from repo_helper_bot.constants import client
+from repo_helper_bot.db import ProfileArtifact, db
+from repo_helper_bot.pool import WorkerPool
+from repo_helper_bot.sampling import StackSampler, _merge_stats, _stack, profile_call
+from repo_helper_bot.utils import disk_usage, log
+
+__all__ = [
+		"PROFILE_REPOS",
+		"PROFILE_RETENTION",
+		"PROFILE_SAMPLE_RATE",
+		"UpdateProfiler",
+		"count_api_call",
+		"should_profile",
+		]
+
+_T = TypeVar("_T")
+
+#: Repositories (``owner/name``) which are always profiled.
+PROFILE_REPOS = frozenset(filter(None, os.environ.get("RH_BOT_PROFILE_REPOS", '').split(',')))
+
+#: The fraction of all other updates which are profiled.
+PROFILE_SAMPLE_RATE: float = float(os.environ.get("RH_BOT_PROFILE_SAMPLE_RATE", 0))
+
+#: The number of profiles kept in the database.
+PROFILE_RETENTION: int = int(os.environ.get("RH_BOT_PROFILE_RETENTION", 200))
+
+
+def should_profile(full_name: str) -> bool:
+	"""
+	Returns whether the update of the given repository should be profiled.
+
+	:param full_name: The full name of the repository (``owner/name``).
+	"""
+
+	return full_name in PROFILE_REPOS or random.random() < PROFILE_SAMPLE_RATE  # nosec: B311
+
+
+_api_calls = threading.local()
+
+
+def count_api_call(response: Response, *args: Any, **kwargs: Any) -> None:
+	"""
+	Response hook which counts the requests made to the GitHub API by the current thread.
+
+	:param response:
+	"""
+
+	_api_calls.count = getattr(_api_calls, "count", 0) + 1
+
+
+client.session.hooks["response"].append(count_api_call)
+
+
+class UpdateProfiler:
+	"""
+	Records the time taken by each stage of an update and, if enabled, profiles it.
+
+	Stage timings are always recorded, as they are cheap. When enabled the update is also run
+	under :mod:`cProfile`, and a background thread samples the update's stack (for a flame graph)
+	and the resident set size of the process.
+
+	:param enabled: Whether to profile the update.
+	:param on_stage: Called with the name of each stage as it starts, to report progress.
+	"""
+
+	def __init__(self, enabled: bool = False, on_stage: Optional[Callable[[str], None]] = None):
+		self.enabled = enabled
+		self.on_stage = on_stage
+
+		#: Mapping of stage names to their duration in seconds.
+		self.stages: Dict[str, float] = {}
+
+		self.duration = 0.0
+		self.peak_rss = 0
+		self.disk_usage = 0
+
+		#: The number of bytes downloaded by the clone.
+		self.bytes_cloned = 0
+
+		#: The number of files changed by ``repo_helper``.
+		self.files_changed = 0
+
+		#: The number of requests made to the GitHub API.
+		self.api_calls = 0
+
+		self._profile: Optional[cProfile.Profile] = None
+		self._stacks: Counter = Counter()
+		self._worker_stats: Dict = {}
+		self._worker_rss = 0
+		self._sampler: Optional[StackSampler] = None
+		self._start = 0.0
+		self._api_calls_start = 0
+
+	@contextmanager
+	def stage(self, name: str) -> Iterator[None]:
+		"""
+		Context manager to record the time taken by a stage of the update.
+
+		:param name:
+		"""
+
+		if self.on_stage is not None:
+			self.on_stage(name)
+
+		start = time.perf_counter()
+
+		try:
+			yield
+		finally:
+			self.stages[name] = self.stages.get(name, 0) + time.perf_counter() - start
+
+	def measure_disk(self, directory: str) -> None:
+		"""
+		Record the disk usage of ``directory`` if it is the largest seen so far.
+
+		:param directory:
+		"""
+
+		if self.enabled:
+			self.disk_usage = max(self.disk_usage, disk_usage(directory))
+
+	def run_in_pool(self, pool: WorkerPool, func: Callable[..., _T], *args: Any, **kwargs: Any) -> _T:
+		"""
+		Call ``func(*args, **kwargs)`` in a worker process from ``pool`` and return the result.
+
+		When profiling is enabled the call is profiled in the worker, and the worker's statistics,
+		stacks and memory usage are merged into this profile.
+
+		:param pool:
+		:param func:
+		:param args:
+		:param kwargs:
+		"""
+
+		if not self.enabled or pool.size <= 0:
+			# Calls made in this process are already being profiled.
+			return pool.run(func, *args, **kwargs)
+
+		prefix = ';'.join(_stack(sys._getframe(1)))
+
+		# The worker samples its own stacks, which replace this thread waiting for it.
+		if self._sampler is not None:
+			self._sampler.paused.set()
+
+		try:
+			result, profile = pool.run(profile_call, func, *args, **kwargs)
+		finally:
+			if self._sampler is not None:
+				self._sampler.paused.clear()
+
+		_merge_stats(self._worker_stats, marshal.loads(profile.stats))
+		for stack, count in profile.stacks.items():
+			self._stacks[f"{prefix};{stack}"] += count
+		self._worker_rss = max(self._worker_rss, profile.peak_rss)
+
+		return result
+
+	def __enter__(self) -> "UpdateProfiler":
+		self._start = time.perf_counter()
+		self._api_calls_start = getattr(_api_calls, "count", 0)
+
+		if self.enabled:
+			self._sampler = StackSampler(threading.get_ident(), self._stacks)
+			self._sampler.start()
+
+			self._profile = cProfile.Profile()
+			self._profile.enable()
+
+		return self
+
+	def __exit__(
+			self,
+			exc_type: Optional[Type[BaseException]],
+			exc_val: Optional[BaseException],
+			exc_tb: Optional[TracebackType],
+			) -> None:
+		if self._profile is not None:
+			self._profile.disable()
+
+		if self._sampler is not None:
+			self._sampler.stop()
+			self.peak_rss = self._sampler.peak_rss
+
+		self.duration = time.perf_counter() - self._start
+		self.api_calls = getattr(_api_calls, "count", 0) - self._api_calls_start
+
+	def _stats(self) -> Dict:
+		# The cProfile statistics of this process and any worker processes.
+
+		assert self._profile is not None
+		self._profile.create_stats()
+		stats = dict(self._profile.stats)
+		_merge_stats(stats, self._worker_stats)
+		return stats
+
+	def folded_stacks(self) -> str:
+		"""
+		Returns the sampled stacks in the collapsed format used by ``flamegraph.pl`` and speedscope.
+		"""
+
+		return ''.join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+	def save(self, repo_id: int, full_name: str) -> Optional[int]:
+		"""
+		Store the profile in the database, and return its ID.
+
+		Older profiles beyond :data:`~.PROFILE_RETENTION` are deleted.
+
+		:param repo_id:
+		:param full_name: The full name of the repository (``owner/name``).
+
+		:returns: :py:obj:`None` if profiling wasn't enabled.
+		"""
+
+		if self._profile is None:
+			return None
+
+		artifact = ProfileArtifact(
+				repo_id=repo_id,
+				full_name=full_name,
+				created=time.time(),
+				duration=self.duration,
+				peak_rss=self.peak_rss + self._worker_rss,
+				disk_usage=self.disk_usage,
+				stages=json.dumps(self.stages),
+				pstats=marshal.dumps(self._stats()),
+				folded=self.folded_stacks(),
+				)
+		db.session.add(artifact)
+		db.session.commit()
+
+		expired = ProfileArtifact.query.order_by(db.desc(ProfileArtifact.created)).offset(PROFILE_RETENTION)
+		expired_ids = [row.id for row in expired.with_entities(ProfileArtifact.id)]
+		if expired_ids:
+			ProfileArtifact.query.filter(ProfileArtifact.id.in_(expired_ids)).delete(synchronize_session=False)
+			db.session.commit()
+
+		log(f"Saved profile {artifact.id} for {full_name} ({self.duration:.1f}s)")
+		return artifact.id
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+#
+#  retry.py
+"""
+Retries and circuit breakers for calls to GitHub.
+
+Transient errors, such as timeouts, dropped connections, rate limits and server errors, are retried with exponential backoff,
+as long as the repository's retry budget allows.
+If calls keep failing the circuit breaker opens, and further calls fail fast
+until GitHub has had time to recover.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import os
+import random
+import re
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+from subprocess import CalledProcessError
+from typing import Any, Callable, Deque, Dict, TypeVar
+
+# 3rd party
+import requests
+from dulwich.client import HTTPUnauthorized
+from dulwich.errors import GitProtocolError, HangupException
+from github3.exceptions import GitHubError, ServerError, TransportError
+
+# this package
+from repo_helper_bot.utils import log
+
+__all__ = [
+		"BREAKER_RESET_TIMEOUT",
+		"BREAKER_THRESHOLD",
+		"CircuitBreaker",
+		"CircuitOpen",
+		"RETRY_ATTEMPTS",
+		"RETRY_BUDGET",
+		"RetryBudget",
+		"breakers",
+		"check_breakers",
+		"is_transient",
+		"retry_budget",
+		"with_retries",
+		]
+
+_T = TypeVar("_T")
+
+#: The maximum number of attempts at each call.
+RETRY_ATTEMPTS: int = int(os.environ.get("RH_BOT_RETRY_ATTEMPTS", 4))
+
+#: The delay, in seconds, before the first retry. Each later retry waits twice as long.
+RETRY_DELAY: float = 2
+
+#: The maximum delay, in seconds, between retries.
+RETRY_MAX_DELAY: float = 60
+
+#: The number of retries allowed for each repository in :data:`~.RETRY_BUDGET_WINDOW`.
+RETRY_BUDGET: int = int(os.environ.get("RH_BOT_RETRY_BUDGET", 10))
+
+#: The window, in seconds, over which :data:`~.RETRY_BUDGET` applies.
+RETRY_BUDGET_WINDOW: float = 3600
+
+#: The number of consecutive transient failures which opens a circuit breaker.
+BREAKER_THRESHOLD: int = int(os.environ.get("RH_BOT_BREAKER_THRESHOLD", 5))
+
+#: The time, in seconds, an open circuit breaker waits before letting a trial call through.
+BREAKER_RESET_TIMEOUT: float = float(os.environ.get("RH_BOT_BREAKER_RESET_TIMEOUT", 120))
+
+_transient_git_errors = re.compile(
+		r"could not resolve host|connection (timed out|reset|refused)|operation timed out|early eof|rpc failed"
+		r"|remote end hung up|returned error: (5\d\d|429)|unexpected http resp (5\d\d|429)"
+		r"|internal server error|service unavailable|temporary failure",
+		re.IGNORECASE,
+		)
+
+
+def is_transient(exception: BaseException) -> bool:
+	"""
+	Returns whether the given exception is likely to go away if the call is retried.
+
+	:param exception:
+	"""
+
+	if isinstance(exception, (ServerError, TransportError, HangupException)):
+		return True
+
+	if isinstance(exception, GitHubError):
+		# Secondary rate limits are reported as 403.
+		return exception.code == 429 or (exception.code == 403 and "rate limit" in str(exception.msg).lower())
+
+	if isinstance(exception, HTTPUnauthorized):
+		return False
+
+	if isinstance(exception, GitProtocolError):
+		return bool(_transient_git_errors.search(str(exception)))
+
+	if isinstance(exception, CalledProcessError):
+		stderr = exception.stderr or b''
+		if isinstance(stderr, bytes):
+			stderr = stderr.decode("UTF-8", errors="replace")
+		return bool(_transient_git_errors.search(stderr))
+
+	if isinstance(exception, requests.RequestException):
+		response = exception.response
+		return response is None or response.status_code >= 500 or response.status_code == 429
+
+	return isinstance(exception, (socket.timeout, ConnectionError, TimeoutError))
+
+
+class CircuitOpen(Exception):
+	"""
+	Raised instead of making a call while its circuit breaker is open.
+	"""
+
+
+class CircuitBreaker:
+	"""
+	Stops calls to a service after repeated transient failures.
+
+	After :data:`~.BREAKER_THRESHOLD` consecutive failures the breaker opens and calls fail with :exc:`~.CircuitOpen`.
+	Once ``reset_timeout`` seconds have passed a single trial call is let through (the breaker is half open):
+	if it succeeds the breaker closes, otherwise it opens again.
+
+	:param name:
+	:param threshold: The number of consecutive failures which opens the breaker.
+	:param reset_timeout: The time, in seconds, to wait before letting a trial call through.
+	"""
+
+	def __init__(self, name: str, threshold: int = BREAKER_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+		self.name = name
+		self.threshold = threshold
+		self.reset_timeout = reset_timeout
+		self.failures = 0
+		self.opened = 0.0
+		self.trial = False
+		self._lock = threading.Lock()
+
+	@property
+	def state(self) -> str:
+		"""
+		``closed``, ``open`` or ``half_open``.
+		"""
+
+		if self.failures < self.threshold:
+			return "closed"
+		elif time.time() - self.opened < self.reset_timeout:
+			return "open"
+		else:
+			return "half_open"
+
+	def check(self) -> None:
+		"""
+		Raise :exc:`~.CircuitOpen` if calls should not be made.
+		"""
+
+		with self._lock:
+			state = self.state
+
+			if state == "closed":
+				return
+			elif state == "half_open" and not self.trial:
+				self.trial = True
+				return
+
+		raise CircuitOpen(f"GitHub {self.name} calls are failing; retry after {self.retry_after:.0f}s.")
+
+	@property
+	def retry_after(self) -> float:
+		"""
+		The time, in seconds, until a trial call will be let through.
+		"""
+
+		if self.failures < self.threshold:
+			return 0
+
+		return max(0.0, self.opened + self.reset_timeout - time.time())
+
+	def record_success(self) -> None:
+		"""
+		Record that a call succeeded, closing the breaker.
+		"""
+
+		with self._lock:
+			if self.failures >= self.threshold:
+				log(f"Circuit breaker for GitHub {self.name} calls closed")
+
+			self.failures = 0
+			self.trial = False
+
+	def record_failure(self) -> None:
+		"""
+		Record that a call failed with a transient error.
+		"""
+
+		with self._lock:
+			self.failures += 1
+			self.trial = False
+
+			if self.failures >= self.threshold:
+				if self.failures == self.threshold:
+					log(f"Circuit breaker for GitHub {self.name} calls opened")
+				self.opened = time.time()
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""
+		Returns the state of the breaker.
+		"""
+
+		return {
+				"state": self.state,
+				"consecutive_failures": self.failures,
+				"retry_after": self.retry_after,
+				}
+
+
+class RetryBudget:
+	"""
+	Limits the number of retries for each repository, so a repository which keeps failing can't monopolise the worker.
+
+	:param retries: The number of retries allowed in each window.
+	:param window: The length of the window, in seconds.
+	"""
+
+	def __init__(self, retries: int = RETRY_BUDGET, window: float = RETRY_BUDGET_WINDOW):
+		self.retries = retries
+		self.window = window
+		self._spent: Dict[int, Deque[float]] = defaultdict(deque)
+		self._lock = threading.Lock()
+
+	def spend(self, repo_id: int) -> bool:
+		"""
+		Take a retry from the repository's budget.
+
+		:param repo_id:
+
+		:returns: :py:obj:`False` if the budget has been used up.
+		"""
+
+		now = time.time()
+
+		with self._lock:
+			spent = self._spent[repo_id]
+			while spent and spent[0] < now - self.window:
+				spent.popleft()
+
+			if len(spent) >= self.retries:
+				return False
+
+			spent.append(now)
+			return True
+
+
+#: Circuit breakers for git operations (clone and push) and REST API calls.
+breakers: Dict[str, CircuitBreaker] = {"git": CircuitBreaker("git"), "api": CircuitBreaker("api")}
+
+#: The retry budget shared by all updates in this process.
+retry_budget = RetryBudget()
+
+
+def check_breakers() -> None:
+	"""
+	Raise :exc:`~.CircuitOpen` if any circuit breaker is open, so work can be shed before it starts.
+	"""
+
+	for breaker in breakers.values():
+		if breaker.state == "open":
+			raise CircuitOpen(f"GitHub {breaker.name} calls are failing; retry after {breaker.retry_after:.0f}s.")
+
+
+def with_retries(breaker: str, repo_id: int, func: Callable[..., _T], *args: Any, **kwargs: Any) -> _T:
+	"""
+	Call ``func(*args, **kwargs)``, retrying transient errors with exponential backoff.
+
+	:param breaker: The name of the circuit breaker guarding the call, either ``'git'`` or ``'api'``.
+	:param repo_id: The ID of the repository whose retry budget is used.
+	:param func:
+	:param args:
+	:param kwargs:
+
+	:raises CircuitOpen: If the circuit breaker is open.
+	"""
+
+	circuit_breaker = breakers[breaker]
+	attempt = 1
+
+	while True:
+		circuit_breaker.check()
+
+		try:
+			result = func(*args, **kwargs)
+		except Exception as e:
+			if not is_transient(e):
+				# GitHub responded, so it is healthy enough.
+				circuit_breaker.record_success()
+				raise
+
+			circuit_breaker.record_failure()
+
+			if attempt >= RETRY_ATTEMPTS or not retry_budget.spend(repo_id):
+				raise
+
+			delay = min(RETRY_DELAY * 2**(attempt - 1), RETRY_MAX_DELAY) * random.uniform(0.5, 1)  # nosec: B311
+			log(f"Retrying {getattr(func, '__name__', func)} in {delay:.1f}s after {type(e).__name__}: {e}")
+			time.sleep(delay)
+			attempt += 1
+		else:
+			circuit_breaker.record_success()
+			return result
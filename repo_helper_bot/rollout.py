@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+#
+#  rollout.py
+"""
+Staged rollout of new versions of ``repo_helper``.
+
+Rather than applying a new version to every repository in the next sweep,
+a rollout applies it to a growing percentage of repositories (plus an optional cohort which goes first).
+Each step is only widened once enough updates have succeeded with the new version,
+and a rollout whose success rate drops too low is paused.
+
+The new version is installed into a separate environment and run in its own pool of workers,
+so repositories outside the rollout carry on using the version the bot was deployed with.
+
+Run ``python -m repo_helper_bot.rollout --help`` to start and control rollouts.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+# 3rd party
+import click  # type: ignore[import-untyped]
+from domdf_python_tools.paths import PathPlus
+
+# this package
+from repo_helper_bot.db import Rollout, db
+from repo_helper_bot.pool import POOL_SIZE, WorkerPool
+from repo_helper_bot.utils import get_repo_helper_version, log
+
+__all__ = [
+		"DEFAULT_STEPS",
+		"ENVIRONMENTS",
+		"MAX_VERSION_UPDATES",
+		"get_active_rollout",
+		"get_pool",
+		"in_rollout",
+		"install_environment",
+		"main",
+		"record_result",
+		"rollout_for",
+		"start_rollout",
+		]
+
+#: The directory in which the environment for each rollout is installed.
+ENVIRONMENTS = PathPlus(
+		os.environ.get("RH_BOT_ENVIRONMENTS", os.path.join(tempfile.gettempdir(), "repo-helper-bot-environments"))
+		)
+
+#: The default percentages of repositories a new version is applied to at each step of a rollout.
+DEFAULT_STEPS = (1, 5, 25, 50, 100)
+
+#: The maximum number of repositories updated in a single sweep only because their ``repo_helper`` version changed.
+MAX_VERSION_UPDATES: int = int(os.environ.get("RH_BOT_MAX_VERSION_UPDATES", 25))
+
+_pools: Dict[str, WorkerPool] = {}
+_pools_lock = threading.Lock()
+
+
+def install_environment(requirement: str, path: PathPlus) -> None:
+	"""
+	Install ``repo_helper`` into the given directory, unless it has already been installed.
+
+	:param requirement: The pip requirement to install, e.g. ``git+https://github.com/repo-helper/repo_helper@<sha>``.
+	:param path:
+	"""
+
+	if path.is_dir():
+		return
+
+	path.parent.maybe_make(parents=True)
+	tmpdir = PathPlus(tempfile.mkdtemp(dir=path.parent, prefix=f".{path.name}-"))
+
+	try:
+		log(f"Installing {requirement} into {path}")
+		subprocess.run(
+				[sys.executable, "-m", "pip", "install", "--quiet", "--target", tmpdir, requirement],
+				check=True,
+				stdout=subprocess.PIPE,
+				stderr=subprocess.PIPE,
+				)
+
+		try:
+			os.rename(tmpdir, path)
+		except OSError:
+			# Another worker installed it first.
+			if not path.is_dir():
+				raise
+	finally:
+		shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def get_pool(requirement: str) -> WorkerPool:
+	"""
+	Returns a pool of workers which run the given version of ``repo_helper``,
+	installing it first if necessary.
+
+	:param requirement: The pip requirement the version is installed from.
+	"""
+
+	with _pools_lock:
+		if requirement not in _pools:
+			path = ENVIRONMENTS / hashlib.sha256(requirement.encode("UTF-8")).hexdigest()[:16]
+			install_environment(requirement, path)
+			_pools[requirement] = WorkerPool(size=max(POOL_SIZE, 1), path=str(path))
+
+		return _pools[requirement]
+
+
+def get_active_rollout() -> Optional[Rollout]:
+	"""
+	Returns the latest rollout, unless it was aborted or its version is the one the bot was deployed with.
+	"""
+
+	rollout: Optional[Rollout] = Rollout.query.order_by(Rollout.id.desc()).first()
+
+	if rollout is None or rollout.status == "aborted" or rollout.version == get_repo_helper_version():
+		return None
+
+	return rollout
+
+
+def _bucket(rollout: Rollout, repository: Dict) -> float:
+	# A stable position in [0, 100) for the repository, shuffled differently for each rollout.
+	digest = hashlib.sha256(f"{rollout.id}:{repository['id']}".encode("UTF-8")).hexdigest()
+	return int(digest[:8], 16) / 0x100000000 * 100
+
+
+def in_rollout(rollout: Rollout, repository: Dict) -> bool:
+	"""
+	Returns whether the rollout's version currently applies to the given repository.
+
+	:param rollout:
+	:param repository: The repository, as returned by the GitHub API.
+	"""
+
+	cohort = json.loads(rollout.cohort)
+	if repository["full_name"] in cohort or repository["owner"]["login"] in cohort:
+		return True
+
+	return _bucket(rollout, repository) < rollout.percentage
+
+
+def rollout_for(repository: Dict) -> Optional[Rollout]:
+	"""
+	Returns the rollout whose version should be used to update the given repository,
+	or :py:obj:`None` to use the version the bot was deployed with.
+
+	:param repository: The repository, as returned by the GitHub API.
+	"""
+
+	rollout = get_active_rollout()
+
+	if rollout is not None and in_rollout(rollout, repository):
+		return rollout
+
+	return None
+
+
+def record_result(rollout_id: int, success: bool) -> None:
+	"""
+	Record the outcome of running the rollout's version on a repository,
+	then pause or widen the rollout if its current step has enough results.
+
+	:param rollout_id:
+	:param success: Whether ``repo_helper`` ran successfully.
+	"""
+
+	column = Rollout.successes if success else Rollout.failures
+	Rollout.query.filter_by(id=rollout_id).update({column: column + 1}, synchronize_session=False)
+	db.session.commit()
+
+	rollout: Rollout = Rollout.query.populate_existing().get(rollout_id)
+	runs = rollout.successes + rollout.failures
+
+	if rollout.status != "active" or runs < rollout.min_runs:
+		return
+
+	success_rate = rollout.successes / runs
+
+	if success_rate < rollout.min_success_rate:
+		rollout.status = "paused"
+		log(f"Pausing rollout of {rollout.version}: {success_rate:.0%} of {runs} runs succeeded.")
+	elif time.time() - rollout.step_started < rollout.min_step_duration:
+		return
+	elif rollout.step + 1 < len(json.loads(rollout.steps)):
+		rollout.step += 1
+		rollout.step_started = time.time()
+		rollout.successes = rollout.failures = 0
+		log(f"Widening rollout of {rollout.version} to {rollout.percentage}% of repositories.")
+	else:
+		rollout.status = "complete"
+		log(f"Rollout of {rollout.version} complete.")
+
+	db.session.commit()
+
+
+def start_rollout(
+		requirement: str,
+		steps: Iterable[float] = DEFAULT_STEPS,
+		cohort: Iterable[str] = (),
+		min_runs: int = 10,
+		min_success_rate: float = 0.95,
+		min_step_duration: float = 3600,
+		) -> Rollout:
+	"""
+	Start rolling out a new version of ``repo_helper``, replacing any rollout in progress.
+
+	:param requirement: The pip requirement to install, e.g. ``git+https://github.com/repo-helper/repo_helper@<sha>``.
+	:param steps: The percentage of repositories to apply the version to at each step.
+	:param cohort: Owners and ``owner/name`` full names to apply the version to from the first step.
+	:param min_runs: The number of runs needed at each step before it can be widened.
+	:param min_success_rate: The fraction of runs at each step which must succeed for it to be widened.
+	:param min_step_duration: The minimum time, in seconds, to spend at each step.
+	"""
+
+	# Install the version before touching the database, as it can take a while.
+	version = get_pool(requirement).run(get_repo_helper_version)
+
+	now = time.time()
+	rollout = Rollout(
+			requirement=requirement,
+			version=version,
+			steps=json.dumps(list(steps)),
+			cohort=json.dumps(list(cohort)),
+			created=now,
+			step_started=now,
+			min_runs=min_runs,
+			min_success_rate=min_success_rate,
+			min_step_duration=min_step_duration,
+			)
+
+	Rollout.query.filter(Rollout.status.in_(["active", "paused"])).update(
+			{Rollout.status: "aborted"}, synchronize_session=False
+			)
+	db.session.add(rollout)
+	db.session.commit()
+
+	log(f"Rolling out {version} to {rollout.percentage}% of repositories.")
+
+	return rollout
+
+
+def _set_status(status: str) -> None:
+	rollout: Optional[Rollout] = Rollout.query.order_by(Rollout.id.desc()).first()
+
+	if rollout is None:
+		raise click.ClickException("There are no rollouts.")
+
+	rollout.status = status
+	if status == "active":
+		rollout.step_started = time.time()
+		rollout.successes = rollout.failures = 0
+
+	db.session.commit()
+	click.echo(repr(rollout))
+
+
+@click.group()
+def main() -> None:
+	"""
+	Roll out new versions of repo_helper to a growing share of repositories.
+	"""
+
+
+@click.option(
+		"--steps",
+		default=','.join(map(str, DEFAULT_STEPS)),
+		help="Comma-separated percentages of repositories to apply the version to at each step.",
+		)
+@click.option("--cohort", multiple=True, help="An owner or owner/name to apply the version to from the first step.")
+@click.option("--min-runs", type=click.INT, default=10, help="The number of runs needed before widening a step.")
+@click.option("--min-success-rate", type=click.FLOAT, default=0.95, help="The success rate needed to widen a step.")
+@click.option("--min-step-duration", type=click.FLOAT, default=3600, help="The minimum seconds spent at each step.")
+@click.argument("requirement")
+@main.command()
+def start(
+		requirement: str,
+		steps: str,
+		cohort: List[str],
+		min_runs: int,
+		min_success_rate: float,
+		min_step_duration: float,
+		) -> None:
+	"""
+	Start rolling out REQUIREMENT, e.g. git+https://github.com/repo-helper/repo_helper@<sha>.
+	"""
+
+	rollout = start_rollout(
+			requirement,
+			steps=[float(step) for step in steps.split(',')],
+			cohort=cohort,
+			min_runs=min_runs,
+			min_success_rate=min_success_rate,
+			min_step_duration=min_step_duration,
+			)
+
+	click.echo(repr(rollout))
+
+
+@main.command()
+def status() -> None:
+	"""
+	Show the progress of the latest rollout.
+	"""
+
+	rollout: Optional[Rollout] = Rollout.query.order_by(Rollout.id.desc()).first()
+
+	if rollout is None:
+		click.echo("There are no rollouts.")
+	else:
+		click.echo(json.dumps(rollout.to_dict(), indent=2))
+
+
+@main.command()
+def pause() -> None:
+	"""
+	Stop widening the latest rollout. Repositories already included keep the new version.
+	"""
+
+	_set_status("paused")
+
+
+@main.command()
+def resume() -> None:
+	"""
+	Resume widening the latest rollout, counting runs afresh from the current step.
+	"""
+
+	_set_status("active")
+
+
+@main.command()
+def abort() -> None:
+	"""
+	Abort the latest rollout. Repositories are returned to the deployed version by later sweeps.
+	"""
+
+	_set_status("aborted")
+
+
+if __name__ == "__main__":
+	main()
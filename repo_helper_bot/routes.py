@@ -27,18 +27,48 @@ HTTP routes.
 #
 
 # stdlib
-from textwrap import wrap
-from typing import Tuple
+import concurrent.futures
+import json
+import time
+from textwrap import indent
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 # 3rd party
+from flask import Response, abort, jsonify, request, stream_with_context, url_for
 from github3_utils.apps import iter_installed_repos
 
 # this package
 from repo_helper_bot.constants import app, context_switcher
-from repo_helper_bot.updater import update_repository
-from repo_helper_bot.utils import commit_as_bot
+from repo_helper_bot.db import Lease, ProfileArtifact, QueuedUpdate, Rollout, UpdateJob, WorkerNode, db
+from repo_helper_bot.history import run_stats
+from repo_helper_bot.jobs import JobTracker, create_job, format_traceback
+from repo_helper_bot.retry import breakers
+from repo_helper_bot.scheduler import Priority, scheduler
 
-__all__ = ["home", "request_run"]
+__all__ = [
+		"breaker_status",
+		"cluster_status",
+		"home",
+		"job_events",
+		"job_status",
+		"list_profiles",
+		"profile_flamegraph",
+		"profile_pstats",
+		"queue_status",
+		"request_run",
+		"rollout_status",
+		"run_statistics",
+		"start_job",
+		]
+
+#: The interval, in seconds, at which clients should poll for a job's progress.
+JOB_POLL_INTERVAL = 2
+
+#: The maximum time, in seconds, to keep a stream of a job's progress open.
+JOB_EVENTS_TIMEOUT = 60
+
+#: The maximum time, in seconds, to wait for a requested run to finish before responding with its job instead.
+REQUEST_TIMEOUT = 30
 
 
 @app.route('/')
@@ -50,29 +80,59 @@ def home() -> str:
 	return "This is repo-helper-bot, running on dokku.\n"
 
 
+def _find_repository(full_name: str) -> Optional[Dict]:
+	context_switcher.login_as_app()
+
+	for repository_dict in iter_installed_repos(context_switcher=context_switcher):
+		if repository_dict["full_name"] == full_name:
+			return repository_dict
+
+	return None
+
+
 @app.route("/request/<username>/<repository>/")
-def request_run(username: str, repository: str) -> Tuple[str, int]:  # noqa: PRM002
+def request_run(  # noqa: PRM002
+		username: str,
+		repository: str,
+		) -> Union[Tuple[str, int], Tuple[str, int, Dict[str, str]]]:
 	"""
-	Route for the homepage.
+	Route to run the bot for a repository.
+
+	If the run takes longer than :data:`~.REQUEST_TIMEOUT` seconds the response is a ``202``,
+	linking to the job which can be polled for its progress.
 	"""
 
-	context_switcher.login_as_app()
 	full_name = f"{username}/{repository}"
+	repository_dict = _find_repository(full_name)
+
+	if repository_dict is None:
+		return "Repository not found, or repo-helper-bot not installed on it.\n", 404
 
-	with commit_as_bot():
-		for repository_dict in iter_installed_repos(context_switcher=context_switcher):
-			if repository_dict["full_name"] == full_name:
-				result = update_repository(repository_dict)
-				break
-		else:
-			return "Repository not found, or repo-helper-bot not installed on it.\n", 404
+	job = create_job(full_name)
+	future = scheduler.submit(
+			repository_dict,
+			Priority.INTERACTIVE,
+			wait=60,
+			tracker=JobTracker(job.id),
+			trigger="request",
+			).future
+
+	try:
+		result = future.result(timeout=REQUEST_TIMEOUT)
+	except concurrent.futures.TimeoutError:
+		# Don't tie up the web worker; the update carries on in the background.
+		job_url = url_for("job_status", job_id=job.id)
+		return (
+				f"<h2>Running for {full_name}.</h2><p>Follow its progress at <a href='{job_url}'>{job_url}</a>.</p>",
+				202,
+				{"Location": job_url},
+				)
 
 	if result.msg:
 		print(result.msg)
 
 	if result.exception:
-		# TODO: print full traceback
-		error_block = '\n'.join(f"\t{line}" for line in wrap(str(result.exception)))
+		error_block = indent(format_traceback(result.exception), '\t')
 		print(f"The error was:\n{error_block}")
 
 	if result.ret:
@@ -81,3 +141,206 @@ def request_run(username: str, repository: str) -> Tuple[str, int]:  # noqa: PRM
 		return f"<h2>Run successful for {full_name}.</h2><h3>View the PR at <a href='https://github.com/{full_name}/pull/{result.pr_number}'>github.com/{full_name}/pull/{result.pr_number}</a></h3>", 200
 	else:
 		return f"<h2>Run successful for {full_name}.</h2>", 200
+
+
+@app.route("/jobs/", methods=["POST"])
+def start_job() -> Tuple[Dict[str, Any], int, Dict[str, str]]:
+	"""
+	Route to queue an update of the repository given by the ``repository`` field (``owner/name``),
+	as either JSON or form data.
+
+	Responds immediately with the job, and a ``Location`` header giving the URL to poll for its progress.
+	"""
+
+	full_name = (request.get_json(silent=True) or request.form).get("repository")
+	if not full_name:
+		abort(400, "The 'repository' field is required.")
+
+	repository_dict = _find_repository(full_name)
+	if repository_dict is None:
+		abort(404, "Repository not found, or repo-helper-bot not installed on it.")
+
+	job = create_job(full_name)
+	scheduler.submit(repository_dict, Priority.INTERACTIVE, wait=60, tracker=JobTracker(job.id), trigger="api")
+
+	return job.to_dict(), 202, {"Location": url_for("job_status", job_id=job.id)}
+
+
+@app.route("/jobs/<job_id>/")
+def job_status(job_id: str) -> Response:
+	"""
+	Route reporting the progress of a job, and its result once finished.
+
+	The response has an ``ETag``, so polling clients can send ``If-None-Match`` and get an empty ``304`` response
+	until something changes. Unfinished jobs also suggest when to poll again with ``Retry-After``.
+	"""
+
+	job = UpdateJob.query.get_or_404(job_id)
+
+	response = jsonify(job.to_dict())
+	response.add_etag()
+
+	if job.finished is None:
+		response.headers["Retry-After"] = str(JOB_POLL_INTERVAL)
+
+	response.make_conditional(request)
+	return response
+
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id: str) -> Response:
+	"""
+	Route streaming the progress of a job as server-sent events.
+
+	A ``progress`` event is sent whenever a new stage starts, then a ``result`` event once the job has finished.
+	The stream closes after :data:`~.JOB_EVENTS_TIMEOUT` seconds, and the client may reconnect.
+	"""
+
+	UpdateJob.query.get_or_404(job_id)
+
+	def stream() -> Iterator[str]:
+		deadline = time.monotonic() + JOB_EVENTS_TIMEOUT
+		last = None
+
+		yield f"retry: {JOB_POLL_INTERVAL * 1000}\n\n"
+
+		while True:
+			data = UpdateJob.query.get(job_id).to_dict()
+
+			# Return the connection to the pool while waiting, rather than holding it for the whole stream.
+			db.session.close()
+
+			if data != last:
+				event = "progress" if data["finished"] is None else "result"
+				yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+				last = data
+
+			if data["finished"] is not None or time.monotonic() > deadline:
+				return
+
+			time.sleep(JOB_POLL_INTERVAL)
+
+	return Response(
+			stream_with_context(stream()),
+			mimetype="text/event-stream",
+			headers={"Cache-Control": "no-cache"},
+			)
+
+
+@app.route("/status/queue/")
+def queue_status() -> Dict[str, Dict[str, float]]:
+	"""
+	Route reporting the number of queued updates, and how long updates waited, for each priority class.
+	"""
+
+	return scheduler.stats()
+
+
+@app.route("/status/breakers/")
+def breaker_status() -> Dict[str, Dict[str, Any]]:
+	"""
+	Route reporting the state of the circuit breakers for calls to GitHub.
+	"""
+
+	return {name: breaker.to_dict() for name, breaker in breakers.items()}
+
+
+@app.route("/status/cluster/")
+def cluster_status() -> Dict[str, Any]:
+	"""
+	Route reporting the processes running the bot, and which of them is the leader.
+	"""
+
+	leader: Optional[Lease] = Lease.query.get("leader")
+	now = time.time()
+
+	return {
+			"leader": leader.holder if leader is not None and leader.expires > now else None,
+			"workers": [{
+					"id": worker.id,
+					"role": worker.role,
+					"started": worker.started,
+					"heartbeat": worker.heartbeat,
+					} for worker in WorkerNode.query.order_by(WorkerNode.id)],
+			"running": QueuedUpdate.query.filter_by(status="running").count(),
+			}
+
+
+@app.route("/status/rollout/")
+def rollout_status() -> Dict[str, Any]:
+	"""
+	Route reporting the progress of the latest rollout of a new ``repo_helper`` version.
+	"""
+
+	rollout = Rollout.query.order_by(Rollout.id.desc()).first()
+
+	if rollout is None:
+		return {}
+
+	return rollout.to_dict()
+
+
+@app.route("/stats/runs/")
+def run_statistics() -> Dict[str, List[Dict[str, Any]]]:
+	"""
+	Route for the number of updates, failures, and the median and 95th percentile duration of recent updates.
+
+	Query parameters:
+
+	* ``group`` -- ``repository`` (the default), ``stage`` or ``trigger``.
+	* ``days`` -- the number of days of history to include. Defaults to 7.
+	* ``bucket`` -- ``hour`` or ``day``, to also group the updates over time.
+	* ``repository`` -- only include updates of this repository (``owner/name``).
+	"""
+
+	try:
+		stats = run_stats(
+				group=request.args.get("group", "repository"),
+				days=request.args.get("days", 7, type=float),
+				bucket=request.args.get("bucket"),
+				full_name=request.args.get("repository"),
+				)
+	except ValueError as e:
+		abort(400, str(e))
+
+	return {"runs": stats}
+
+
+@app.route("/profiles/")
+def list_profiles() -> Dict[str, List[Dict[str, Any]]]:
+	"""
+	Route listing the stored update profiles, newest first.
+
+	Pass ``?repository=owner/name`` to only list profiles for that repository.
+	"""
+
+	query = ProfileArtifact.query.order_by(db.desc(ProfileArtifact.created))
+
+	if "repository" in request.args:
+		query = query.filter_by(full_name=request.args["repository"])
+
+	return {"profiles": [artifact.to_dict() for artifact in query.limit(100)]}
+
+
+@app.route("/profiles/<int:profile_id>/flamegraph.folded")
+def profile_flamegraph(profile_id: int) -> Response:
+	"""
+	Route for the sampled stacks of an update, for use with ``flamegraph.pl`` or speedscope.
+	"""
+
+	artifact = ProfileArtifact.query.get(profile_id) or abort(404)
+	return Response(artifact.folded, mimetype="text/plain")
+
+
+@app.route("/profiles/<int:profile_id>/profile.pstats")
+def profile_pstats(profile_id: int) -> Response:
+	"""
+	Route for the :mod:`cProfile` output of an update, which can be loaded with :class:`pstats.Stats`.
+	"""
+
+	artifact = ProfileArtifact.query.get(profile_id) or abort(404)
+	return Response(
+			artifact.pstats,
+			mimetype="application/octet-stream",
+			headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.pstats"},
+			)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+#
+#  sampling.py
+"""
+Profiling of functions called in worker processes.
+
+This module is unpickled by every worker which runs a profiled job,
+so it only imports the standard library and modules the workers have already imported.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import cProfile
+import marshal
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from types import FrameType
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+
+# this package
+from repo_helper_bot.utils import get_rss
+
+__all__ = ["SAMPLE_INTERVAL", "StackSampler", "WorkerProfile", "profile_call"]
+
+_T = TypeVar("_T")
+
+#: The number of seconds between stack samples.
+SAMPLE_INTERVAL: float = 0.005
+
+
+def _frame_name(frame: FrameType) -> str:
+	code = frame.f_code
+	return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame: Optional[FrameType]) -> List[str]:
+	# The names of the frames in the stack, outermost first.
+
+	stack = []
+	while frame is not None:
+		stack.append(_frame_name(frame))
+		frame = frame.f_back
+
+	return stack[::-1]
+
+
+def _merge_stats(target: Dict, source: Dict) -> None:
+	# Add the cProfile statistics in source to those in target, as pstats.Stats.add() does.
+
+	for func, stat in source.items():
+		target[func] = pstats.add_func_stats(target.get(func, (0, 0, 0, 0, {})), stat)  # type: ignore[attr-defined]
+
+
+class StackSampler:
+	"""
+	Background thread which samples the stack of a thread, and the resident set size of the process.
+
+	:param thread_id: The identifier of the thread to sample.
+	:param stacks: The counter to add the sampled stacks to, in the collapsed format.
+	"""
+
+	def __init__(self, thread_id: int, stacks: Optional[Counter] = None):
+		self.thread_id = thread_id
+
+		#: Mapping of sampled stacks to the number of times they were seen.
+		self.stacks: Counter = Counter() if stacks is None else stacks
+
+		#: The peak resident set size of the process, in bytes.
+		self.peak_rss = 0
+
+		#: While set, the resident set size is sampled but the stack isn't.
+		self.paused = threading.Event()
+
+		self._stop = threading.Event()
+		self._thread: Optional[threading.Thread] = None
+
+	def _run(self) -> None:
+		while not self._stop.wait(SAMPLE_INTERVAL):
+			self.peak_rss = max(self.peak_rss, get_rss())
+
+			if self.paused.is_set():
+				continue
+
+			stack = _stack(sys._current_frames().get(self.thread_id))
+			if stack:
+				self.stacks[';'.join(stack)] += 1
+
+	def start(self) -> None:
+		"""
+		Start sampling.
+		"""
+
+		self.peak_rss = get_rss()
+		self._thread = threading.Thread(target=self._run, name="repo-helper-profiler", daemon=True)
+		self._thread.start()
+
+	def stop(self) -> None:
+		"""
+		Stop sampling, and wait for the background thread to exit.
+		"""
+
+		self._stop.set()
+
+		if self._thread is not None:
+			self._thread.join()
+
+
+class WorkerProfile(NamedTuple):
+	"""
+	The profile of a function called in a worker process by :func:`~.profile_call`.
+	"""
+
+	#: :mod:`cProfile` statistics, serialised with :mod:`marshal`.
+	stats: bytes
+
+	#: Mapping of sampled stacks, in the collapsed format, to the number of times they were seen.
+	stacks: Dict[str, int]
+
+	#: The peak resident set size of the worker process, in bytes.
+	peak_rss: int
+
+
+def profile_call(func: Callable[..., _T], *args: Any, **kwargs: Any) -> Tuple[_T, WorkerProfile]:
+	"""
+	Call ``func(*args, **kwargs)`` under :mod:`cProfile` and the stack sampler,
+	and return its result along with the profile.
+
+	This is called in a worker process by :meth:`UpdateProfiler.run_in_pool() <.UpdateProfiler.run_in_pool>`.
+
+	:param func:
+	:param args:
+	:param kwargs:
+	"""
+
+	sampler = StackSampler(threading.get_ident())
+	profile = cProfile.Profile()
+
+	sampler.start()
+	profile.enable()
+
+	try:
+		result = func(*args, **kwargs)
+	finally:
+		profile.disable()
+		sampler.stop()
+
+	profile.create_stats()
+
+	return result, WorkerProfile(
+			stats=marshal.dumps(profile.stats),
+			stacks=dict(sampler.stacks),
+			peak_rss=sampler.peak_rss,
+			)
@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+#
+#  scheduler.py
+"""
+Priority-aware scheduling of repository updates.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from enum import IntEnum
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# 3rd party
+import sqlalchemy.exc
+from sqlalchemy import case, func
+
+# this package
+from repo_helper_bot.cluster import ROLE, node, worker_id
+from repo_helper_bot.constants import app, client_lock
+from repo_helper_bot.db import InstallationTurn, QueuedUpdate, db
+from repo_helper_bot.jobs import JOB_RETENTION, JobTracker, format_traceback
+from repo_helper_bot.throttle import check_throttle
+from repo_helper_bot.updater import UpdateResult, update_repository
+from repo_helper_bot.utils import commit_as_bot, log
+
+__all__ = [
+		"AGING_INTERVAL",
+		"CLAIM_BATCH",
+		"POLL_INTERVAL",
+		"Job",
+		"Priority",
+		"Scheduler",
+		"UpdateFailed",
+		"scheduler",
+		]
+
+#: The number of seconds a job must wait to be promoted by one priority class, up to :attr:`~.Priority.INTERACTIVE`.
+AGING_INTERVAL: float = 300
+
+#: The number of seconds between checks of the queue for jobs submitted, or finished, by other processes.
+POLL_INTERVAL: float = 2
+
+#: The number of queued jobs considered when claiming the next one to run.
+CLAIM_BATCH: int = 50
+
+
+class Priority(IntEnum):
+	"""
+	The priority classes of update jobs. Lower values run first.
+	"""
+
+	#: Commands from users, such as ``@repo-helper recreate`` and the ``/request/`` route.
+	INTERACTIVE = 0
+
+	#: Updates triggered by a push to the repository.
+	PUSH = 1
+
+	#: Periodic sweeps over every installed repository.
+	SWEEP = 2
+
+
+class UpdateFailed(Exception):
+	"""
+	Raised by the future of a job which raised an exception in another process.
+	"""
+
+
+class Job:
+	"""
+	A request to update a repository.
+
+	:param repository: The repository, as returned by the GitHub API.
+	:param priority:
+	:param recreate: Whether to recreate the ``repo-helper-update`` branch from scratch.
+	:param wait: The maximum number of seconds to wait for another update of the repository to finish.
+	:param tracker: Records the job's progress and result, for jobs requested through the job API.
+	:param trigger: What requested the update. Defaults to the name of the priority class.
+	"""
+
+	def __init__(
+			self,
+			repository: Dict,
+			priority: Priority,
+			recreate: bool = False,
+			wait: float = 0,
+			tracker: Optional[JobTracker] = None,
+			trigger: Optional[str] = None,
+			):
+		self.id = uuid.uuid4().hex  # noqa: A003  # pylint: disable=redefined-builtin
+		self.repository = repository
+		self.priority = priority
+		self.recreate = recreate
+		self.wait = wait
+		self.tracker = tracker
+		self.trigger = trigger or priority.name.lower()
+		self.submitted = time.time()
+
+		#: Resolves to the :class:`~.UpdateResult` once the job has run.
+		self.future: "Future[UpdateResult]" = Future()
+
+	@classmethod
+	def from_queue(cls, queued: QueuedUpdate) -> "Job":
+		"""
+		Construct a job from its entry in the queue.
+
+		:param queued:
+		"""
+
+		job = cls(
+				json.loads(queued.repository),
+				Priority(queued.priority),
+				recreate=queued.recreate,
+				wait=queued.wait,
+				tracker=JobTracker(queued.job_id) if queued.job_id is not None else None,
+				trigger=queued.trigger,
+				)
+		job.id = queued.id
+		job.submitted = queued.submitted
+
+		return job
+
+	@property
+	def installation(self) -> str:
+		"""
+		The account the repository belongs to, used to share work fairly between installations.
+		"""
+
+		return self.repository["owner"]["login"]
+
+	def effective_priority(self, now: float) -> int:
+		"""
+		The priority of the job, raised by one class for every :data:`~.AGING_INTERVAL` seconds it has waited.
+
+		:param now: The current time, from :func:`time.time`.
+		"""
+
+		return max(Priority.INTERACTIVE, self.priority - int((now - self.submitted) // AGING_INTERVAL))
+
+	def __repr__(self) -> str:
+		return f"<Job {self.repository['full_name']!r} ({self.priority.name})>"
+
+
+class _WaitStats:
+	# Queue wait times for a single priority class.
+
+	def __init__(self, samples: int = 1000):
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+		self.recent: Deque[float] = deque(maxlen=samples)
+
+	def add(self, waited: float) -> None:
+		self.count += 1
+		self.total += waited
+		self.max = max(self.max, waited)
+		self.recent.append(waited)
+
+	def as_dict(self) -> Dict[str, float]:
+		recent = sorted(self.recent)
+
+		def percentile(p: float) -> float:
+			if not recent:
+				return 0.0
+			return recent[min(len(recent) - 1, int(p * len(recent)))]
+
+		return {
+				"count": self.count,
+				"mean": self.total / self.count if self.count else 0.0,
+				"p50": percentile(0.5),
+				"p95": percentile(0.95),
+				"max": self.max,
+				}
+
+
+class Scheduler:
+	"""
+	Runs repository updates in background threads, interactive commands first.
+
+	Jobs are queued in the database, so any process with the ``worker`` or ``all`` :data:`~.ROLE` can run them,
+	on any host. Workers claim jobs with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the database supports it.
+
+	Jobs are promoted by one class for every :data:`~.AGING_INTERVAL` seconds they wait,
+	so sweeps still make progress under a steady stream of pushes and commands.
+	Within each class installations take turns, across all processes, and each installation's oldest job runs first,
+	so one account with hundreds of repositories can't hold up the others.
+
+	:param workers: The number of worker threads.
+		The GitHub client and the bot's git identity are global, so this should normally be ``1``.
+	:param run_jobs: Whether this process runs jobs, or only queues them for other processes.
+	"""
+
+	def __init__(self, workers: int = 1, run_jobs: bool = ROLE != "web"):
+		self.workers = workers
+		self.run_jobs = run_jobs
+
+		# Jobs submitted by this process which haven't been claimed yet, so their futures can be resolved.
+		self._waiting: Dict[str, Job] = {}
+
+		self._wait_stats: Dict[Priority, _WaitStats] = {p: _WaitStats() for p in Priority}
+		self._condition = threading.Condition()
+		self._threads: List[threading.Thread] = []
+		self._watcher: Optional[threading.Thread] = None
+
+	def submit(
+			self,
+			repository: Dict,
+			priority: Priority,
+			recreate: bool = False,
+			wait: float = 0,
+			tracker: Optional[JobTracker] = None,
+			trigger: Optional[str] = None,
+			) -> Job:
+		"""
+		Queue an update of the given repository.
+
+		:param repository: The repository, as returned by the GitHub API.
+		:param priority:
+		:param recreate: Whether to recreate the ``repo-helper-update`` branch from scratch.
+		:param wait: The maximum number of seconds to wait for another update of the repository to finish.
+		:param tracker: Records the job's progress and result.
+		:param trigger: What requested the update. Defaults to the name of the priority class.
+		"""
+
+		job = Job(repository, priority, recreate=recreate, wait=wait, tracker=tracker, trigger=trigger)
+
+		# Reject throttled updates before they reach the queue, let alone a worker.
+		reason = None if recreate else check_throttle(repository)
+		if reason is not None:
+			result = UpdateResult(msg=reason, ret=1)
+			if tracker is not None:
+				tracker.finished(result)
+			job.future.set_result(result)
+			log(reason)
+			return job
+
+		QueuedUpdate.query.filter(
+				QueuedUpdate.finished < job.submitted - JOB_RETENTION,
+				).delete(synchronize_session=False)
+
+		db.session.add(
+				QueuedUpdate(
+						id=job.id,
+						repo_id=repository["id"],
+						full_name=repository["full_name"],
+						installation=job.installation,
+						repository=json.dumps(repository),
+						priority=int(priority),
+						recreate=recreate,
+						wait=wait,
+						trigger=job.trigger,
+						job_id=tracker.job_id if tracker is not None else None,
+						status="queued",
+						submitted=job.submitted,
+						)
+				)
+
+		try:
+			db.session.commit()
+		except sqlalchemy.exc.SQLAlchemyError:
+			db.session.rollback()
+			raise
+
+		# Only once the job is queued, or its future would never be resolved.
+		# If another process finishes it before then, _watch() still finds the result.
+		with self._condition:
+			self._waiting[job.id] = job
+			self._condition.notify()
+
+		self.start()
+		return job
+
+	def start(self) -> None:
+		"""
+		Start this process's worker threads, if it runs jobs, and its heartbeats.
+		"""
+
+		# Threads are started lazily so they are created in the gunicorn worker, not the master.
+		node.start()
+
+		with self._condition:
+			if self._watcher is None or not self._watcher.is_alive():
+				self._watcher = threading.Thread(target=self._watch, name="repo-helper-watcher", daemon=True)
+				self._watcher.start()
+
+			if not self.run_jobs:
+				return
+
+			self._threads = [thread for thread in self._threads if thread.is_alive()]
+
+			while len(self._threads) < self.workers:
+				thread = threading.Thread(target=self._work, name="repo-helper-scheduler", daemon=True)
+				thread.start()
+				self._threads.append(thread)
+
+	def _claim(self) -> Optional[Job]:
+		# Returns the next job to run, after marking it as claimed by this process.
+
+		now = time.time()
+
+		# The same as Job.effective_priority(), in a form the database can sort by.
+		# No job can be promoted by more classes than there are.
+		promotions: List[Tuple[Any, Any]] = [
+				(QueuedUpdate.submitted <= now - levels * AGING_INTERVAL, QueuedUpdate.priority - levels)
+				for levels in range(len(Priority) - 1, 0, -1)
+				]
+		promoted = case(promotions, else_=QueuedUpdate.priority)
+		effective = case([(promoted < int(Priority.INTERACTIVE), int(Priority.INTERACTIVE))], else_=promoted)
+
+		served = db.session.query(InstallationTurn.served).filter(
+				InstallationTurn.installation == QueuedUpdate.installation,
+				).correlate(QueuedUpdate).as_scalar()
+
+		# The oldest job of the installation whose turn it is, within the best effective priority class.
+		candidates = QueuedUpdate.query.filter_by(status="queued").order_by(
+				effective,
+				func.coalesce(served, 0),
+				QueuedUpdate.submitted,
+				).limit(CLAIM_BATCH).with_for_update(skip_locked=True).all()
+
+		for queued in candidates:
+			# Also guards against other workers where SKIP LOCKED isn't supported.
+			claimed = QueuedUpdate.query.filter_by(id=queued.id, status="queued").update(
+					{
+							"status": "running",
+							"claimed_by": worker_id(),
+							"claimed": now,
+							"attempts": QueuedUpdate.attempts + 1,
+							},
+					synchronize_session=False,
+					)
+
+			if claimed:
+				db.session.commit()
+				self._take_turn(queued.installation, now)
+
+				with self._condition:
+					job = self._waiting.pop(queued.id, None)
+
+				return job or Job.from_queue(queued)
+
+		db.session.commit()
+		return None
+
+	@staticmethod
+	def _take_turn(installation: str, now: float) -> None:
+		# Send the installation to the back of the line, in every process.
+
+		for _ in range(2):
+			try:
+				updated = InstallationTurn.query.filter_by(installation=installation).update(
+						{"served": now},
+						synchronize_session=False,
+						)
+
+				if not updated:
+					# Fails with an IntegrityError if another process added it first, in which case update it.
+					db.session.add(InstallationTurn(installation=installation, served=now))
+
+				db.session.commit()
+				return
+
+			except sqlalchemy.exc.IntegrityError:
+				db.session.rollback()
+
+	def _work(self) -> None:
+		while True:
+			try:
+				with app.app_context():
+					job = self._claim()
+			except sqlalchemy.exc.SQLAlchemyError as e:
+				log(f"Unable to claim a job: {e}", type="ERROR")
+				job = None
+			finally:
+				db.session.remove()
+
+			if job is None:
+				with self._condition:
+					self._condition.wait(POLL_INTERVAL)
+				continue
+
+			waited = time.time() - job.submitted
+			self._wait_stats[job.priority].add(waited)
+
+			log(f"Running {job!r} after waiting {waited:.1f}s")
+			self._run(job)
+
+	def _run(self, job: Job) -> None:
+		if not job.future.set_running_or_notify_cancel():
+			with app.app_context():
+				self._finish(job.id, status="cancelled")
+			db.session.remove()
+			return
+
+		tracker = job.tracker
+
+		try:
+			with app.app_context(), client_lock, commit_as_bot():
+				if tracker is not None:
+					tracker.started()
+
+				result = update_repository(
+						job.repository,
+						recreate=job.recreate,
+						wait=job.wait,
+						progress=tracker,
+						trigger=job.trigger,
+						)
+
+				if tracker is not None:
+					tracker.finished(result)
+
+				self._finish(job.id, status="done", ret=result.ret, pr_number=result.pr_number, msg=result.msg)
+		except Exception as e:
+			log(f"{job!r} failed: {e}", type="ERROR")
+
+			with app.app_context():
+				db.session.rollback()
+
+				if tracker is not None:
+					tracker.failed(e)
+
+				self._finish(job.id, status="error", msg=str(e), error=format_traceback(e))
+
+			job.future.set_exception(e)
+		else:
+			log(result.msg)
+			job.future.set_result(result)
+		finally:
+			db.session.remove()
+
+	@staticmethod
+	def _finish(job_id: str, **values: Any) -> None:
+		# Record the outcome of the job, for the process which submitted it.
+
+		QueuedUpdate.query.filter_by(id=job_id).update(
+				{**values, "finished": time.time()},
+				synchronize_session=False,
+				)
+		db.session.commit()
+
+	def _watch(self) -> None:
+		# Resolve the futures of jobs submitted by this process but run by another.
+
+		while True:
+			time.sleep(POLL_INTERVAL)
+
+			with self._condition:
+				waiting = [job_id for job_id, job in self._waiting.items() if not job.future.cancelled()]
+				cancelled = [job_id for job_id in self._waiting if job_id not in waiting]
+
+			if not waiting and not cancelled:
+				continue
+
+			try:
+				with app.app_context():
+					if cancelled:
+						# Stop cancelled jobs being claimed. Those already claimed by another process still run.
+						QueuedUpdate.query.filter(
+								QueuedUpdate.id.in_(cancelled),
+								QueuedUpdate.status == "queued",
+								).update(
+										{"status": "cancelled", "finished": time.time()},
+										synchronize_session=False,
+										)
+						db.session.commit()
+
+						with self._condition:
+							for job_id in cancelled:
+								self._waiting.pop(job_id, None)
+
+					finished = QueuedUpdate.query.filter(
+							QueuedUpdate.id.in_(waiting),
+							QueuedUpdate.status.in_(["done", "error"]),
+							).all()
+			except sqlalchemy.exc.SQLAlchemyError as e:
+				log(f"Unable to check for finished jobs: {e}", type="ERROR")
+				continue
+			finally:
+				db.session.remove()
+
+			for queued in finished:
+				with self._condition:
+					job = self._waiting.pop(queued.id, None)
+
+				if job is None:
+					continue
+				elif queued.status == "error":
+					job.future.set_exception(UpdateFailed(queued.error or queued.msg))
+				else:
+					job.future.set_result(UpdateResult(ret=queued.ret, pr_number=queued.pr_number, msg=queued.msg))
+
+	def stats(self) -> Dict[str, Dict[str, float]]:
+		"""
+		Returns the current queue depth across all processes,
+		and the queue wait times (in seconds) of jobs run by this process, for each priority class.
+		"""
+
+		counts = dict(
+				db.session.query(QueuedUpdate.priority, func.count()).filter_by(status="queued").group_by(
+						QueuedUpdate.priority
+						)
+				)
+
+		return {
+				priority.name.lower(): {
+						"queued": counts.get(int(priority), 0),
+						**self._wait_stats[priority].as_dict(),
+						}
+				for priority in Priority
+				}
+
+
+#: The scheduler for this process.
+scheduler = Scheduler()
+
+# Workers also claim jobs queued by other processes, so start them without waiting for a job to be submitted here.
+app.before_first_request(scheduler.start)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+#
+#  signing.py
+"""
+In-process SSH signing of the commits made by the bot.
+
+Commits are signed in the ``SSHSIG`` format used by ``git`` with ``gpg.format=ssh``,
+without starting ``ssh-keygen`` or ``gpg`` for each commit.
+For GitHub to show the commits as verified, the public key must be added to the bot's account as a signing key.
+
+The OpenSSH private key is given by the ``RH_BOT_SIGNING_KEY`` environment variable,
+or read from the file given by ``RH_BOT_SIGNING_KEY_PATH``. Commits aren't signed if neither is set.
+Ed25519 and RSA keys are supported.
+
+Run ``python -m repo_helper_bot.signing`` to measure the cost of signing.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import base64
+import hashlib
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+from functools import lru_cache
+from typing import Optional, Union
+
+# 3rd party
+import click  # type: ignore[import-untyped]
+import dulwich.porcelain
+import dulwich.repo
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, padding, rsa
+from domdf_python_tools.typing import PathLike
+from dulwich.objects import Commit
+from southwark import open_repo_closing
+
+__all__ = ["SSHSigner", "get_signer", "main", "sign_head"]
+
+_SSHSIG_MAGIC = b"SSHSIG"
+_SSHSIG_VERSION = 1
+_NAMESPACE = b"git"
+_HASH_ALGORITHM = b"sha512"
+
+
+def _string(data: bytes) -> bytes:
+	# The SSH wire encoding of a byte string.
+	return struct.pack(">I", len(data)) + data
+
+
+class SSHSigner:
+	"""
+	Creates ``SSHSIG`` signatures with an in-memory private key.
+
+	:param private_key: An OpenSSH private key.
+	:param password: The key's passphrase, if it is encrypted.
+	"""
+
+	def __init__(self, private_key: bytes, password: Optional[bytes] = None):
+		key = serialization.load_ssh_private_key(private_key, password=password)
+
+		if not isinstance(key, (ed25519.Ed25519PrivateKey, rsa.RSAPrivateKey)):
+			raise ValueError(f"Unsupported key type {type(key).__name__}; use an Ed25519 or RSA key.")
+
+		self._key: Union[ed25519.Ed25519PrivateKey, rsa.RSAPrivateKey] = key
+
+		#: The public key, in the format used in ``authorized_keys`` files.
+		self.public_key: bytes = key.public_key().public_bytes(
+				serialization.Encoding.OpenSSH,
+				serialization.PublicFormat.OpenSSH,
+				)
+
+		self._public_blob = base64.b64decode(self.public_key.split()[1])
+
+	def _sign_blob(self, data: bytes) -> bytes:
+		if isinstance(self._key, ed25519.Ed25519PrivateKey):
+			return _string(b"ssh-ed25519") + _string(self._key.sign(data))
+		else:
+			return _string(b"rsa-sha2-512") + _string(self._key.sign(data, padding.PKCS1v15(), hashes.SHA512()))
+
+	def sign(self, data: bytes, namespace: bytes = _NAMESPACE) -> bytes:
+		"""
+		Returns an ASCII-armoured ``SSHSIG`` signature of ``data``.
+
+		:param data:
+		:param namespace: The domain in which the signature is valid. ``git`` for commits.
+		"""
+
+		signed_data = b''.join([
+				_SSHSIG_MAGIC,
+				_string(namespace),
+				_string(b''),
+				_string(_HASH_ALGORITHM),
+				_string(hashlib.sha512(data).digest()),
+				])
+
+		signature = b''.join([
+				_SSHSIG_MAGIC,
+				struct.pack(">I", _SSHSIG_VERSION),
+				_string(self._public_blob),
+				_string(namespace),
+				_string(b''),
+				_string(_HASH_ALGORITHM),
+				_string(self._sign_blob(signed_data)),
+				])
+
+		encoded = base64.b64encode(signature)
+		lines = [encoded[i:i + 70] for i in range(0, len(encoded), 70)]
+
+		return b'\n'.join([b"-----BEGIN SSH SIGNATURE-----", *lines, b"-----END SSH SIGNATURE-----"]) + b'\n'
+
+
+@lru_cache()
+def get_signer() -> Optional[SSHSigner]:
+	"""
+	Returns the signer for the key configured for this process, or :py:obj:`None` if commits aren't signed.
+
+	The key is only loaded once per process.
+	"""
+
+	if "RH_BOT_SIGNING_KEY" in os.environ:
+		private_key = os.environ["RH_BOT_SIGNING_KEY"].encode("UTF-8")
+	elif "RH_BOT_SIGNING_KEY_PATH" in os.environ:
+		with open(os.environ["RH_BOT_SIGNING_KEY_PATH"], "rb") as key_file:
+			private_key = key_file.read()
+	else:
+		return None
+
+	password = os.environ.get("RH_BOT_SIGNING_KEY_PASSWORD")
+	return SSHSigner(private_key, password.encode("UTF-8") if password else None)
+
+
+def sign_head(repo: Union[dulwich.repo.Repo, PathLike], signer: Optional[SSHSigner] = None) -> Optional[bytes]:
+	"""
+	Sign the commit at ``HEAD`` by replacing it with a signed copy, and move the current branch to the copy.
+
+	The commit must not have been pushed yet.
+
+	:param repo:
+	:param signer: Defaults to the signer returned by :func:`~.get_signer`.
+
+	:returns: The SHA of the signed commit, or :py:obj:`None` if no signing key is configured.
+	"""
+
+	if signer is None:
+		signer = get_signer()
+		if signer is None:
+			return None
+
+	with open_repo_closing(repo) as r:
+		commit = r[r.head()].copy()
+		assert isinstance(commit, Commit)
+
+		commit.gpgsig = None
+		commit.gpgsig = signer.sign(commit.as_raw_string())
+
+		r.object_store.add_object(commit)
+		r.refs[b"HEAD"] = commit.id
+
+	return commit.id
+
+
+@click.option("-n", "--iterations", type=click.INT, default=200, help="The number of commits to sign.")
+@click.command()
+def main(iterations: int) -> None:
+	"""
+	Measure how long signing a commit takes, with a freshly generated key.
+	"""
+
+	private_key = ed25519.Ed25519PrivateKey.generate().private_bytes(
+			serialization.Encoding.PEM,
+			serialization.PrivateFormat.OpenSSH,
+			serialization.NoEncryption(),
+			)
+
+	start = time.perf_counter()
+	signer = SSHSigner(private_key)
+	load_time = time.perf_counter() - start
+
+	with tempfile.TemporaryDirectory() as tmpdir:
+		repo = dulwich.repo.Repo.init(tmpdir)
+		committer = b"bot <bot@example.com>"
+
+		with repo:
+			start = time.perf_counter()
+			for i in range(iterations):
+				dulwich.porcelain.commit(repo, f"Commit {i}".encode("UTF-8"), author=committer, committer=committer)
+			commit_time = (time.perf_counter() - start) / iterations
+
+			start = time.perf_counter()
+			for i in range(iterations):
+				dulwich.porcelain.commit(repo, f"Commit {i}".encode("UTF-8"), author=committer, committer=committer)
+				sign_head(repo, signer)
+			signed_commit_time = (time.perf_counter() - start) / iterations
+
+		click.echo(f"Loading the key (once per process): {load_time * 1000:.3f} ms")
+		click.echo(f"Unsigned commit:                    {commit_time * 1000:.3f} ms")
+		click.echo(f"Signed commit:                      {signed_commit_time * 1000:.3f} ms")
+		click.echo(f"Signing overhead per update:        {(signed_commit_time - commit_time) * 1000:.3f} ms")
+
+		if shutil.which("ssh-keygen"):
+			# For comparison, the cost of signing by starting ssh-keygen, as git does.
+			key_file = os.path.join(tmpdir, "id_ed25519")
+			with open(os.open(key_file, os.O_WRONLY | os.O_CREAT, 0o600), "wb") as fp:
+				fp.write(private_key)
+
+			runs = min(iterations, 20)
+			start = time.perf_counter()
+			for _ in range(runs):
+				subprocess.run(
+						["ssh-keygen", "-Y", "sign", "-n", "git", "-f", key_file],
+						input=b"data",
+						stdout=subprocess.DEVNULL,
+						stderr=subprocess.DEVNULL,
+						check=True,
+						)
+			click.echo(f"Signing with ssh-keygen:            {(time.perf_counter() - start) / runs * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+	main()
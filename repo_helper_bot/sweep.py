@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+#
+#  sweep.py
+"""
+Plan scheduled sweeps so only repositories which need work are updated.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+# 3rd party
+from github3.apps import Installation
+
+# this package
+from repo_helper_bot.constants import BRANCH_NAME, GITHUBAPP_ID, GITHUBAPP_KEY, client, context_switcher
+from repo_helper_bot.db import RepositoryState
+from repo_helper_bot.graphql import graphql
+from repo_helper_bot.rollout import MAX_VERSION_UPDATES, get_active_rollout, in_rollout
+from repo_helper_bot.utils import get_repo_helper_version, log
+
+__all__ = [
+		"BATCH_SIZE",
+		"RemoteState",
+		"fetch_remote_state",
+		"iter_installation_repos",
+		"needs_update",
+		"plan_sweep",
+		]
+
+#: The maximum number of repositories whose state is fetched in a single GraphQL query.
+BATCH_SIZE = 100
+
+_remote_state_query = """
+query($ids: [ID!]!, $branch: String!) {
+  nodes(ids: $ids) {
+    ... on Repository {
+      databaseId
+      isArchived
+      defaultBranchRef { target { oid } }
+      config: object(expression: "HEAD:repo_helper.yml") { oid }
+      pullRequests(headRefName: $branch, states: OPEN) { totalCount }
+    }
+  }
+}
+"""
+
+
+class RemoteState(NamedTuple):
+	"""
+	The state of a repository on GitHub which determines whether it needs updating.
+	"""
+
+	#: The SHA of the head of the default branch.
+	head_sha: Optional[str]
+
+	#: The blob SHA of ``repo_helper.yml`` on the default branch, or :py:obj:`None` if it doesn't exist.
+	config_sha: Optional[str]
+
+	#: Whether the bot's pull request is open.
+	pr_open: bool
+
+	is_archived: bool = False
+
+
+def iter_installation_repos() -> Iterator[List[Dict]]:
+	"""
+	Returns an iterator over the repositories of each of the app's installations.
+
+	The client is logged in as each installation while its repositories are being processed.
+	"""
+
+	context_switcher.login_as_app()
+	installation: Installation
+	installations = list(client.app_installations())
+
+	for installation in installations:
+		context_switcher.login_as_app()
+		client.login_as_app_installation(GITHUBAPP_KEY, GITHUBAPP_ID, installation.id)
+
+		url = client._build_url("installation", "repositories")
+		repositories: List[Dict] = []
+		page = 1
+
+		while True:
+			response = client.session.get(url, params={"per_page": 100, "page": page}).json()
+			repositories.extend(response["repositories"])
+			if not response["repositories"] or len(repositories) >= response["total_count"]:
+				break
+			page += 1
+
+		yield repositories
+
+
+def fetch_remote_state(repositories: List[Dict]) -> Dict[int, RemoteState]:
+	"""
+	Fetch the state of the given repositories with one GraphQL query per :data:`~.BATCH_SIZE` repositories.
+
+	The client must be logged in as the installation the repositories belong to.
+
+	:param repositories: Repositories, as returned by the GitHub API.
+
+	:returns: A mapping of repository IDs to their state.
+	"""
+
+	states = {}
+
+	for start in range(0, len(repositories), BATCH_SIZE):
+		batch = repositories[start:start + BATCH_SIZE]
+		data = graphql(client.session, _remote_state_query, ids=[r["node_id"] for r in batch], branch=BRANCH_NAME)
+
+		for node in data["nodes"]:
+			if not node:
+				continue
+
+			states[node["databaseId"]] = RemoteState(
+					head_sha=(node["defaultBranchRef"] or {}).get("target", {}).get("oid"),
+					config_sha=(node["config"] or {}).get("oid"),
+					pr_open=bool(node["pullRequests"]["totalCount"]),
+					is_archived=node["isArchived"],
+					)
+
+	return states
+
+
+def needs_update(remote: RemoteState, stored: Optional[RepositoryState], version: Optional[str] = None) -> bool:
+	"""
+	Returns whether the repository's inputs have changed since it was last updated.
+
+	:param remote: The current state of the repository on GitHub.
+	:param stored: The state recorded after the last update, if any.
+	:param version: The version of ``repo_helper`` the repository should be updated with.
+		Defaults to the version the bot was deployed with.
+	"""
+
+	if version is None:
+		version = get_repo_helper_version()
+
+	if remote.is_archived or remote.config_sha is None or remote.head_sha is None:
+		return False
+
+	if stored is None:
+		return True
+
+	if stored.head_sha != remote.head_sha or stored.repo_helper_version != version:
+		return True
+
+	# e.g. the pull request was closed without being merged.
+	return stored.pr_open is not None and stored.pr_open != remote.pr_open
+
+
+def plan_sweep() -> Iterator[Dict]:
+	"""
+	Returns an iterator over the installed repositories which need updating.
+
+	At most :data:`~.MAX_VERSION_UPDATES` repositories are included only because of a new ``repo_helper`` version,
+	so that a new version is applied gradually over several sweeps.
+	"""
+
+	rollout = get_active_rollout()
+	deployed_version = get_repo_helper_version()
+	version_updates = 0
+
+	for repositories in iter_installation_repos():
+		remote_states = fetch_remote_state(repositories)
+
+		stored_states = {
+				state.repo_id: state
+				for state in RepositoryState.query.filter(
+						RepositoryState.repo_id.in_([r["id"] for r in repositories])
+						)
+				}
+
+		for repository in repositories:
+			remote = remote_states.get(repository["id"])
+			stored = stored_states.get(repository["id"])
+
+			if rollout is not None and in_rollout(rollout, repository):
+				version = rollout.version
+			else:
+				version = deployed_version
+
+			if remote is None or not needs_update(remote, stored, version):
+				log(f"Nothing to do for {repository['full_name']}")
+				continue
+
+			if stored is not None and not needs_update(remote, stored, stored.repo_helper_version):
+				# Only the version of repo_helper has changed.
+				if version_updates >= MAX_VERSION_UPDATES:
+					log(f"Deferring {repository['full_name']} to a later sweep")
+					continue
+
+				version_updates += 1
+
+			yield repository
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+#
+#  throttle.py
+"""
+Limits on how often the bot opens or updates pull requests, per repository and per installation.
+"""
+#
+#  Copyright © 2026 Dominic Davis-Foster <dominic@davis-foster.co.uk>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#  EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#  MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#  IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#  DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+#  OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#  OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+# stdlib
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# this package
+from repo_helper_bot.db import ThrottleEvent, db
+
+__all__ = ["THROTTLES", "Throttle", "check_throttle", "record_pull_request"]
+
+
+class Throttle(NamedTuple):
+	"""
+	A limit on how often the bot opens or updates pull requests.
+
+	:param scope: ``repository`` or ``installation``.
+	:param window: The length of each window, in seconds. Windows are aligned to the Unix epoch,
+		so windows of a day start at midnight UTC.
+	:param limit: The maximum number of pull requests in each window. ``0`` for no limit.
+	:param cooldown: The minimum number of seconds between pull requests.
+	"""
+
+	scope: str
+	window: float
+	limit: int
+	cooldown: float
+
+	@property
+	def enabled(self) -> bool:
+		"""
+		Whether the throttle limits anything.
+		"""
+
+		return bool(self.limit or self.cooldown)
+
+	def key(self, repository: Dict) -> str:
+		"""
+		Returns the key pull requests to the given repository are counted under.
+
+		:param repository: The repository, as returned by the GitHub API.
+		"""
+
+		if self.scope == "installation":
+			return repository["owner"]["login"]
+		else:
+			return str(repository["id"])
+
+	def throttled_until(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+		"""
+		If the throttle applies to ``key``, returns when it will stop applying and why it applies.
+
+		:param key:
+		:param now: The current Unix timestamp.
+		"""
+
+		window_start = now - now % self.window
+		since = min(window_start if self.limit else now, now - self.cooldown)
+
+		created = [
+				event.created for event in ThrottleEvent.query.filter(
+						ThrottleEvent.scope == self.scope,
+						ThrottleEvent.key == key,
+						ThrottleEvent.created >= since,
+						)
+				]
+
+		in_window = [timestamp for timestamp in created if timestamp >= window_start]
+		if self.limit and len(in_window) >= self.limit:
+			start = datetime.fromtimestamp(window_start, timezone.utc)
+			return (
+					window_start + self.window,
+					f"{len(in_window)} pull request(s) already created for {self.scope} {key} "
+					f"since {start:%Y-%m-%d %H:%M} UTC",
+					)
+
+		if self.cooldown and created and max(created) + self.cooldown > now:
+			return (
+					max(created) + self.cooldown,
+					f"a pull request was created for {self.scope} {key} less than {self.cooldown:g}s ago",
+					)
+
+		return None
+
+
+#: The throttles applied to every update other than ``@repo-helper recreate``.
+#: By default the bot opens or updates at most one pull request per repository per UTC day.
+THROTTLES = (
+		Throttle(
+				"repository",
+				window=float(os.environ.get("RH_BOT_REPO_WINDOW", 24 * 60 * 60)),
+				limit=int(os.environ.get("RH_BOT_REPO_LIMIT", 1)),
+				cooldown=float(os.environ.get("RH_BOT_REPO_COOLDOWN", 0)),
+				),
+		Throttle(
+				"installation",
+				window=float(os.environ.get("RH_BOT_INSTALLATION_WINDOW", 24 * 60 * 60)),
+				limit=int(os.environ.get("RH_BOT_INSTALLATION_LIMIT", 0)),
+				cooldown=float(os.environ.get("RH_BOT_INSTALLATION_COOLDOWN", 0)),
+				),
+		)
+
+# Throttles known to apply, and until when, so repeated events are rejected without a query.
+_throttled: Dict[Tuple[str, str], Tuple[float, str]] = {}
+_throttled_lock = threading.Lock()
+
+
+def check_throttle(repository: Dict) -> Optional[str]:
+	"""
+	Returns why an update of the given repository is throttled, or :py:obj:`None` if it isn't.
+
+	:param repository: The repository, as returned by the GitHub API.
+	"""
+
+	now = time.time()
+
+	for throttle in THROTTLES:
+		if not throttle.enabled:
+			continue
+
+		key = throttle.key(repository)
+
+		with _throttled_lock:
+			until, reason = _throttled.get((throttle.scope, key), (0.0, ''))
+
+		if until <= now:
+			throttled = throttle.throttled_until(key, now)
+			if throttled is None:
+				continue
+
+			until, reason = throttled
+			with _throttled_lock:
+				_throttled[(throttle.scope, key)] = throttled
+
+		return f"Throttled {repository['full_name']}: {reason}. Skipping."
+
+	return None
+
+
+def record_pull_request(repository: Dict) -> None:
+	"""
+	Record that a pull request was created or updated for the given repository, and forget expired events.
+
+	:param repository: The repository, as returned by the GitHub API.
+	"""
+
+	now = time.time()
+
+	for throttle in THROTTLES:
+		if not throttle.enabled:
+			continue
+
+		key = throttle.key(repository)
+		ThrottleEvent.query.filter(
+				ThrottleEvent.scope == throttle.scope,
+				ThrottleEvent.key == key,
+				ThrottleEvent.created < now - max(throttle.window, throttle.cooldown),
+				).delete(synchronize_session=False)
+
+		db.session.add(ThrottleEvent(scope=throttle.scope, key=key, created=now))
+
+	db.session.commit()
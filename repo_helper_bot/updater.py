@@ -27,12 +27,13 @@ Auto update configuration files on push.
 #
 
 # stdlib
+import os
 import sys
-from datetime import datetime
-from subprocess import Popen
-from tempfile import TemporaryDirectory
+import time
+from subprocess import CalledProcessError, Popen, TimeoutExpired
+from tempfile import TemporaryDirectory, TemporaryFile
 from textwrap import indent, wrap
-from typing import Dict, Iterator, NamedTuple, Optional, Tuple, Union
+from typing import Callable, Dict, Iterator, NamedTuple, Optional, Tuple, Union
 
 # 3rd party
 import click  # type: ignore[import-untyped]
@@ -41,23 +42,45 @@ import dulwich.repo
 import sqlalchemy.exc
 from domdf_python_tools.paths import in_directory
 from domdf_python_tools.typing import PathLike
-from dulwich.errors import CommitError
+from dulwich.client import HTTPUnauthorized
+from dulwich.errors import CommitError, GitProtocolError
+from dulwich.graph import find_merge_base
+from dulwich.objects import Commit
 from github3 import apps
-from github3.exceptions import NotFoundError
+from github3.exceptions import GitHubException, NotFoundError
 from github3.pulls import ShortPullRequest
 from github3.repos import Repository as GitHubRepository
 from github3.session import GitHubSession
 from github3_utils.apps import iter_installed_repos
 from repo_helper.cli.utils import commit_changed_files  # nodep
-from repo_helper.core import RepoHelper  # nodep
-from repo_helper.utils import stage_changes  # nodep
 from southwark import open_repo_closing
 from southwark.repo import Repo
 
 # this package
-from repo_helper_bot.constants import BRANCH_NAME, GITHUBAPP_ID, GITHUBAPP_KEY, client, context_switcher
-from repo_helper_bot.db import Repository, db
-from repo_helper_bot.utils import make_pr_details
+from repo_helper_bot.cache import changed_files, run_repo_helper
+from repo_helper_bot.constants import (
+		BRANCH_NAME,
+		GITHUBAPP_ID,
+		GITHUBAPP_KEY,
+		client,
+		client_lock,
+		context_switcher
+		)
+from repo_helper_bot.db import Repository, RepositoryState, db
+from repo_helper_bot.history import record_run
+from repo_helper_bot.labels import bootstrap_installations
+from repo_helper_bot.limits import LimitExceeded, check_disk_usage, check_repository_size, is_large_repository
+from repo_helper_bot.locks import RepositoryLock
+from repo_helper_bot.mirrors import maybe_maintain, mirror_path, update_mirror
+from repo_helper_bot.plan import plan_repositories
+from repo_helper_bot.pool import WorkerDied, pool
+from repo_helper_bot.profiling import UpdateProfiler, should_profile
+from repo_helper_bot.retry import CircuitOpen, check_breakers, with_retries
+from repo_helper_bot.rollout import get_pool, record_result, rollout_for
+from repo_helper_bot.signing import sign_head
+from repo_helper_bot.sweep import plan_sweep
+from repo_helper_bot.throttle import check_throttle, record_pull_request
+from repo_helper_bot.utils import commit_as_bot, disk_usage, get_repo_helper_version, make_pr_details
 
 __all__ = ["run_update", "update_repository"]
 
@@ -69,41 +92,99 @@ class UpdateResult(NamedTuple):
 	exception: Optional[Exception] = None
 
 
-def update_repository(repository: Dict, recreate: bool = False) -> UpdateResult:
+def update_repository(
+		repository: Dict,
+		recreate: bool = False,
+		wait: float = 0,
+		progress: Optional[Callable[[str], None]] = None,
+		trigger: str = "manual",
+		) -> UpdateResult:
 	"""
 	Run the updater for the given repository.
 
+	Only one update runs for a repository at a time, across all workers.
+	If another update is already running the request is collapsed into a single rerun of that update.
+
 	:param repository:
 	:param recreate:
+	:param wait: The maximum number of seconds to wait for another update of the repository to finish.
+	:param progress: Called with the name of each stage of the update as it starts.
+	:param trigger: What requested the update, recorded in the update's :class:`~.UpdateRun`.
 	"""
 
-	# TODO: rebase
+	with RepositoryLock(repository["id"]) as lock:
+		if not lock.acquire(wait, recreate=recreate):
+			return UpdateResult(
+					msg=f"An update for {repository['full_name']} is already in progress. Skipping.",
+					ret=1,
+					)
+
+		result = _profiled_update(repository, trigger, recreate=recreate, progress=progress)
+
+		# Rerun for any updates requested in the meantime, until the lock is released.
+		pending = lock.take_pending()
+		while pending is not None:
+			result = _profiled_update(repository, trigger, recreate=pending, progress=progress)
+			pending = lock.take_pending()
+
+		return result
+
+
+def _profiled_update(
+		repository: Dict,
+		trigger: str,
+		recreate: bool = False,
+		progress: Optional[Callable[[str], None]] = None,
+		) -> UpdateResult:
+	profiler = UpdateProfiler(enabled=should_profile(repository["full_name"]), on_stage=progress)
+
+	try:
+		with profiler:
+			result = _update_repository(repository, recreate=recreate, profiler=profiler)
+	except Exception as e:
+		db.session.rollback()
+		record_run(repository, trigger, profiler, exception=e)
+		raise
+	finally:
+		profiler.save(repository["id"], repository["full_name"])
+
+	record_run(repository, trigger, profiler, result)
+
+	return result
+
+
+def _update_repository(repository: Dict, profiler: UpdateProfiler, recreate: bool = False) -> UpdateResult:
 	# TODO: if branch already exists and PR has been merged, abort
 
+	if not recreate:
+		# Also checked when the update is queued, but another update may have opened a PR since.
+		reason = check_throttle(repository)
+		if reason is not None:
+			return UpdateResult(msg=reason, ret=1)
+
+	try:
+		# Don't start work which can't be finished while GitHub is unhealthy.
+		check_breakers()
+	except CircuitOpen as e:
+		return UpdateResult(msg=f"Skipping {repository['full_name']}: {e}", ret=1, exception=e)
+
 	db_repository: Repository = get_db_repository(
 			repo_id=repository["id"],
 			owner=repository["owner"]["login"],
 			name=repository["name"],
 			)
 
-	last_pr_date = datetime.fromtimestamp(db_repository.last_pr or 200)
-	now = datetime.now()
-	if not recreate and last_pr_date.day == now.day and last_pr_date.month == now.month:
-		return UpdateResult(
-				msg=f"A PR for {db_repository.fullname} has already been created today. Skipping.",
-				ret=1,
-				)
-
 	owner = repository["owner"]["login"]
 	repository_name = repository["name"]
 
-	# Log in as the app
-	context_switcher.login_as_app()
+	with profiler.stage("login"):
+		# Log in as the app
+		context_switcher.login_as_app()
 
-	# Log in as installation
-	installation_id = context_switcher.login_as_repo_installation(owner=owner, repository=repository_name)
+		# Log in as installation
+		installation_id = context_switcher.login_as_repo_installation(owner=owner, repository=repository_name)
 
-	github_repo: GitHubRepository = client.repository(owner, repository_name)
+		github_repo: GitHubRepository = client.repository(owner, repository_name)
 
 	# Ensure 'repo_helper.yml' exists
 	try:
@@ -114,87 +195,205 @@ def update_repository(repository: Dict, recreate: bool = False) -> UpdateResult:
 				ret=1,
 				)
 
+	_release_connection()
+
 	with TemporaryDirectory() as tmpdir:
 
-		# Clone to tmpdir
-		repo = clone(repository["html_url"], tmpdir)
+		try:
+			check_repository_size(repository, tmpdir)
+
+			with profiler.stage("clone"):
+				if is_large_repository(repository):
+					# Clone to tmpdir
+					repo = with_retries("git", repository["id"], clone, repository["html_url"], tmpdir, shallow=True)
+					profiler.bytes_cloned = disk_usage(os.path.join(tmpdir, ".git"))
+				else:
+					# Only fetch what's new into the mirror, then clone it to tmpdir without copying its objects.
+					mirror = mirror_path(repository)
+					mirror_size = disk_usage(os.fspath(mirror)) if mirror.is_dir() else 0
+					mirror = with_retries("git", repository["id"], update_mirror, repository)
+					profiler.bytes_cloned = max(0, disk_usage(os.fspath(mirror)) - mirror_size)
+					repo = clone(os.fspath(mirror), tmpdir, shared=True)
+		except (LimitExceeded, CircuitOpen) as e:
+			return UpdateResult(msg=f"Skipping {repository['full_name']}: {e}", ret=1, exception=e)
+		except CalledProcessError as e:
+			return UpdateResult(msg=f"Unable to clone {repository['full_name']}.", ret=1, exception=e)
+
+		head_sha = repo.head().decode("UTF-8")
+
+		rollout = rollout_for(repository)
+		version = rollout.version if rollout is not None else get_repo_helper_version()
+
+		remote_branch = f"refs/remotes/origin/{BRANCH_NAME}".encode()
+		branch_exists = remote_branch in dict(repo.refs)
+
+		if branch_exists and not recreate and not is_bot_commit(repo, repo.refs[remote_branch]):
+			# The branch is force-pushed, which would throw away the other commits.
+			return _skip_update(
+					repository,
+					github_repo,
+					head_sha,
+					version,
+					msg=f"Someone else has pushed to {BRANCH_NAME} in {repository['full_name']}. Skipping.",
+					)
+
+		existing = get_branch_changes(repo) if branch_exists and not recreate else None
+
+		if existing is not None and existing.bot and existing.can_rebase and not existing.config_changed:
+			state: Optional[RepositoryState] = RepositoryState.query.get(repository["id"])
+
+			if state is not None and state.pr_open and state.repo_helper_version == version:
+				# The bot's commit would be rebased unchanged, so leave the pull request (and its CI runs) alone.
+				return _skip_update(
+						repository,
+						github_repo,
+						head_sha,
+						version,
+						msg=f"The pull request for {repository['full_name']} is up to date.",
+						)
+
+		# Don't hold a connection, or any locks, through the slow steps which follow.
+		_release_connection()
 
-		if recreate:
-			# Delete any existing branch and create again from master
-			recreate_branch(repo)
-		elif f"refs/remotes/origin/{BRANCH_NAME}".encode() in dict(repo.refs):
-			checkout_branch(repo)
+		with profiler.stage("checkout"):
+			if recreate:
+				# Delete any existing branch and create again from master
+				recreate_branch(repo)
+			else:
+				# Switch to new branch. Any existing branch is replaced by a single commit on top of the current head.
+				create_branch(repo)
+
+		profiler.measure_disk(tmpdir)
+
+		if rollout is None:
+			worker_pool = pool
 		else:
-			# Switch to new branch
-			create_branch(repo)
+			try:
+				worker_pool = get_pool(rollout.requirement)
+			except CalledProcessError as e:
+				return UpdateResult(msg=f"Unable to install 'repo_helper' {version}.", ret=1, exception=e)
 
 		# Update files
 		try:
-			rh = RepoHelper(tmpdir)
-			rh.load_settings()
+			with profiler.stage("repo_helper"):
+				managed_files = profiler.run_in_pool(worker_pool, run_repo_helper, repo.path)
 		except FileNotFoundError as e:
+			if rollout is not None:
+				record_result(rollout.id, success=False)
 			return UpdateResult(msg=f"Unable to run 'repo_helper'.", ret=1, exception=e)
+		except (MemoryError, WorkerDied) as e:
+			if rollout is not None:
+				record_result(rollout.id, success=False)
+			return UpdateResult(
+					msg=f"Skipping {repository['full_name']}: 'repo_helper' ran out of memory.",
+					ret=1,
+					exception=e,
+					)
 
-		managed_files = rh.run()
-		staged_files = stage_changes(repo.path, managed_files)
+		if rollout is not None:
+			record_result(rollout.id, success=True)
 
-		if not staged_files and recreate:
+		with profiler.stage("verify"):
+			changed = changed_files(repo, managed_files)
+
+		profiler.files_changed = len(changed)
+
+		if not changed and recreate:
 			# Everything is up to date, close PR.
-			close_pr(owner, repository_name)
+			with profiler.stage("pull_request"):
+				close_pr(owner, repository_name)
+			save_state(repository["id"], head_sha, version, pr_open=False)
 			return UpdateResult(0)
 
+		if not changed:
+			# Nothing changed, so there's no need to stage, commit, or revisit until the inputs change.
+			save_state(repository["id"], head_sha, version)
+			return UpdateResult(msg="Failure!", ret=1)
+
 		try:
-			if not commit_changed_files(
-					repo_path=rh.target_repo,
-					managed_files=managed_files,
-					commit=True,
-					message=b"Updated files with 'repo_helper'.",
-					enable_pre_commit=False,
-					):
-				sys.stdout.flush()
-				sys.stderr.flush()
-				return UpdateResult(msg="Failure!", ret=1)
+			with profiler.stage("commit"):
+				committed = commit_changed_files(
+						repo_path=repo.path,
+						managed_files=changed,
+						commit=True,
+						message=b"Updated files with 'repo_helper'.",
+						enable_pre_commit=False,
+						)
+
+				if committed and existing is not None and existing.can_rebase:
+					if _tree_changes(repo, repo[head_sha.encode()].tree, repo[repo.head()].tree) == existing.bot:
+						# Same changes as the existing branch, so there's no need to push.
+						return _skip_update(
+								repository,
+								github_repo,
+								head_sha,
+								version,
+								msg=f"The pull request for {repository['full_name']} is up to date.",
+								)
+
+				if committed:
+					sign_head(repo)
 
 			sys.stdout.flush()
 			sys.stderr.flush()
 
+			if not committed:
+				# Nothing changed, so there's no need to revisit until the inputs change.
+				save_state(repository["id"], head_sha, version)
+				return UpdateResult(msg="Failure!", ret=1)
+
 		except CommitError as e:
 			return UpdateResult(msg=f"Unable to commit changes.", ret=1, exception=e)
 
+		profiler.measure_disk(tmpdir)
+
+		_release_connection()
+
 		# Push
-		dulwich.porcelain.push(
-				repo,
-				repository["html_url"],
-				BRANCH_NAME.encode("UTF-8"),
-				username="x-access-token",
-				password=get_installation_access_token(github_repo, installation_id),
-				force=recreate,
-				)
+		try:
+			with profiler.stage("push"):
+				token = with_retries(
+						"api",
+						repository["id"],
+						get_installation_access_token,
+						github_repo,
+						installation_id,
+						)
+				with_retries(
+						"git",
+						repository["id"],
+						dulwich.porcelain.push,
+						repo,
+						repository["html_url"],
+						BRANCH_NAME.encode("UTF-8"),
+						username="x-access-token",
+						password=token,
+						force=branch_exists,
+						)
+		except (CircuitOpen, GitHubException, GitProtocolError, HTTPUnauthorized, dulwich.porcelain.Error, OSError) as e:
+			return UpdateResult(msg=f"Unable to push to {repository['full_name']}.", ret=1, exception=e)
 
 		sys.stdout.flush()
 		sys.stderr.flush()
 
 		# Create PR
-		base = github_repo.default_branch
-		head = f"{owner}:{BRANCH_NAME}"
-
-		created_pr: Optional[ShortPullRequest]
-		existing_prs = list(github_repo.pull_requests(state="open", base=base, head=head))
-		if not existing_prs:
-			created_pr = github_repo.create_pull(
-					title="[repo-helper] Configuration Update",
-					base=base,
-					head=head,
-					body=make_pr_details(),
+		try:
+			with profiler.stage("pull_request"):
+				created_pr, created = with_retries("api", repository["id"], open_pull_request, github_repo, owner)
+		except (CircuitOpen, GitHubException) as e:
+			return UpdateResult(
+					msg=f"Unable to create a pull request for {repository['full_name']}.",
+					ret=1,
+					exception=e,
 					)
 
-			if created_pr is not None:
-				db_repository.add_pr(int(created_pr.number))
-		else:
-			created_pr = existing_prs.pop()
+		if created and created_pr is not None:
+			db_repository.add_pr(int(created_pr.number))
 
-		db_repository.last_pr = datetime.now().timestamp()
+		db_repository.last_pr = time.time()
 		db.session.commit()
+		record_pull_request(repository)
+		save_state(repository["id"], head_sha, version, pr_open=True)
 
 		return UpdateResult(
 				pr_number=created_pr.number,
@@ -203,16 +402,98 @@ def update_repository(repository: Dict, recreate: bool = False) -> UpdateResult:
 				)
 
 
-def run_update() -> Iterator[Tuple[str, int]]:
+def run_update(full: bool = False, plan: bool = False) -> Iterator[Tuple[str, int]]:
 	"""
 	Run the updater.
+
+	:param full: Update every installed repository, rather than only those
+		whose default branch, ``repo_helper`` version or pull request has changed since they were last updated.
+	:param plan: Print the changes which would be made to each repository, without making them.
 	"""
 
-	for repository in iter_installed_repos(context_switcher=context_switcher):
-		click.echo(repository["full_name"])
-		result = update_repository(repository)
+	# this package
+	from repo_helper_bot.scheduler import Priority, scheduler
+
+	# List the repositories before queueing them, as the updates switch the client between installations.
+	with client_lock:
+		if full or plan:
+			repositories = list(iter_installed_repos(context_switcher=context_switcher))
+		else:
+			repositories = list(plan_sweep())
+
+	if plan:
+		for plan_result in plan_repositories(repositories):
+			click.echo(plan_result.summary)
+			click.echo(plan_result.diff, nl=False)
+			yield plan_result.full_name, int(bool(plan_result.error))
+
+		return
+
+	# Make sure the labels exist up front, so applying them later is a lookup.
+	bootstrap_installations(repositories)
+
+	# Queue everything up front so interactive commands can run ahead of the sweep.
+	jobs = [scheduler.submit(repository, Priority.SWEEP) for repository in repositories]
+
+	for job in jobs:
+		result = job.future.result()
+		click.echo(job.repository["full_name"])
 		print(result.msg)
-		yield repository["full_name"], result.ret
+		yield job.repository["full_name"], result.ret
+
+	maybe_maintain()
+
+
+def open_pull_request(github_repo: GitHubRepository, owner: str) -> Tuple[Optional[ShortPullRequest], bool]:
+	"""
+	Returns the bot's open pull request for the given repository, creating it if necessary.
+
+	It is safe to retry, as a pull request created by an earlier attempt is found rather than created again.
+
+	:param github_repo:
+	:param owner: The owner of the repository.
+
+	:returns: The pull request, and whether it was created.
+	"""
+
+	base = github_repo.default_branch
+	head = f"{owner}:{BRANCH_NAME}"
+
+	existing_prs = list(github_repo.pull_requests(state="open", base=base, head=head))
+	if existing_prs:
+		return existing_prs.pop(), False
+
+	created_pr = github_repo.create_pull(
+			title="[repo-helper] Configuration Update",
+			base=base,
+			head=head,
+			body=make_pr_details(),
+			)
+
+	return created_pr, True
+
+
+def has_open_pull_request(github_repo: GitHubRepository, owner: str) -> bool:
+	"""
+	Returns whether the bot's pull request for the given repository is open.
+
+	:param github_repo:
+	:param owner: The owner of the repository.
+	"""
+
+	return any(github_repo.pull_requests(state="open", head=f"{owner}:{BRANCH_NAME}", number=1))
+
+
+def is_bot_commit(repo: dulwich.repo.Repo, sha: bytes) -> bool:
+	"""
+	Returns whether the given commit was made by the bot.
+
+	:param repo:
+	:param sha:
+	"""
+
+	commit = repo[sha]
+	return isinstance(commit, Commit) and f"<{commit_as_bot.email}>".encode("UTF-8") in commit.author
 
 
 def close_pr(
@@ -254,22 +535,77 @@ def recreate_branch(repo: Union[dulwich.repo.Repo, PathLike]) -> None:
 			create_branch(repo)
 
 
-def checkout_branch(repo: Union[dulwich.repo.Repo, PathLike]) -> int:
+_Changes = Dict[bytes, Optional[Tuple[int, bytes]]]
+
+
+def _tree_changes(repo: dulwich.repo.Repo, old_tree: bytes, new_tree: bytes) -> _Changes:
+	# Mapping of changed paths to their new mode and blob, or None if deleted.
+
+	changes: _Changes = {}
+
+	for (old_path, new_path), (_, new_mode), (_, new_sha) in repo.object_store.tree_changes(old_tree, new_tree):
+		if new_path is None:
+			changes[old_path] = None  # type: ignore[index]
+		else:
+			changes[new_path] = (new_mode, new_sha)  # type: ignore[assignment]
+
+	return changes
+
+
+class BranchChanges(NamedTuple):
+	"""
+	The changes on the bot's existing branch, and on the default branch since the two diverged.
+	"""
+
+	#: The files changed by the bot's commits.
+	bot: _Changes
+
+	#: The files changed on the default branch since the bot's branch was created.
+	default_branch: _Changes
+
+	@property
+	def can_rebase(self) -> bool:
+		"""
+		Whether the bot's changes can be moved onto the current head without conflicts.
+		"""
+
+		return not (self.bot.keys() & self.default_branch.keys())
+
+	@property
+	def config_changed(self) -> bool:
+		"""
+		Whether the ``repo_helper`` configuration has changed on the default branch.
+		"""
+
+		return b"repo_helper.yml" in self.default_branch or b"git_helper.yml" in self.default_branch
+
+
+def get_branch_changes(repo: dulwich.repo.Repo) -> Optional[BranchChanges]:
 	"""
-	Checkout an existing branch.
+	Returns the changes on the bot's existing branch, and on the checked out branch since they diverged.
 
 	:param repo:
+
+	:returns: :py:obj:`None` if the branches have no common ancestor in the clone, e.g. if it is shallow.
 	"""
 
-	if isinstance(repo, dulwich.repo.Repo):
-		directory = repo.path
-	else:
-		directory = repo
+	branch = repo.refs[f"refs/remotes/origin/{BRANCH_NAME}".encode()]
+	head = repo.head()
+
+	try:
+		merge_bases = find_merge_base(repo, [head, branch])
+	except KeyError:
+		return None
+
+	if not merge_bases:
+		return None
+
+	base_tree = repo[merge_bases[0]].tree
 
-	with in_directory(directory):
-		process = Popen(["git", "checkout", "--track", f"origin/{BRANCH_NAME}"])
-		process.communicate()
-		return process.wait()
+	return BranchChanges(
+			bot=_tree_changes(repo, base_tree, repo[branch].tree),
+			default_branch=_tree_changes(repo, base_tree, repo[head].tree),
+			)
 
 
 def create_branch(repo: Union[dulwich.repo.Repo, PathLike]) -> None:
@@ -280,21 +616,53 @@ def create_branch(repo: Union[dulwich.repo.Repo, PathLike]) -> None:
 	"""
 
 	with open_repo_closing(repo) as repo:  # pylint: disable=redefined-argument-from-local
+		head = repo.head()
 		dulwich.porcelain.update_head(repo, b"HEAD", new_branch=BRANCH_NAME.encode("UTF-8"))
-		repo.refs[f"refs/heads/{BRANCH_NAME}".encode()] = repo.refs[b'refs/heads/master']
+		repo.refs[f"refs/heads/{BRANCH_NAME}".encode()] = head
 
 
-def clone(url: str, dest: PathLike) -> Repo:
+def clone(url: str, dest: PathLike, shallow: bool = False, shared: bool = False) -> Repo:
 	"""
 	Clones the given URL and returns the :class:`southwark.repo.Repo` object representing it.
 
 	:param url:
 	:param dest:
+	:param shallow: Whether to clone only the tip of each branch, without the history.
+	:param shared: For a local repository, whether to borrow its objects rather than copying them.
+
+	:raises LimitExceeded: If the clone uses more than :data:`~.MAX_DISK_USAGE` bytes of disk space.
+	:raises subprocess.CalledProcessError: If ``git clone`` fails.
 	"""
 
-	process = Popen(["git", "clone", url, dest])
-	process.communicate()
-	process.wait()
+	args = ["git", "clone", url, os.fspath(dest)]
+	if shallow:
+		args[2:2] = ["--depth", "1", "--no-single-branch"]
+	if shared:
+		args[2:2] = ["--shared"]
+
+	with TemporaryFile() as stderr:
+		process = Popen(args, stderr=stderr)
+
+		while True:
+			try:
+				process.wait(timeout=5)
+				break
+			except TimeoutExpired:
+				try:
+					check_disk_usage(os.fspath(dest))
+				except LimitExceeded:
+					process.kill()
+					process.wait()
+					raise
+
+		stderr.seek(0)
+		output = stderr.read()
+
+	sys.stderr.write(output.decode("UTF-8", errors="replace"))
+
+	if process.returncode:
+		# The output is kept so the error can be classified as transient or not.
+		raise CalledProcessError(process.returncode, args, stderr=output)
 
 	return Repo(dest)
 
@@ -320,6 +688,68 @@ def get_installation_access_token(
 		return json_response["token"]
 
 
+def _skip_update(
+		repository: Dict,
+		github_repo: GitHubRepository,
+		head_sha: str,
+		version: str,
+		msg: str,
+		) -> UpdateResult:
+	# Record the inputs of an update which leaves the bot's branch alone,
+	# along with whether its pull request is actually open, as it may have been closed by hand.
+
+	_release_connection()
+
+	try:
+		pr_open = with_retries(
+				"api",
+				repository["id"],
+				has_open_pull_request,
+				github_repo,
+				repository["owner"]["login"],
+				)
+	except (CircuitOpen, GitHubException) as e:
+		return UpdateResult(msg=f"Unable to check the pull request for {repository['full_name']}.", ret=1, exception=e)
+
+	save_state(repository["id"], head_sha, version, pr_open=pr_open)
+	return UpdateResult(msg=msg, ret=1)
+
+
+def _release_connection() -> None:
+	# End the session's transaction so its connection goes back to the pool.
+	# Objects aren't expired on commit, so they can still be read afterwards.
+	db.session.commit()
+
+
+def save_state(
+		repo_id: int,
+		head_sha: str,
+		repo_helper_version: Optional[str] = None,
+		pr_open: Optional[bool] = None,
+		) -> None:
+	"""
+	Record the inputs to an update of the given repository, so later sweeps can skip it if they haven't changed.
+
+	:param repo_id:
+	:param head_sha: The SHA of the default branch's head which was updated.
+	:param repo_helper_version: The version of ``repo_helper`` which was run.
+		Defaults to the version the bot was deployed with.
+	:param pr_open: Whether the bot's pull request is open. :py:obj:`None` leaves the recorded value unchanged.
+	"""
+
+	state: Optional[RepositoryState] = RepositoryState.query.get(repo_id)
+	if state is None:
+		state = RepositoryState(repo_id=repo_id)
+		db.session.add(state)
+
+	state.head_sha = head_sha
+	state.repo_helper_version = repo_helper_version or get_repo_helper_version()
+	if pr_open is not None:
+		state.pr_open = pr_open
+
+	db.session.commit()
+
+
 def get_db_repository(repo_id: int, owner: str, name: str) -> Repository:
 	"""
 	Returns the entry for the given repository in the database, creating it if necessary.
@@ -329,32 +759,25 @@ def get_db_repository(repo_id: int, owner: str, name: str) -> Repository:
 	:param name: The name of the repository.
 	"""
 
-	retry = 0
-
 	while True:
-		retry += 1
-		try:
-			db_repository: Optional[Repository] = Repository.query.get(repo_id)
-			if db_repository is None:
-				db_repository = Repository(
-						id=repo_id,
-						owner=owner,
-						name=name,
-						last_pr=100,
-						pull_requests="[]",
-						)
-				db.session.add(db_repository)
-			else:
-				# Update name of existing repo
-				db_repository.owner = owner
-				db_repository.name = name
+		db_repository: Optional[Repository] = Repository.query.get(repo_id)
+		if db_repository is None:
+			db_repository = Repository(
+					id=repo_id,
+					owner=owner,
+					name=name,
+					last_pr=100,
+					pull_requests="[]",
+					)
+			db.session.add(db_repository)
+		else:
+			# Update name of existing repo
+			db_repository.owner = owner
+			db_repository.name = name
 
+		try:
 			db.session.commit()
-
 			return db_repository
-
-		except sqlalchemy.exc.OperationalError:
-			if retry >= 10:
-				raise
-			else:
-				pass
+		except sqlalchemy.exc.IntegrityError:
+			# Another worker added the repository since it was looked up, so update theirs instead.
+			db.session.rollback()
@@ -27,14 +27,19 @@ Utility functions.
 #
 
 # stdlib
+import json
+import os
+import sys
 from datetime import date, datetime
+from functools import lru_cache
+from importlib.metadata import distribution
 
 # 3rd party
 from domdf_python_tools.stringlist import StringList
 from github3_utils import Impersonate
 from github3_utils.apps import make_footer_links
 
-__all__ = ["commit_as_bot", "log", "make_pr_details"]
+__all__ = ["commit_as_bot", "disk_usage", "get_repo_helper_version", "get_rss", "log", "make_pr_details"]
 
 name = "repo-helper[bot]"
 
@@ -83,4 +88,67 @@ def make_pr_details() -> str:
 	return str(buf)
 
 
+@lru_cache(1)
+def get_repo_helper_version() -> str:
+	"""
+	Returns the version of ``repo_helper`` used to update repositories.
+
+	If ``repo_helper`` was installed from git the commit hash is included,
+	as the version number isn't bumped for every commit.
+	"""
+
+	dist = distribution("repo_helper")
+	version = dist.version
+
+	direct_url = json.loads(dist.read_text("direct_url.json") or "{}")
+	commit_id = direct_url.get("vcs_info", {}).get("commit_id")
+	if commit_id:
+		version = f"{version}+g{commit_id[:12]}"
+
+	return version
+
+
+def disk_usage(directory: str) -> int:
+	"""
+	Returns the total size, in bytes, of the files in ``directory``.
+
+	:param directory:
+	"""
+
+	total = 0
+
+	for root, _, files in os.walk(directory):
+		for filename in files:
+			try:
+				total += os.lstat(os.path.join(root, filename)).st_size
+			except OSError:
+				pass
+
+	return total
+
+
+def get_rss() -> int:
+	"""
+	Returns the resident set size of the current process, in bytes.
+
+	Where the current value isn't available the peak is returned instead, or ``0`` if neither are.
+	"""
+
+	try:
+		with open("/proc/self/statm", encoding="UTF-8") as fp:
+			return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+	except (OSError, ValueError, AttributeError):
+		pass
+
+	try:
+		# stdlib
+		import resource
+	except ImportError:  # pragma: no cover (Windows)
+		return 0
+
+	maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Kilobytes on Linux, bytes on macOS
+	return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
 # See also https://gist.github.com/pierrejoubert73/902cc94d79424356a8d20be2b382e1ab
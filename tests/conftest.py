@@ -0,0 +1,34 @@
+# stdlib
+import os
+import tempfile
+from typing import Iterator
+
+# 3rd party
+import pytest
+
+# The app is configured when the package is imported, so the environment must be set up first.
+os.environ.update(
+		GITHUBAPP_ID="1234",
+		GITHUBAPP_SECRET="abc123",
+		GITHUBAPP_KEY="ABCDEFG",
+		RH_BOT_IMPORTCHECK="1",
+		DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'repo_helper.sqlite')}",
+		)
+
+# this package
+from repo_helper_bot.constants import app  # noqa: E402
+from repo_helper_bot.db import db  # noqa: E402
+
+pytest_plugins = ("coincidence", )
+
+
+@pytest.fixture()
+def database() -> Iterator:
+	with app.app_context():
+		db.create_all()
+
+		try:
+			yield db
+		finally:
+			db.session.remove()
+			db.drop_all()
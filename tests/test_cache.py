@@ -0,0 +1,200 @@
+# stdlib
+import os
+import shutil
+from typing import Iterable
+
+# 3rd party
+import dulwich.porcelain
+import pytest
+from domdf_python_tools.paths import PathPlus
+from dulwich.repo import Repo
+
+# this package
+from repo_helper_bot import cache
+from repo_helper_bot.cache import LRUCache, changed_files, run_repo_helper
+
+_config = """\
+modname: example
+copyright_years: 2021
+author: "Joe Bloggs"
+email: "joe@example.com"
+username: "joebloggs"
+version: "0.1.0"
+license: "MIT"
+short_desc: "An example repository."
+"""
+
+
+def _commit(repo: Repo, filenames: Iterable[str]) -> None:
+	dulwich.porcelain.add(repo, [os.path.join(repo.path, filename) for filename in filenames])
+	author = b"Joe Bloggs <joe@example.com>"
+	dulwich.porcelain.commit(repo, message=b"Initial commit", author=author, committer=author)
+
+
+def _make_repo(directory: PathPlus, config: str = _config) -> PathPlus:
+	directory.maybe_make(parents=True)
+	(directory / "repo_helper.yml").write_text(config)
+	(directory / "example").maybe_make()
+	(directory / "example" / "__init__.py").write_text('"""\nAn example repository.\n"""\n')
+	(directory / "requirements.txt").write_text("domdf-python-tools>=3.0.0\n")
+	(directory / "README.rst").write_text("=======\nexample\n=======\n")
+
+	with dulwich.porcelain.open_repo_closing(dulwich.porcelain.init(directory)) as repo:
+		_commit(repo, ["repo_helper.yml", "example/__init__.py", "requirements.txt", "README.rst"])
+
+	return directory
+
+
+def _files(directory: PathPlus) -> dict:
+	return {
+			path.relative_to(directory).as_posix(): path.read_bytes()
+			for path in directory.rglob('*')
+			if path.is_file() and ".git" not in path.parts
+			}
+
+
+@pytest.fixture()
+def caches(monkeypatch):
+	monkeypatch.setattr(cache, "settings_cache", LRUCache())
+	monkeypatch.setattr(cache, "outputs_cache", LRUCache())
+	return cache
+
+
+def test_lru_cache():
+	lru: LRUCache[str, int] = LRUCache(maxsize=2)
+	lru.put('a', 1)
+	lru.put('b', 2)
+	assert lru.get('a') == 1
+
+	# 'b' is now the least recently used.
+	lru.put('c', 3)
+	assert lru.get('b') is None
+	assert lru.get('a') == 1
+	assert lru.get('c') == 3
+	assert len(lru) == 2
+	assert (lru.hits, lru.misses) == (3, 1)
+
+
+def test_outputs_replayed(tmp_pathplus: PathPlus, caches):
+	first = _make_repo(tmp_pathplus / "first")
+	second = _make_repo(tmp_pathplus / "second")
+
+	managed_files = run_repo_helper(first)
+	assert len(caches.outputs_cache) == 1
+	assert len(caches.settings_cache) == 1
+
+	# The second repository has the same tree, so repo_helper isn't run again.
+	assert run_repo_helper(second) == managed_files
+	assert caches.outputs_cache.hits == 1
+	assert _files(second) == _files(first)
+
+
+def test_settings_reused(tmp_pathplus: PathPlus, caches):
+	first = _make_repo(tmp_pathplus / "first")
+	run_repo_helper(first)
+
+	# A different tree, but the same config.
+	second = _make_repo(tmp_pathplus / "second")
+	(second / "example" / "utils.py").write_text('"""\nUtilities.\n"""\n')
+	with dulwich.porcelain.open_repo_closing(second) as repo:
+		_commit(repo, ["example/utils.py"])
+
+	run_repo_helper(second)
+	assert caches.outputs_cache.hits == 0
+	assert caches.settings_cache.hits == 1
+
+	# A different config has a different key.
+	third = _make_repo(tmp_pathplus / "third", _config.replace("0.1.0", "0.2.0"))
+	run_repo_helper(third)
+	assert caches.settings_cache.hits == 1
+	assert len(caches.settings_cache) == 2
+
+
+def test_rewritten_config_not_cached(tmp_pathplus: PathPlus, caches):
+	# Loading the settings rewrites configs which use removed keys.
+	repo = _make_repo(tmp_pathplus / "repo", _config + "use_travis: true\n")
+	run_repo_helper(repo)
+
+	assert "use_travis" not in (repo / "repo_helper.yml").read_text()
+	assert len(caches.settings_cache) == 0
+
+
+@pytest.fixture()
+def repo(tmp_pathplus: PathPlus) -> Repo:
+	for filename in ("unchanged.txt", "modified.txt", "deleted.txt", "script.sh", "dir/nested.txt"):
+		(tmp_pathplus / filename).parent.maybe_make()
+		(tmp_pathplus / filename).write_text(f"{filename}\n")
+
+	repo = dulwich.porcelain.init(tmp_pathplus)
+	_commit(repo, ["unchanged.txt", "modified.txt", "deleted.txt", "script.sh", "dir/nested.txt"])
+	return repo
+
+
+def test_changed_files_clean(repo: Repo):
+	assert changed_files(repo, ["unchanged.txt", "modified.txt", "dir/nested.txt", "dir"]) == []
+
+
+def test_changed_files(repo: Repo):
+	target = PathPlus(repo.path)
+	(target / "modified.txt").write_text("Something else\n")
+	(target / "deleted.txt").unlink()
+	(target / "added.txt").write_text("added\n")
+	(target / "script.sh").chmod(0o755)
+
+	managed_files = [
+			"unchanged.txt",
+			"modified.txt",
+			"deleted.txt",
+			"added.txt",
+			"script.sh",
+			"never-existed.txt",
+			target / "dir" / "nested.txt",
+			]
+
+	assert changed_files(repo, managed_files) == ["modified.txt", "deleted.txt", "added.txt", "script.sh"]
+
+
+def test_changed_files_ignores_index(repo: Repo):
+	# Staging a change doesn't hide it, as only the tree of the head is compared.
+	target = PathPlus(repo.path)
+	(target / "modified.txt").write_text("Something else\n")
+	dulwich.porcelain.add(repo, [os.fspath(target / "modified.txt")])
+
+	assert changed_files(repo, ["modified.txt"]) == ["modified.txt"]
+
+
+def test_changed_files_absolute(repo: Repo):
+	target = PathPlus(repo.path)
+	shutil.rmtree(target / "dir")
+
+	assert changed_files(repo, [target / "dir" / "nested.txt"]) == ["dir/nested.txt"]
+
+
+def test_changed_files_mode_only(repo: Repo):
+	# The content is the same, but the file is now executable.
+	target = PathPlus(repo.path)
+	(target / "script.sh").chmod(0o755)
+
+	assert (target / "script.sh").read_text() == "script.sh\n"
+	assert changed_files(repo, ["script.sh", "unchanged.txt"]) == ["script.sh"]
+
+
+def test_changed_files_added_deleted(repo: Repo):
+	target = PathPlus(repo.path)
+	(target / "added.txt").write_text("added\n")
+	(target / "dir" / "added.txt").write_text("added\n")
+	(target / "deleted.txt").unlink()
+
+	managed_files = ["added.txt", "dir/added.txt", "deleted.txt", "never-existed.txt"]
+	assert changed_files(repo, managed_files) == ["added.txt", "dir/added.txt", "deleted.txt"]
+
+
+def test_changed_files_unchanged_blobs(repo: Repo):
+	# Rewriting a file with the same content, as repo_helper does, isn't a change.
+	target = PathPlus(repo.path)
+
+	for filename in ("unchanged.txt", "dir/nested.txt"):
+		(target / filename).write_text(f"{filename}\n")
+		os.utime(target / filename, (0, 0))
+
+	assert changed_files(repo, ["unchanged.txt", "dir/nested.txt"]) == []
@@ -0,0 +1,186 @@
+# stdlib
+import time
+from typing import Optional
+
+# 3rd party
+import pytest
+from sqlalchemy.orm import Session
+
+# this package
+from repo_helper_bot import cluster
+from repo_helper_bot.cluster import (
+		MAX_ATTEMPTS,
+		WORKER_TIMEOUT,
+		Node,
+		_heartbeat_engine,
+		acquire_lease,
+		recover_jobs,
+		release_lease,
+		worker_id
+		)
+from repo_helper_bot.db import Lease, QueuedUpdate, UpdateJob, UpdateLock, WorkerNode
+
+_dead = "dead-host:1234"
+_alive = "live-host:5678"
+
+
+def test_lease(database):
+	assert acquire_lease("sweep", "first", 60)
+	assert not acquire_lease("sweep", "second", 60)
+
+	# Renewed by the holder.
+	assert acquire_lease("sweep", "first", 60)
+
+	release_lease("sweep", "second")
+	assert not acquire_lease("sweep", "second", 60)
+
+	release_lease("sweep", "first")
+	assert acquire_lease("sweep", "second", 60)
+	assert Lease.query.populate_existing().get("sweep").holder == "second"
+
+
+def test_lease_expires(database):
+	assert acquire_lease("leader", "first", 0.1)
+	time.sleep(0.2)
+	assert acquire_lease("leader", "second", 60)
+
+
+def _heartbeat(database, worker: str, age: float = 0) -> None:
+	database.session.add(WorkerNode(id=worker, role="worker", started=0, heartbeat=time.time() - age))
+	database.session.commit()
+
+
+def _claimed(
+		database,
+		worker: str,
+		age: float = WORKER_TIMEOUT * 2,
+		attempts: int = 1,
+		job_id: Optional[str] = None,
+		) -> QueuedUpdate:
+	update = QueuedUpdate(
+			id=f"update-{worker}",
+			repo_id=1,
+			full_name="octocat/hello-world",
+			installation="octocat",
+			repository="{}",
+			priority=1,
+			submitted=time.time() - age,
+			status="running",
+			claimed_by=worker,
+			claimed=time.time() - age,
+			attempts=attempts,
+			job_id=job_id,
+			)
+	database.session.add(update)
+	database.session.commit()
+	return update
+
+
+def _lock(database, worker: str, expires: float) -> None:
+	database.session.add(UpdateLock(repo_id=1, holder=f"{worker}:140000:abcdef12", expires=expires))
+	database.session.commit()
+
+
+def _reload(update: QueuedUpdate) -> QueuedUpdate:
+	return QueuedUpdate.query.populate_existing().get(update.id)
+
+
+def test_recover_jobs(database):
+	_heartbeat(database, _dead, age=WORKER_TIMEOUT * 2)
+	update = _claimed(database, _dead)
+
+	assert recover_jobs() == 1
+
+	update = _reload(update)
+	assert update.status == "queued"
+	assert update.claimed_by is None
+
+	# The dead worker is forgotten.
+	assert WorkerNode.query.get(_dead) is None
+
+
+def test_recover_jobs_alive(database):
+	_heartbeat(database, _alive)
+	update = _claimed(database, _alive)
+
+	assert recover_jobs() == 0
+	assert _reload(update).status == "running"
+
+
+def test_recover_jobs_recently_claimed(database):
+	update = _claimed(database, _dead, age=0)
+
+	assert recover_jobs() == 0
+	assert _reload(update).status == "running"
+
+
+def test_recover_jobs_lock_renewed(database):
+	# The worker's heartbeats aren't getting through, but it is still renewing the lock, so it's alive.
+	update = _claimed(database, _dead)
+	_lock(database, _dead, expires=time.time() + 60)
+
+	assert recover_jobs() == 0
+	assert _reload(update).status == "running"
+	assert UpdateLock.query.get(1) is not None
+
+
+def test_recover_jobs_lock_expired(database):
+	update = _claimed(database, _dead)
+	_lock(database, _dead, expires=time.time() - 60)
+
+	assert recover_jobs() == 1
+	assert _reload(update).status == "queued"
+
+	# The expired lock is removed, so the update can run straight away.
+	assert UpdateLock.query.get(1) is None
+
+
+def test_recover_jobs_abandoned(database):
+	database.session.add(UpdateJob(id="job", full_name="octocat/hello-world", status="running", stage="clone"))
+	update = _claimed(database, _dead, attempts=MAX_ATTEMPTS, job_id="job")
+
+	assert recover_jobs() == 1
+
+	update = _reload(update)
+	assert update.status == "error"
+	assert update.finished is not None
+
+	job = UpdateJob.query.populate_existing().get("job")
+	assert (job.status, job.stage, job.ret) == ("error", None, 1)
+	assert job.msg == update.error
+
+
+@pytest.fixture()
+def heartbeat_session(database):
+	session = Session(bind=_heartbeat_engine())
+
+	try:
+		yield session
+	finally:
+		session.close()
+
+
+def test_tick(database, heartbeat_session: Session, monkeypatch):
+	monkeypatch.setattr(cluster, "SWEEP_INTERVAL", 0)
+	_heartbeat(database, _dead, age=WORKER_TIMEOUT * 2)
+	update = _claimed(database, _dead)
+
+	Node(role="worker").tick(started=time.time(), session=heartbeat_session)
+
+	node = WorkerNode.query.get(worker_id())
+	assert node.role == "worker"
+
+	# This process is the only one, so it is elected leader and recovers the dead worker's update.
+	assert Lease.query.get("leader").holder == worker_id()
+	assert _reload(update).status == "queued"
+
+
+def test_tick_not_leader(database, heartbeat_session: Session, monkeypatch):
+	monkeypatch.setattr(cluster, "SWEEP_INTERVAL", 0)
+	assert acquire_lease("leader", _alive, 60)
+	update = _claimed(database, _dead)
+
+	Node(role="web").tick(started=time.time(), session=heartbeat_session)
+
+	assert WorkerNode.query.get(worker_id()).role == "web"
+	assert _reload(update).status == "running"
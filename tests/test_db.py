@@ -0,0 +1,93 @@
+# stdlib
+import threading
+import time
+
+# this package
+from repo_helper_bot.constants import app
+from repo_helper_bot.db import Lease
+
+
+def test_wal(database):
+	assert database.session.execute("PRAGMA journal_mode").scalar() == "wal"
+
+
+def test_threads_not_starved(database):
+	# Hold a transaction open in this thread, as an update does while it runs.
+	database.session.add(Lease(name="held", holder="test", expires=time.time()))
+	database.session.flush()
+
+	results = []
+
+	def other_thread() -> None:
+		with app.app_context():
+			try:
+				results.append(Lease.query.filter_by(name="other").first())
+			finally:
+				database.session.remove()
+
+	thread = threading.Thread(target=other_thread)
+	thread.start()
+	thread.join(timeout=10)
+
+	assert not thread.is_alive()
+	assert results == [None]
+
+	database.session.rollback()
+
+
+def test_concurrent_writers(database):
+	database.session.add(Lease(name="counter", holder="test", expires=0))
+	database.session.commit()
+
+	errors = []
+
+	def writer() -> None:
+		with app.app_context():
+			try:
+				for _ in range(20):
+					# Read, then write, in the same transaction, as most of the bot's updates do.
+					lease = Lease.query.get("counter")
+					lease.expires += 1
+					database.session.commit()
+			except Exception as e:
+				errors.append(e)
+			finally:
+				database.session.remove()
+
+	threads = [threading.Thread(target=writer) for _ in range(8)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join(timeout=60)
+
+	assert errors == []
+
+
+def test_writer_waits(database):
+	# Another connection is part way through a write.
+	database.session.add(Lease(name="held", holder="test", expires=0))
+	database.session.flush()
+
+	results = []
+
+	def writer() -> None:
+		with app.app_context():
+			try:
+				database.session.add(Lease(name="other", holder="test", expires=0))
+				database.session.commit()
+				results.append(time.monotonic())
+			finally:
+				database.session.remove()
+
+	thread = threading.Thread(target=writer)
+	thread.start()
+	time.sleep(0.5)
+
+	# The second writer waits for the lock rather than failing.
+	assert thread.is_alive()
+	database.session.commit()
+	committed = time.monotonic()
+
+	thread.join(timeout=10)
+	assert results and results[0] >= committed
+	assert Lease.query.count() == 2
@@ -0,0 +1,135 @@
+# stdlib
+from typing import Dict, Iterable, List
+
+# 3rd party
+import pytest
+
+# this package
+from repo_helper_bot.graphql import GRAPHQL_URL, GraphQLError, _make_checks, fetch_commit, graphql
+
+_sha = "6dcb09b5b57875f334f61aebed695e2e4193db5e"
+
+
+class FakeResponse:
+
+	def __init__(self, body: Dict):
+		self.body = body
+
+	def raise_for_status(self) -> None:
+		pass
+
+	def json(self) -> Dict:
+		return self.body
+
+
+class FakeSession:
+	# Returns the given response body, recording the queries made.
+
+	def __init__(self, body: Dict):
+		self.body = body
+		self.requests: List[Dict] = []
+
+	def post(self, url: str, json: Dict) -> FakeResponse:
+		assert url == GRAPHQL_URL
+		self.requests.append(json)
+		return FakeResponse(self.body)
+
+
+def _check_run(name: str, status: str = "COMPLETED", conclusion: str = "SUCCESS") -> Dict:
+	return {"name": name, "status": status, "conclusion": conclusion if status == "COMPLETED" else None}
+
+
+def _pull_request(number: int, state: str = "OPEN", head: str = _sha, labels: Iterable[str] = ()) -> Dict:
+	return {
+			"number": number,
+			"state": state,
+			"headRefOid": head,
+			"labels": {"nodes": [{"name": name} for name in labels]},
+			}
+
+
+def _commit(check_runs: List[Dict], pull_requests: List[Dict]) -> Dict:
+	return {
+			"data": {
+					"repository": {
+							"object": {
+									"checkSuites": {"nodes": [{"checkRuns": {"nodes": check_runs}}]},
+									"associatedPullRequests": {"nodes": pull_requests},
+									},
+							},
+					},
+			}
+
+
+def test_make_checks():
+	checks = _make_checks([
+			_check_run("Flake8", conclusion="FAILURE"),
+			_check_run("mypy", conclusion="TIMED_OUT"),
+			_check_run("docs", conclusion="SUCCESS"),
+			_check_run("ubuntu-20.04 / Python 3.8", status="IN_PROGRESS"),
+			_check_run("windows-2019 / Python 3.8", conclusion="SKIPPED"),
+			_check_run("Codecov", conclusion="NEUTRAL"),
+			])
+
+	assert checks.failing == {"Flake8", "mypy"}
+	assert checks.successful == {"docs"}
+	assert checks.running == {"ubuntu-20.04 / Python 3.8"}
+	assert checks.skipped == {"windows-2019 / Python 3.8"}
+	assert checks.neutral == {"Codecov"}
+
+
+def test_make_checks_rerun():
+	# A check which failed in one suite and succeeded in another counts as failing.
+	checks = _make_checks([_check_run("Flake8", conclusion="FAILURE"), _check_run("Flake8")])
+	assert checks.failing == {"Flake8"}
+	assert not checks.successful
+
+	# And one which is still running in another suite isn't successful yet.
+	checks = _make_checks([_check_run("docs"), _check_run("docs", status="QUEUED")])
+	assert checks.running == {"docs"}
+	assert not checks.successful
+
+
+def test_fetch_commit():
+	session = FakeSession(
+			_commit(
+					[_check_run("Flake8", conclusion="FAILURE"), _check_run("docs")],
+					[
+							_pull_request(3, labels=["bug"]),
+							_pull_request(4, state="CLOSED"),
+							_pull_request(5, head="0" * 40),
+							_pull_request(7),
+							],
+					)
+			)
+
+	state = fetch_commit(session, "octocat", "hello-world", _sha)
+
+	assert state.checks.failing == {"Flake8"}
+	assert state.checks.successful == {"docs"}
+
+	# Only the open pull requests whose head is the commit.
+	assert [(pull.number, pull.labels) for pull in state.pull_requests] == [(3, {"bug"}), (7, set())]
+	assert all(pull.checks == state.checks for pull in state.pull_requests)
+
+	assert session.requests[0]["variables"] == {"owner": "octocat", "name": "hello-world", "sha": _sha}
+
+
+def test_fetch_commit_missing():
+	session = FakeSession({"data": {"repository": {"object": None}}})
+
+	state = fetch_commit(session, "octocat", "hello-world", _sha)
+	assert state.pull_requests == []
+	assert not state.checks.failing
+
+
+def test_graphql_errors(capsys):
+	session = FakeSession({"data": None, "errors": [{"message": "Could not resolve to a Repository"}]})
+
+	with pytest.raises(GraphQLError, match="Could not resolve to a Repository"):
+		graphql(session, "query { viewer { login } }")
+
+	# Partial results are returned, and the errors logged.
+	session = FakeSession({"data": {"viewer": {"login": "octocat"}}, "errors": [{"message": "Rate limited"}]})
+	assert graphql(session, "query { viewer { login } }") == {"viewer": {"login": "octocat"}}
+	assert "GraphQL error: Rate limited" in capsys.readouterr().out
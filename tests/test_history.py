@@ -0,0 +1,222 @@
+# stdlib
+import json
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+# 3rd party
+import pytest
+
+# this package
+from repo_helper_bot import history
+from repo_helper_bot.db import UpdateRun, UpdateRunRollup, db
+from repo_helper_bot.history import _bucket, _combine, _percentile, record_run, rollup_runs, run_stats
+from repo_helper_bot.updater import UpdateResult
+
+_day = 24 * 60 * 60
+
+# Midday on 10 January 2026, UTC.
+_noon = datetime(2026, 1, 10, 12, tzinfo=timezone.utc).timestamp()
+
+
+def _run(
+		started: float,
+		duration: float,
+		full_name: str = "octocat/hello-world",
+		trigger: str = "push",
+		stages: Optional[Dict[str, float]] = None,
+		error: Optional[str] = None,
+		) -> None:
+	db.session.add(
+			UpdateRun(
+					repo_id=1296269,
+					full_name=full_name,
+					trigger=trigger,
+					started=started,
+					duration=duration,
+					stages=json.dumps(stages or {}),
+					error=error,
+					)
+			)
+	db.session.commit()
+
+
+def test_percentile():
+	assert _percentile([], 50) is None
+	assert _percentile([4.0], 95) == 4.0
+
+	values = [float(i) for i in range(1, 21)]
+	assert _percentile(values, 50) == 10.0
+	assert _percentile(values, 95) == 19.0
+	assert _percentile(values, 100) == 20.0
+
+
+def test_combine():
+	assert _combine(None, 0, 3.0, 2) == 3.0
+	assert _combine(3.0, 2, None, 0) == 3.0
+	assert _combine(None, 0, None, 0) is None
+
+	# The mean of the two, weighted by the number of runs.
+	assert _combine(10.0, 3, 2.0, 1) == 8.0
+	assert _combine(10.0, 1, 2.0, 3) == 4.0
+
+
+def test_rollup_runs(database):
+	for duration in [1.0, 2.0, 3.0, 10.0]:
+		_run(_noon - _day, duration)
+
+	_run(_noon - _day, 5.0, full_name="octocat/spoon-knife", error="CalledProcessError")
+	_run(_noon, 7.0)
+
+	# Runs on the same day as the cutoff aren't rolled up yet, so each day's percentiles use all of its runs.
+	assert rollup_runs(before=_noon + 60) == 5
+
+	rollups = {(row.day, row.full_name): row for row in UpdateRunRollup.query}
+	assert set(rollups) == {("2026-01-09", "octocat/hello-world"), ("2026-01-09", "octocat/spoon-knife")}
+
+	rollup = rollups[("2026-01-09", "octocat/hello-world")]
+	assert (rollup.runs, rollup.failures, rollup.p50, rollup.p95) == (4, 0, 2.0, 10.0)
+
+	rollup = rollups[("2026-01-09", "octocat/spoon-knife")]
+	assert (rollup.runs, rollup.failures, rollup.p50, rollup.p95) == (1, 1, 5.0, 5.0)
+
+	assert [run.duration for run in UpdateRun.query] == [7.0]
+
+
+def test_rollup_runs_existing(database):
+	_run(_noon - _day, 2.0)
+	_run(_noon - _day, 4.0)
+	_run(_noon - _day, 6.0)
+	rollup_runs(before=_noon)
+
+	# A late run for a day that was already rolled up.
+	_run(_noon - _day, 10.0, error="HangupException")
+	assert rollup_runs(before=_noon) == 1
+
+	rollup = UpdateRunRollup.query.populate_existing().get(("2026-01-09", "octocat/hello-world"))
+	assert (rollup.runs, rollup.failures) == (4, 1)
+
+	# The mean of the percentiles, weighted by the number of runs.
+	assert rollup.p50 == (4.0 * 3 + 10.0) / 4
+	assert rollup.p95 == (6.0 * 3 + 10.0) / 4
+
+
+def test_maybe_rollup(database, monkeypatch):
+	calls = []
+	monkeypatch.setattr(history, "rollup_runs", lambda: calls.append(1))
+	monkeypatch.setattr(history, "_last_rollup", 0.0)
+
+	history.maybe_rollup()
+	history.maybe_rollup()
+	assert len(calls) == 1
+
+	monkeypatch.setattr(history, "_last_rollup", time.time() - history.ROLLUP_INTERVAL)
+	history.maybe_rollup()
+	assert len(calls) == 2
+
+
+def test_record_run(database, monkeypatch):
+	monkeypatch.setattr(history, "maybe_rollup", lambda: None)
+
+	profiler = SimpleNamespace(
+			duration=12.5,
+			stages={"clone": 10.0, "push": 2.5},
+			bytes_cloned=1024,
+			files_changed=3,
+			api_calls=7,
+			)
+	repository = {"id": 1296269, "full_name": "octocat/hello-world"}
+
+	run = record_run(repository, "push", profiler, UpdateResult(ret=0, pr_number=42, msg="Success!"))
+	assert (run.full_name, run.trigger, run.duration, run.ret, run.pr_number, run.error) == (
+			"octocat/hello-world", "push", 12.5, 0, 42, None
+			)
+	assert json.loads(run.stages) == profiler.stages
+	assert time.time() - 13.5 < run.started < time.time() - 11.5
+
+	# The exception is recorded by name, whether raised or returned.
+	run = record_run(repository, "sweep", profiler, exception=ValueError("Oops"))
+	assert (run.ret, run.error) == (None, "ValueError")
+
+	run = record_run(repository, "sweep", profiler, UpdateResult(ret=1, exception=OSError("Disk full")))
+	assert (run.ret, run.error) == (1, "OSError")
+
+
+@pytest.fixture()
+def runs(database) -> float:
+	# Recent runs of two repositories, and the time they started.
+
+	started = time.time() - 60 * 60
+
+	_run(started, 10.0, trigger="push", stages={"clone": 8.0, "push": 2.0})
+	_run(started, 20.0, trigger="sweep", stages={"clone": 15.0, "push": 5.0}, error="HangupException")
+	_run(started, 30.0, full_name="octocat/spoon-knife", trigger="push", stages={"clone": 30.0})
+
+	# Too old to be included.
+	_run(started - 32 * _day, 100.0, trigger="push", stages={"clone": 100.0})
+
+	return started
+
+
+def test_run_stats_repository(runs: float):
+	assert run_stats() == [
+			{"repository": "octocat/hello-world", "bucket": None, "runs": 2, "failures": 1, "p50": 10.0, "p95": 20.0},
+			{"repository": "octocat/spoon-knife", "bucket": None, "runs": 1, "failures": 0, "p50": 30.0, "p95": 30.0},
+			]
+
+	stats = run_stats(full_name="octocat/spoon-knife")
+	assert [row["repository"] for row in stats] == ["octocat/spoon-knife"]
+
+
+def test_run_stats_stage(runs: float):
+	assert run_stats(group="stage") == [
+			{"stage": "clone", "bucket": None, "runs": 3, "failures": 1, "p50": 15.0, "p95": 30.0},
+			{"stage": "push", "bucket": None, "runs": 2, "failures": 1, "p50": 2.0, "p95": 5.0},
+			]
+
+
+def test_run_stats_trigger(runs: float):
+	assert run_stats(group="trigger") == [
+			{"trigger": "push", "bucket": None, "runs": 2, "failures": 0, "p50": 10.0, "p95": 30.0},
+			{"trigger": "sweep", "bucket": None, "runs": 1, "failures": 1, "p50": 20.0, "p95": 20.0},
+			]
+
+
+def test_run_stats_bucket(runs: float):
+	stats = run_stats(group="trigger", bucket="hour")
+	assert [(row["trigger"], row["bucket"]) for row in stats] == [
+			("push", _bucket(runs, "hour")),
+			("sweep", _bucket(runs, "hour")),
+			]
+
+
+def test_run_stats_rollups(runs: float):
+	# Older days are only available from their rollups.
+	rollup_runs()
+	old = _bucket(runs - 32 * _day, "day")
+	assert UpdateRunRollup.query.get((old, "octocat/hello-world")) is not None
+
+	stats = run_stats(days=33, bucket="day", full_name="octocat/hello-world")
+	assert stats == [
+			{"repository": "octocat/hello-world", "bucket": old, "runs": 1, "failures": 0, "p50": 100.0, "p95": 100.0},
+			{
+					"repository": "octocat/hello-world",
+					"bucket": _bucket(runs, "day"),
+					"runs": 2,
+					"failures": 1,
+					"p50": 10.0,
+					"p95": 20.0,
+					},
+			]
+
+	# Rollups are only included when grouping by repository and day.
+	assert len(run_stats(days=33, group="trigger", bucket="day")) == 2
+
+
+def test_run_stats_invalid(database):
+	with pytest.raises(ValueError, match="Unknown group 'owner'"):
+		run_stats(group="owner")
+
+	with pytest.raises(ValueError, match="Unknown bucket 'week'"):
+		run_stats(bucket="week")
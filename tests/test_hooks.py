@@ -0,0 +1,217 @@
+# stdlib
+import json
+from typing import Dict, Iterable, List, Optional, Set
+
+# 3rd party
+import flask
+import pytest
+from github3 import GitHub
+from github3.exceptions import GitHubError
+from github3_utils.check_labels import Checks
+
+# this package
+from repo_helper_bot import hooks
+from repo_helper_bot.constants import app
+from repo_helper_bot.graphql import CommitState, PullRequestState
+
+_sha = "6dcb09b5b57875f334f61aebed695e2e4193db5e"
+
+
+class FakeResponse:
+
+	def __init__(self, status_code: int, body: object = None):
+		self.status_code = status_code
+		self.body = body
+		self.headers: Dict[str, str] = {}
+		self.content = b''
+
+	def json(self) -> object:
+		return self.body
+
+
+class FakeClient(GitHub):
+	# The installation's client, recording the requests made rather than sending them.
+
+	def __init__(self, labels: Optional[Dict[int, List[str]]] = None, failures: Optional[Dict[str, int]] = None):
+		super().__init__()
+
+		#: The labels of each pull request.
+		self.labels = labels or {}
+
+		#: Mapping of paths to the status code of a failed request.
+		self.failures = failures or {}
+
+		self.requests: List[tuple] = []
+
+	def _request(self, method: str, url: str, data: Optional[str] = None, **kwargs) -> FakeResponse:
+		path = url[len("https://api.github.com/"):]
+		self.requests.append((method.upper(), path, *([json.loads(data)] if data else [])))
+
+		if path in self.failures:
+			return FakeResponse(self.failures[path], {"message": "Validation Failed"})
+		elif method == "get":
+			number = int(path.split('/')[4])
+			return FakeResponse(200, [{"name": name} for name in self.labels.get(number, [])])
+		elif method == "post" and not path.endswith("/labels"):
+			return FakeResponse(201, {})
+		else:
+			return FakeResponse(200, [])
+
+
+def _payload(suite_id: int = 1, pull_requests: Iterable[int] = ()) -> Dict:
+	return {
+			"action": "completed",
+			"installation": {"id": 1},
+			"repository": {
+					"id": 1296269,
+					"name": "hello-world",
+					"full_name": "octocat/hello-world",
+					"owner": {"login": "octocat"},
+					},
+			"check_suite": {
+					"id": suite_id,
+					"head_sha": _sha,
+					"pull_requests": [{"number": number} for number in pull_requests],
+					},
+			}
+
+
+@pytest.fixture()
+def labelled(database, monkeypatch) -> List[PullRequestState]:
+	# The pull requests labelled by the hook.
+
+	labelled: List[PullRequestState] = []
+	monkeypatch.setattr(hooks, "bootstrap_labels", lambda *args: None)
+	monkeypatch.setattr(hooks, "label_pr_failures", lambda owner, repo, pull: labelled.append(pull))
+	return labelled
+
+
+def _checks(failing: Iterable[str] = (), successful: Iterable[str] = ()) -> Checks:
+	return Checks(successful=set(successful), failing=set(failing), running=set(), skipped=set(), neutral=set())
+
+
+def _run_hook(
+		payload: Dict,
+		pulls: List[PullRequestState],
+		monkeypatch,
+		client: Optional[FakeClient] = None,
+		) -> FakeClient:
+	checks = _checks(failing={"Flake8"})
+	state = CommitState(checks=checks, pull_requests=[pull._replace(checks=checks) for pull in pulls])
+	monkeypatch.setattr(hooks, "fetch_commit", lambda *args: state)
+
+	client = client or FakeClient()
+
+	with app.test_request_context(json=payload):
+		flask.g.githubapp_installation = client
+		hooks.on_check_suite_completed()
+
+	return client
+
+
+def test_check_suite_fork(labelled: List[PullRequestState], monkeypatch):
+	# The payload doesn't list pull requests from forks.
+	_run_hook(_payload(), [PullRequestState(7, {"bug"})], monkeypatch)
+
+	assert [(pull.number, pull.labels) for pull in labelled] == [(7, {"bug"})]
+	assert labelled[0].checks is not None
+	assert labelled[0].checks.failing == {"Flake8"}
+
+
+def test_check_suite_fork_and_branch(labelled: List[PullRequestState], monkeypatch):
+	# Pull requests from both a branch of the repository and a fork have the same head.
+	pulls = [PullRequestState(3, set()), PullRequestState(7, {"bug"})]
+	client = _run_hook(_payload(pull_requests=[3]), pulls, monkeypatch)
+
+	assert sorted(pull.number for pull in labelled) == [3, 7]
+
+	# Both were returned by the query, so no more requests are needed.
+	assert client.requests == []
+
+
+def test_check_suite_payload_only(labelled: List[PullRequestState], monkeypatch):
+	# Pull requests in the payload but not returned by the query are labelled too.
+	client = FakeClient(labels={3: ["failure: Linux"]})
+	_run_hook(_payload(pull_requests=[3]), [PullRequestState(7, set())], monkeypatch, client)
+
+	assert sorted((pull.number, tuple(pull.labels)) for pull in labelled) == [(3, ("failure: Linux", )), (7, ())]
+	assert client.requests == [("GET", "repos/octocat/hello-world/issues/3/labels")]
+
+	pull = next(pull for pull in labelled if pull.number == 3)
+	assert pull.checks is not None
+	assert pull.checks.failing == {"Flake8"}
+
+
+def test_check_suite_redelivered(labelled: List[PullRequestState], monkeypatch):
+	_run_hook(_payload(suite_id=1), [PullRequestState(7, set())], monkeypatch)
+	_run_hook(_payload(suite_id=1), [PullRequestState(7, set())], monkeypatch)
+
+	assert [pull.number for pull in labelled] == [7]
+
+
+def _label(client: FakeClient, pull: PullRequestState) -> Set[str]:
+	with app.test_request_context():
+		flask.g.githubapp_installation = client
+		return hooks.label_pr_failures("octocat", "hello-world", pull)
+
+
+def test_label_pr_failures():
+	client = FakeClient()
+	checks = _checks(failing={"Flake8"}, successful={"ubuntu-20.04 / Python 3.8", "docs"})
+	pull = PullRequestState(3, {"bug", "failure: Linux", "failure: flake8"}, checks)
+
+	assert _label(client, pull) == {"bug", "failure: flake8"}
+	assert client.requests == [("DELETE", "repos/octocat/hello-world/issues/3/labels/failure: Linux")]
+
+	pull = PullRequestState(3, {"bug"}, checks)
+	client = FakeClient()
+
+	assert _label(client, pull) == {"bug", "failure: flake8"}
+	assert client.requests == [("POST", "repos/octocat/hello-world/issues/3/labels", {"labels": ["failure: flake8"]})]
+
+
+def test_label_pr_failures_already_removed():
+	client = FakeClient(failures={"repos/octocat/hello-world/issues/3/labels/failure: Linux": 404})
+	pull = PullRequestState(3, {"failure: Linux"}, _checks(successful={"ubuntu-20.04 / Python 3.8"}))
+
+	assert _label(client, pull) == set()
+
+
+def test_label_pr_failures_error():
+	client = FakeClient(failures={"repos/octocat/hello-world/issues/3/labels": 403})
+	pull = PullRequestState(3, set(), _checks(failing={"Flake8"}))
+
+	with pytest.raises(GitHubError, match="403 Validation Failed"):
+		_label(client, pull)
+
+
+def _assign(client: FakeClient, author: str = "octocat") -> None:
+	payload = {
+			"action": "opened",
+			"installation": {"id": 1},
+			"repository": {"name": "hello-world", "owner": {"login": "octocat"}},
+			"pull_request": {"number": 3, "user": {"login": author}, "requested_reviewers": []},
+			}
+
+	with app.test_request_context(json=payload):
+		flask.g.githubapp_installation = client
+		hooks.assign_pr()
+
+
+def test_assign_pr():
+	client = FakeClient()
+	_assign(client)
+
+	assert client.requests == [
+			("POST", "repos/octocat/hello-world/issues/3/assignees", {"assignees": ["domdfcoding"]}),
+			("POST", "repos/octocat/hello-world/pulls/3/requested_reviewers", {"reviewers": ["domdfcoding"]}),
+			]
+
+
+def test_assign_pr_error(capsys):
+	client = FakeClient(failures={"repos/octocat/hello-world/issues/3/assignees": 422})
+	_assign(client)
+
+	# The review is still requested.
+	assert len(client.requests) == 2
+	assert "Unable to assign PR #3 in octocat/hello-world: 422 Validation Failed" in capsys.readouterr().out
@@ -0,0 +1,234 @@
+# stdlib
+import json
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+from typing import Dict, List
+
+# 3rd party
+import pytest
+
+# this package
+from repo_helper_bot import routes
+from repo_helper_bot.constants import app
+from repo_helper_bot.db import UpdateJob
+from repo_helper_bot.jobs import JOB_RETENTION, JobTracker, create_job
+from repo_helper_bot.scheduler import Priority
+from repo_helper_bot.updater import UpdateResult
+
+_repository = {"id": 1296269, "full_name": "octocat/hello-world"}
+
+
+class FakeScheduler:
+	# Records the updates submitted, and returns a future for each which the test can complete.
+
+	def __init__(self):
+		self.submitted: List[Dict] = []
+		self.futures: List[Future] = []
+
+	def submit(self, repository: Dict, priority: Priority, **kwargs) -> SimpleNamespace:
+		self.submitted.append({"repository": repository, "priority": priority, **kwargs})
+		self.futures.append(Future())
+		return SimpleNamespace(future=self.futures[-1])
+
+
+@pytest.fixture()
+def scheduler(database, monkeypatch) -> FakeScheduler:
+	scheduler = FakeScheduler()
+	monkeypatch.setattr(routes, "scheduler", scheduler)
+	monkeypatch.setattr(routes, "_find_repository", {"octocat/hello-world": _repository}.get)
+	return scheduler
+
+
+@pytest.fixture()
+def client(scheduler: FakeScheduler, monkeypatch):
+	# Don't start the real scheduler's threads, which would outlive the test database.
+	monkeypatch.setattr(app, "_got_first_request", True)
+	return app.test_client()
+
+
+def _events(body: str) -> List[Dict]:
+	# Parse a stream of server-sent events.
+
+	events = []
+
+	for block in body.split("\n\n"):
+		fields = dict(line.split(": ", 1) for line in block.splitlines())
+		if fields:
+			events.append(fields)
+
+	return events
+
+
+def test_create_job(database):
+	old = create_job("octocat/hello-world")
+	old.finished = time.time() - JOB_RETENTION - 1
+
+	job = create_job("octocat/hello-world")
+	assert job.status == "queued"
+	assert job.to_dict()["result"] is None
+
+	# Jobs which finished long ago are forgotten.
+	assert [row.id for row in UpdateJob.query] == [job.id]
+
+
+def test_job_tracker(database):
+	job = create_job("octocat/hello-world")
+	tracker = JobTracker(job.id)
+
+	tracker.started()
+	tracker("clone")
+	tracker("push")
+
+	data = UpdateJob.query.populate_existing().get(job.id).to_dict()
+	assert (data["status"], data["stage"]) == ("running", "push")
+	assert [stage["name"] for stage in data["stages"]] == ["clone", "push"]
+
+	tracker.finished(UpdateResult(ret=0, pr_number=42, msg="Success!"))
+
+	data = UpdateJob.query.populate_existing().get(job.id).to_dict()
+	assert (data["status"], data["stage"]) == ("done", None)
+	assert data["result"] == {"ret": 0, "pr_number": 42, "msg": "Success!", "traceback": None}
+
+
+def test_job_tracker_failed(database):
+	job = create_job("octocat/hello-world")
+
+	try:
+		raise ValueError("Oops")
+	except ValueError as e:
+		JobTracker(job.id).failed(e)
+
+	data = UpdateJob.query.populate_existing().get(job.id).to_dict()
+	assert data["status"] == "error"
+	assert data["result"]["msg"] == "Oops"
+	assert "ValueError: Oops" in data["result"]["traceback"]
+
+
+def test_request_run_handoff(client, scheduler: FakeScheduler, monkeypatch):
+	monkeypatch.setattr(routes, "REQUEST_TIMEOUT", 0.01)
+
+	response = client.get("/request/octocat/hello-world/")
+
+	# The update is still running, so the response links to its job.
+	assert response.status_code == 202
+	job_url = response.headers["Location"]
+	assert job_url in response.get_data(as_text=True)
+
+	job = client.get(job_url).get_json()
+	assert job["repository"] == "octocat/hello-world"
+	assert job["status"] == "queued"
+
+	assert scheduler.submitted[0]["priority"] == Priority.INTERACTIVE
+	assert scheduler.submitted[0]["trigger"] == "request"
+	assert scheduler.submitted[0]["tracker"].job_id == job["id"]
+
+
+def test_request_run_finished(client, scheduler: FakeScheduler, monkeypatch):
+
+	def submit(repository: Dict, priority: Priority, **kwargs) -> SimpleNamespace:
+		namespace = FakeScheduler.submit(scheduler, repository, priority, **kwargs)
+		namespace.future.set_result(UpdateResult(ret=0, pr_number=42))
+		return namespace
+
+	monkeypatch.setattr(scheduler, "submit", submit)
+
+	response = client.get("/request/octocat/hello-world/")
+	assert response.status_code == 200
+	assert "https://github.com/octocat/hello-world/pull/42" in response.get_data(as_text=True)
+
+
+def test_request_run_not_found(client, scheduler: FakeScheduler):
+	assert client.get("/request/octocat/spoon-knife/").status_code == 404
+	assert not scheduler.submitted
+
+
+def test_start_job(client, scheduler: FakeScheduler):
+	response = client.post("/jobs/", json={"repository": "octocat/hello-world"})
+
+	assert response.status_code == 202
+	job = response.get_json()
+	assert response.headers["Location"].endswith(f"/jobs/{job['id']}/")
+	assert job["status"] == "queued"
+	assert scheduler.submitted[0]["trigger"] == "api"
+
+	# Form data works too.
+	assert client.post("/jobs/", data={"repository": "octocat/hello-world"}).status_code == 202
+
+	assert client.post("/jobs/", json={}).status_code == 400
+	assert client.post("/jobs/", json={"repository": "octocat/spoon-knife"}).status_code == 404
+	assert len(scheduler.submitted) == 2
+
+
+def test_job_status(client):
+	job = create_job("octocat/hello-world")
+	url = f"/jobs/{job.id}/"
+
+	response = client.get(url)
+	assert response.status_code == 200
+	assert response.headers["Retry-After"] == str(routes.JOB_POLL_INTERVAL)
+	etag = response.headers["ETag"]
+
+	# Nothing has changed.
+	response = client.get(url, headers={"If-None-Match": etag})
+	assert response.status_code == 304
+	assert response.get_data() == b''
+
+	JobTracker(job.id).started()
+
+	response = client.get(url, headers={"If-None-Match": etag})
+	assert response.status_code == 200
+	assert response.get_json()["status"] == "running"
+	assert response.headers["ETag"] != etag
+
+	# Finished jobs don't need polling again.
+	JobTracker(job.id).finished(UpdateResult(ret=0, pr_number=42))
+
+	response = client.get(url)
+	assert response.get_json()["result"]["pr_number"] == 42
+	assert "Retry-After" not in response.headers
+
+
+def test_job_status_not_found(client):
+	assert client.get("/jobs/0123456789abcdef/").status_code == 404
+	assert client.get("/jobs/0123456789abcdef/events").status_code == 404
+
+
+def test_job_events(client, monkeypatch):
+	job = create_job("octocat/hello-world")
+	tracker = JobTracker(job.id)
+	steps = [tracker.started, lambda: tracker("clone"), lambda: tracker.finished(UpdateResult(ret=0, pr_number=42))]
+
+	# Advance the job instead of waiting between polls.
+	monkeypatch.setattr(time, "sleep", lambda seconds: steps.pop(0)())
+
+	response = client.get(f"/jobs/{job.id}/events")
+	assert response.mimetype == "text/event-stream"
+	assert response.headers["Cache-Control"] == "no-cache"
+
+	events = _events(response.get_data(as_text=True))
+	assert events[0] == {"retry": str(routes.JOB_POLL_INTERVAL * 1000)}
+	assert [event["event"] for event in events[1:]] == ["progress", "progress", "progress", "result"]
+
+	data = [json.loads(event["data"]) for event in events[1:]]
+	assert [item["status"] for item in data] == ["queued", "running", "running", "done"]
+	assert data[2]["stage"] == "clone"
+	assert data[3]["result"]["pr_number"] == 42
+
+	# The stream ends once the job has finished.
+	assert not steps
+
+
+def test_job_events_timeout(client, monkeypatch):
+	monkeypatch.setattr(routes, "JOB_EVENTS_TIMEOUT", -1)
+	job = create_job("octocat/hello-world")
+
+	def sleep(seconds: float) -> None:
+		raise AssertionError("The stream should have closed.")
+
+	monkeypatch.setattr(time, "sleep", sleep)
+
+	events = _events(client.get(f"/jobs/{job.id}/events").get_data(as_text=True))
+
+	# The stream closes after the timeout, even though the job hasn't finished.
+	assert [event.get("event") for event in events] == [None, "progress"]
@@ -0,0 +1,173 @@
+# stdlib
+from typing import Dict, List, Optional, Set, Tuple
+
+# 3rd party
+import pytest
+
+# this package
+from repo_helper_bot import labels
+from repo_helper_bot.db import LabelBootstrap
+from repo_helper_bot.graphql import GraphQLError
+from repo_helper_bot.labels import BOT_LABELS, LABELS_VERSION, bootstrap_installations, bootstrap_labels
+
+
+class FakeResponse:
+
+	def __init__(self, status_code: int):
+		self.status_code = status_code
+
+
+class FakeGitHub:
+	# Stands in for the GitHub API, with the labels which exist in each repository.
+	# None indicates the repository doesn't exist.
+
+	def __init__(self, repositories: Dict[str, Optional[Set[str]]], status_code: int = 201):
+		self.repositories = repositories
+		self.status_code = status_code
+		self.session = None
+		self.queries = 0
+		self.created: List[Tuple[str, str]] = []
+
+	def graphql(self, session, query: str, **variables) -> Dict:
+		self.queries += 1
+		data = {}
+
+		i = 0
+		while f"o{i}" in variables:
+			existing = self.repositories[f"{variables[f'o{i}']}/{variables[f'n{i}']}"]
+
+			if existing is None:
+				data[f"r{i}"] = None
+			else:
+				data[f"r{i}"] = {
+						f"l{j}": {"name": name} if name in existing else None
+						for j, name in enumerate(BOT_LABELS)
+						}
+
+			i += 1
+
+		return data
+
+	def _build_url(self, *args: str) -> str:
+		return '/'.join(args)
+
+	def _post(self, url: str, data: Dict) -> FakeResponse:
+		_, owner, name, _ = url.split('/')
+		self.created.append((f"{owner}/{name}", data["name"]))
+
+		if self.status_code == 201:
+			self.repositories[f"{owner}/{name}"].add(data["name"])
+
+		return FakeResponse(self.status_code)
+
+
+def _repository(repo_id: int, owner: str = "octocat") -> Dict:
+	return {
+			"id": repo_id,
+			"full_name": f"{owner}/repo-{repo_id}",
+			"name": f"repo-{repo_id}",
+			"owner": {"login": owner},
+			}
+
+
+def _bootstrapped() -> List[int]:
+	return sorted(bootstrap.repo_id for bootstrap in LabelBootstrap.query.filter_by(version=LABELS_VERSION))
+
+
+@pytest.fixture()
+def github(monkeypatch) -> FakeGitHub:
+	github = FakeGitHub({
+			"octocat/repo-1": set(BOT_LABELS),
+			"octocat/repo-2": set(),
+			"octocat/repo-3": None,
+			})
+	monkeypatch.setattr(labels, "graphql", github.graphql)
+	return github
+
+
+def test_bootstrap_labels(database, github: FakeGitHub):
+	repositories = [_repository(1), _repository(2), _repository(3)]
+
+	assert bootstrap_labels(github, repositories) == 3
+	assert github.queries == 1
+
+	# Only the missing labels are created.
+	assert github.created == [("octocat/repo-2", name) for name in BOT_LABELS]
+
+	# The deleted repository isn't recorded, in case it comes back.
+	assert _bootstrapped() == [1, 2]
+
+	# Repositories are only checked once.
+	assert bootstrap_labels(github, repositories) == 1
+	assert bootstrap_labels(github, repositories[:2]) == 0
+	assert github.queries == 2
+
+
+def test_bootstrap_labels_batches(database, github: FakeGitHub, monkeypatch):
+	monkeypatch.setattr(labels, "BATCH_SIZE", 1)
+	assert bootstrap_labels(github, [_repository(1), _repository(2)]) == 2
+	assert github.queries == 2
+
+
+def test_bootstrap_labels_new_version(database, github: FakeGitHub):
+	database.session.add(LabelBootstrap(repo_id=1, full_name="octocat/repo-1", version="old"))
+	database.session.commit()
+
+	# The labels have changed since the repository was bootstrapped.
+	assert bootstrap_labels(github, [_repository(1)]) == 1
+	assert _bootstrapped() == [1]
+
+
+def test_bootstrap_labels_already_exists(database, github: FakeGitHub):
+	# Another worker created the labels in the meantime.
+	github.status_code = 422
+
+	bootstrap_labels(github, [_repository(2)])
+	assert _bootstrapped() == [2]
+
+
+@pytest.mark.parametrize("status_code", [403, 500])
+def test_bootstrap_labels_failed(database, github: FakeGitHub, status_code: int):
+	github.status_code = status_code
+
+	bootstrap_labels(github, [_repository(1), _repository(2)])
+
+	# All the labels are attempted, but the repository is left to be bootstrapped again.
+	assert github.created == [("octocat/repo-2", name) for name in BOT_LABELS]
+	assert _bootstrapped() == [1]
+
+	github.status_code = 201
+	github.created.clear()
+
+	assert bootstrap_labels(github, [_repository(1), _repository(2)]) == 1
+	assert github.created == [("octocat/repo-2", name) for name in BOT_LABELS]
+	assert _bootstrapped() == [1, 2]
+
+
+class FakeContextSwitcher:
+
+	def __init__(self):
+		self.logins: List[str] = []
+
+	def login_as_repo_installation(self, owner: str, repository: str) -> None:
+		self.logins.append(owner)
+
+
+def test_bootstrap_installations(database, github: FakeGitHub, monkeypatch):
+	github.repositories["hubot/repo-4"] = set()
+	context_switcher = FakeContextSwitcher()
+
+	def graphql(session, query: str, **variables) -> Dict:
+		if variables["o0"] == "octocat":
+			raise GraphQLError([{"message": "Something went wrong"}])
+		return github.graphql(session, query, **variables)
+
+	monkeypatch.setattr(labels, "client", github)
+	monkeypatch.setattr(labels, "context_switcher", context_switcher)
+	monkeypatch.setattr(labels, "graphql", graphql)
+
+	# A failure for one installation doesn't stop the others.
+	bootstrap_installations([_repository(4, "hubot"), _repository(1), _repository(2)])
+
+	assert context_switcher.logins == ["hubot", "octocat"]
+	assert _bootstrapped() == [4]
@@ -0,0 +1,92 @@
+# stdlib
+import hashlib
+import hmac
+import json
+from collections import Counter
+
+# 3rd party
+import pytest
+
+# this package
+from repo_helper_bot.loadtest import SCENARIOS, FakeGitHub, LoadResult, _free_port, make_deliveries, run_load
+
+_github_url = "http://127.0.0.1:8080"
+
+
+@pytest.mark.parametrize("scenario", list(SCENARIOS))
+def test_make_deliveries_deterministic(scenario: str):
+	deliveries = make_deliveries(scenario, 50, 10, _github_url, seed=1234)
+
+	assert len(deliveries) == 50
+	assert make_deliveries(scenario, 50, 10, _github_url, seed=1234) == deliveries
+	assert make_deliveries(scenario, 50, 10, _github_url, seed=4321) != deliveries
+
+	# A shorter run is the start of a longer one with the same seed.
+	assert make_deliveries(scenario, 20, 10, _github_url, seed=1234) == deliveries[:20]
+
+
+def test_make_deliveries():
+	deliveries = make_deliveries("mixed", 200, 3, _github_url)
+
+	assert {delivery.event for delivery in deliveries} == {"push", "check_run", "check_suite", "issue_comment"}
+	assert {delivery.payload["repository"]["full_name"] for delivery in deliveries} == {
+			"loadtest/repo-0", "loadtest/repo-1", "loadtest/repo-2"
+			}
+
+	for delivery in deliveries:
+		assert delivery.payload["repository"]["html_url"].startswith(_github_url)
+
+		if delivery.event == "issue_comment":
+			assert delivery.queues_update == (delivery.payload["comment"]["body"] == "@repo-helper recreate")
+		else:
+			assert delivery.queues_update == (delivery.event == "push")
+
+
+def test_delivery_sign():
+	delivery = make_deliveries("push", 1, 1, _github_url)[0]
+	headers, body = delivery.sign("secret")
+
+	assert json.loads(body) == delivery.payload
+	assert headers["X-GitHub-Event"] == "push"
+
+	signature = hmac.new(b"secret", body, hashlib.sha256).hexdigest()
+	assert headers["X-Hub-Signature-256"] == f"sha256={signature}"
+
+	# Each delivery gets its own ID.
+	assert delivery.sign("secret")[0]["X-GitHub-Delivery"] != headers["X-GitHub-Delivery"]
+
+
+def test_load_result_percentile():
+	result = LoadResult(1.0, [float(i) for i in range(10, 0, -1)], Counter())
+
+	assert result.percentile(0) == 1.0
+	assert result.percentile(50) == 6.0
+	assert result.percentile(95) == 10.0
+	assert result.percentile(100) == 10.0
+
+	assert LoadResult(1.0, [], Counter()).percentile(50) == 0.0
+
+
+def test_load_result_errors():
+	assert LoadResult(1.0, [], Counter({200: 5, 202: 3})).errors == 0
+	assert LoadResult(1.0, [], Counter({200: 5, 0: 2, 302: 1, 429: 3, 500: 4})).errors == 10
+
+
+def test_run_load():
+	deliveries = make_deliveries("mixed", 20, 3, _github_url)
+
+	with FakeGitHub() as github:
+		result = run_load(f"{github.url}/", deliveries, "secret", concurrency=4)
+
+	assert result.statuses == Counter({201: 20})
+	assert result.errors == 0
+	assert len(result.latencies) == 20
+	assert github.calls == Counter({"POST /": 20})
+
+
+def test_run_load_connection_error():
+	deliveries = make_deliveries("push", 3, 1, _github_url)
+	result = run_load(f"http://127.0.0.1:{_free_port()}/", deliveries, "secret", concurrency=2, timeout=5)
+
+	assert result.statuses == Counter({0: 3})
+	assert result.errors == 3
@@ -0,0 +1,122 @@
+# stdlib
+import time
+
+# this package
+from repo_helper_bot.db import UpdateLock
+from repo_helper_bot.locks import RepositoryLock
+
+
+def _row(repo_id: int = 1) -> UpdateLock:
+	return UpdateLock.query.populate_existing().get(repo_id)
+
+
+def test_acquire_release(database):
+	lock = RepositoryLock(1)
+	assert lock.acquire()
+	assert lock.held
+	assert _row().holder == lock.holder
+
+	lock.release()
+	assert not lock.held
+	assert _row() is None
+
+	# Releasing again is harmless.
+	lock.release()
+
+
+def test_context_manager(database):
+	with RepositoryLock(1) as lock:
+		assert lock.acquire()
+
+	assert _row() is None
+
+
+def test_held_by_another(database):
+	holder = RepositoryLock(1)
+	assert holder.acquire()
+
+	other = RepositoryLock(1)
+	assert not other.acquire()
+	assert not other.held
+	assert _row().holder == holder.holder
+	assert _row().pending
+
+	# Locks on other repositories are independent.
+	independent = RepositoryLock(2)
+	assert independent.acquire()
+
+	holder.release()
+	independent.release()
+
+
+def test_take_pending(database):
+	holder = RepositoryLock(1)
+	assert holder.acquire()
+
+	# Nothing pending, so the lock is released.
+	assert holder.take_pending() is None
+	assert not holder.held
+	assert _row() is None
+
+
+def test_take_pending_rerun(database):
+	holder = RepositoryLock(1)
+	assert holder.acquire()
+
+	# Any number of requests collapse into one rerun.
+	assert not RepositoryLock(1).acquire()
+	assert not RepositoryLock(1).acquire()
+
+	assert holder.take_pending() is False
+	assert holder.held
+	assert not _row().pending
+
+	assert holder.take_pending() is None
+	assert _row() is None
+
+
+def test_take_pending_recreate(database):
+	holder = RepositoryLock(1)
+	assert holder.acquire()
+
+	assert not RepositoryLock(1).acquire(recreate=True)
+	assert not RepositoryLock(1).acquire()
+
+	# A later request without recreate doesn't cancel the earlier one.
+	assert holder.take_pending() is True
+	assert not _row().pending_recreate
+
+	assert holder.take_pending() is None
+
+
+def test_expired_lease_taken_over(database):
+	crashed = RepositoryLock(1, lease=0.1)
+	assert crashed.acquire()
+
+	# Simulate the holder's process dying, so the lease isn't renewed.
+	crashed._released()
+	time.sleep(0.2)
+
+	other = RepositoryLock(1)
+	assert other.acquire()
+	assert _row().holder == other.holder
+
+	# The crashed holder can no longer release the new holder's lock.
+	crashed.held = True
+	crashed.release()
+	assert _row().holder == other.holder
+
+	other.release()
+
+
+def test_lease_renewed(database):
+	lock = RepositoryLock(1, lease=0.3)
+	assert lock.acquire()
+
+	time.sleep(0.6)
+
+	# The lease would have expired by now if it wasn't renewed.
+	assert _row().expires > time.time()
+	assert not RepositoryLock(1).acquire()
+
+	lock.release()
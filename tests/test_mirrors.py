@@ -0,0 +1,140 @@
+# stdlib
+import os
+import shutil
+import subprocess
+import time
+from typing import Dict
+
+# 3rd party
+import pytest
+from domdf_python_tools.paths import PathPlus
+
+# this package
+from repo_helper_bot.mirrors import MAINTENANCE_INTERVAL, maintain, maybe_maintain, mirror_path, update_mirror
+
+
+def _git(directory: PathPlus, *args: str) -> str:
+	return subprocess.check_output(
+			["git", "-c", "user.name=Joe Bloggs", "-c", "user.email=joe@example.com", *args],
+			cwd=directory,
+			text=True,
+			).strip()
+
+
+def _commit(upstream: PathPlus, filename: str, content: str) -> str:
+	(upstream / filename).write_text(content)
+	_git(upstream, "add", filename)
+	_git(upstream, "commit", "--quiet", "-m", f"Add {filename}")
+	return _git(upstream, "rev-parse", "HEAD")
+
+
+def _count_objects(repo: PathPlus) -> Dict[str, str]:
+	# The objects stored in the repository itself, excluding those borrowed through alternates.
+	return dict(line.split(": ") for line in _git(repo, "count-objects", "-v").splitlines())
+
+
+@pytest.fixture()
+def upstream(tmp_pathplus: PathPlus) -> PathPlus:
+	upstream = tmp_pathplus / "upstream"
+	upstream.maybe_make()
+	_git(upstream, "init", "--quiet", "--initial-branch=master")
+	_commit(upstream, "README.rst", "Hello world\n")
+	_git(upstream, "tag", "v0.1.0")
+	return upstream
+
+
+@pytest.fixture()
+def cache_dir(tmp_pathplus: PathPlus) -> PathPlus:
+	return tmp_pathplus / "mirrors"
+
+
+def _repository(upstream: PathPlus, repo_id: int = 1296269) -> Dict:
+	return {"id": repo_id, "html_url": os.fspath(upstream), "default_branch": "master"}
+
+
+def test_update_mirror(upstream: PathPlus, cache_dir: PathPlus):
+	repository = _repository(upstream)
+	mirror = update_mirror(repository, cache_dir)
+	store = cache_dir / "shared.git"
+
+	assert mirror == mirror_path(repository, cache_dir) == cache_dir / "mirrors" / "1296269.git"
+	assert (mirror / "objects" / "info" / "alternates").read_text().strip() == os.fspath(store.abspath() / "objects")
+
+	head = _git(upstream, "rev-parse", "HEAD")
+	assert _git(mirror, "rev-parse", "HEAD") == head
+	assert _git(mirror, "rev-parse", "v0.1.0") == head
+	_git(mirror, "fsck", "--connectivity-only")
+
+	# The repository was fetched straight into the store, so the mirror has no objects of its own.
+	assert _git(store, "rev-parse", "refs/mirrors/1296269/heads/master") == head
+	assert _git(store, "rev-parse", "refs/mirrors/1296269/tags/v0.1.0") == head
+	assert _count_objects(mirror)["count"] == _count_objects(mirror)["packs"] == '0'
+
+
+def test_update_mirror_existing(upstream: PathPlus, cache_dir: PathPlus):
+	repository = _repository(upstream)
+	first = _git(upstream, "rev-parse", "HEAD")
+	mirror = update_mirror(repository, cache_dir)
+
+	second = _commit(upstream, "setup.py", "import setuptools\n")
+	assert update_mirror(repository, cache_dir) == mirror
+	assert _git(mirror, "rev-parse", "HEAD") == second
+
+	# Later fetches go into the mirror, until maintenance moves them to the store.
+	assert _count_objects(mirror)["packs"] == '1'
+	assert _git(cache_dir / "shared.git", "rev-parse", "refs/mirrors/1296269/heads/master") == first
+
+
+def test_update_mirror_failed(tmp_pathplus: PathPlus, cache_dir: PathPlus):
+	repository = _repository(tmp_pathplus / "missing")
+
+	with pytest.raises(subprocess.CalledProcessError):
+		update_mirror(repository, cache_dir)
+
+	# The mirror isn't created, so the next update fetches into the store again.
+	assert not mirror_path(repository, cache_dir).exists()
+
+
+def test_maintain(upstream: PathPlus, cache_dir: PathPlus):
+	repository = _repository(upstream)
+	mirror = update_mirror(repository, cache_dir)
+	fork = update_mirror(_repository(upstream, repo_id=1), cache_dir)
+
+	head = _commit(upstream, "setup.py", "import setuptools\n")
+	update_mirror(repository, cache_dir)
+
+	maintain(cache_dir)
+
+	store = cache_dir / "shared.git"
+	assert _git(store, "rev-parse", "refs/mirrors/1296269/heads/master") == head
+	assert (cache_dir / ".maintained").is_file()
+
+	# The mirror's objects have moved to the store.
+	assert _count_objects(mirror)["count"] == _count_objects(mirror)["packs"] == '0'
+	assert _git(mirror, "rev-parse", "HEAD") == head
+	_git(mirror, "fsck", "--connectivity-only")
+
+	# The refs of deleted mirrors are removed.
+	shutil.rmtree(fork)
+	maintain(cache_dir)
+
+	refs = _git(store, "for-each-ref", "--format=%(refname)").split()
+	assert refs == ["refs/mirrors/1296269/heads/master", "refs/mirrors/1296269/tags/v0.1.0"]
+
+
+def test_maybe_maintain(upstream: PathPlus, cache_dir: PathPlus):
+	update_mirror(_repository(upstream), cache_dir)
+
+	maybe_maintain(cache_dir)
+	stamp = cache_dir / ".maintained"
+	assert stamp.is_file()
+
+	# Maintenance isn't due again yet.
+	recent = time.time() - 60
+	os.utime(stamp, (recent, recent))
+	maybe_maintain(cache_dir)
+	assert stamp.stat().st_mtime == recent
+
+	os.utime(stamp, (recent - MAINTENANCE_INTERVAL, recent - MAINTENANCE_INTERVAL))
+	maybe_maintain(cache_dir)
+	assert stamp.stat().st_mtime > recent
@@ -0,0 +1,145 @@
+# stdlib
+import errno
+import os
+import subprocess
+from typing import Dict
+
+# 3rd party
+import dulwich.porcelain
+import pytest
+from domdf_python_tools.paths import PathPlus
+
+# this package
+from repo_helper_bot import mirrors, plan
+from repo_helper_bot.limits import LimitExceeded
+from repo_helper_bot.plan import PlanResult, plan_repository
+
+_config = """\
+modname: example
+copyright_years: 2021
+author: "Joe Bloggs"
+email: "joe@example.com"
+username: "joebloggs"
+version: "0.1.0"
+license: "MIT"
+short_desc: "An example repository."
+"""
+
+
+def _make_upstream(directory: PathPlus, config: str = _config) -> Dict:
+	# Create a repository to mirror, and return it as the GitHub API would.
+
+	directory.maybe_make(parents=True)
+	filenames = ["example/__init__.py", "requirements.txt", "README.rst"]
+
+	(directory / "example").maybe_make()
+	(directory / "example" / "__init__.py").write_text('"""\nAn example repository.\n"""\n')
+	(directory / "requirements.txt").write_text("domdf-python-tools>=3.0.0\n")
+	(directory / "README.rst").write_text("=======\nexample\n=======\n")
+
+	if config:
+		(directory / "repo_helper.yml").write_text(config)
+		filenames.append("repo_helper.yml")
+
+	with dulwich.porcelain.open_repo_closing(dulwich.porcelain.init(directory)) as repo:
+		dulwich.porcelain.add(repo, [os.fspath(directory / filename) for filename in filenames])
+		author = b"Joe Bloggs <joe@example.com>"
+		dulwich.porcelain.commit(repo, message=b"Initial commit", author=author, committer=author)
+		branch = dulwich.porcelain.active_branch(repo).decode("UTF-8")
+
+	return {
+			"id": 1296269,
+			"full_name": "octocat/hello-world",
+			"html_url": os.fspath(directory),
+			"default_branch": branch,
+			}
+
+
+@pytest.fixture()
+def cache_dirs(tmp_pathplus: PathPlus, monkeypatch) -> PathPlus:
+	# Keep the mirrors and checkouts out of the real caches.
+
+	def update_mirror(repository: Dict) -> PathPlus:
+		return mirrors.update_mirror(repository, tmp_pathplus / "mirrors")
+
+	monkeypatch.setattr(plan, "update_mirror", update_mirror)
+	return tmp_pathplus / "checkouts"
+
+
+def test_summary():
+	assert PlanResult("octocat/hello-world").summary == "octocat/hello-world: up to date"
+	assert PlanResult("octocat/hello-world", error="Oops").summary == "octocat/hello-world: error: Oops"
+
+	result = PlanResult("octocat/hello-world", files=[("setup.py", 3, 1), ("logo.png", -1, -1)])
+	assert result.summary == "octocat/hello-world: 2 files changed, 3 insertions(+), 1 deletions(-)"
+
+
+def test_plan_repository(tmp_pathplus: PathPlus, cache_dirs: PathPlus):
+	repository = _make_upstream(tmp_pathplus / "upstream")
+
+	result = plan_repository(repository, cache_dirs)
+
+	assert result.error is None
+	filenames = [filename for filename, _, _ in result.files]
+	assert "tox.ini" in filenames
+	assert "+++ b/octocat/hello-world/tox.ini" in result.diff
+
+	# The checkout is left clean.
+	checkout = cache_dirs / "octocat" / "hello-world"
+	assert not (checkout / "tox.ini").exists()
+	assert subprocess.check_output(["git", "status", "--porcelain"], cwd=checkout) == b''
+
+	# The cached checkout is reused.
+	assert plan_repository(repository, cache_dirs).files == result.files
+
+
+def test_plan_repository_no_config(tmp_pathplus: PathPlus, cache_dirs: PathPlus):
+	repository = _make_upstream(tmp_pathplus / "upstream", config='')
+
+	result = plan_repository(repository, cache_dirs)
+	assert result.error == "repo_helper.yml not found"
+
+
+def test_plan_repository_clone_failed(tmp_pathplus: PathPlus, cache_dirs: PathPlus):
+	repository = _make_upstream(tmp_pathplus / "upstream")
+	repository["html_url"] = os.fspath(tmp_pathplus / "missing")
+
+	result = plan_repository(repository, cache_dirs)
+	assert result.error is not None
+	assert result.error.startswith("Unable to clone: ")
+
+
+@pytest.mark.parametrize(
+		"exception",
+		[
+				pytest.param(LimitExceeded("The mirror is too large"), id="limit"),
+				pytest.param(OSError(errno.ENOSPC, "No space left on device"), id="oserror"),
+				],
+		)
+def test_plan_repository_update_error(exception: Exception, monkeypatch):
+
+	def update_checkout(*args, **kwargs):
+		raise exception
+
+	monkeypatch.setattr(plan, "update_checkout", update_checkout)
+
+	result = plan_repository({"full_name": "octocat/hello-world"})
+	assert result.error == f"Unable to clone: {exception}"
+
+
+def test_plan_repository_clean_failed(tmp_pathplus: PathPlus, cache_dirs: PathPlus, monkeypatch):
+	repository = _make_upstream(tmp_pathplus / "upstream")
+
+	def run_repo_helper(checkout):
+		raise RuntimeError("Oops")
+
+	def _git(directory, *args):
+		raise subprocess.CalledProcessError(128, ["git", *args], stderr=b"fatal: Unable to create index.lock")
+
+	checkout = plan.update_checkout(repository, cache_dirs)
+	monkeypatch.setattr(plan, "update_checkout", lambda *args: checkout)
+	monkeypatch.setattr(plan, "run_repo_helper", run_repo_helper)
+	monkeypatch.setattr(plan, "_git", _git)
+
+	# The failure to clean up doesn't hide the actual error.
+	assert plan_repository(repository, cache_dirs).error == "RuntimeError: Oops"
@@ -0,0 +1,86 @@
+# stdlib
+import os
+
+# 3rd party
+import pytest
+
+# this package
+from repo_helper_bot.pool import WorkerDied, WorkerPool
+
+
+@pytest.fixture()
+def pool():
+	pool = WorkerPool(size=1)
+
+	try:
+		yield pool
+	finally:
+		pool.shutdown()
+
+
+def test_run(pool: WorkerPool):
+	assert pool.run(divmod, 7, 2) == (3, 1)
+
+	# The job runs in a worker process, which is reused for the next job.
+	pid = pool.run(os.getpid)
+	assert pid != os.getpid()
+	assert pool.run(os.getpid) == pid
+
+
+def test_run_exception(pool: WorkerPool):
+	with pytest.raises(ValueError, match="invalid literal"):
+		pool.run(int, "not a number")
+
+	# The worker survives exceptions raised by the job.
+	pid = pool.run(os.getpid)
+	assert pool.run(os.getpid) == pid
+
+
+def test_run_no_workers():
+	assert WorkerPool(size=0).run(os.getpid) == os.getpid()
+
+
+def test_recycle_max_jobs():
+	pool = WorkerPool(size=1, max_jobs=2)
+
+	try:
+		pids = [pool.run(os.getpid) for _ in range(4)]
+	finally:
+		pool.shutdown()
+
+	assert pids[0] == pids[1]
+	assert pids[2] == pids[3]
+	assert pids[1] != pids[2]
+
+
+def test_recycle_max_rss():
+	# Every worker uses more than a byte of memory, so is replaced after each job.
+	pool = WorkerPool(size=1, max_rss=1)
+
+	try:
+		pids = [pool.run(os.getpid) for _ in range(2)]
+	finally:
+		pool.shutdown()
+
+	assert pids[0] != pids[1]
+
+
+def test_worker_died(pool: WorkerPool):
+	pid = pool.run(os.getpid)
+
+	with pytest.raises(WorkerDied, match=f"Worker {pid} exited with code 3"):
+		pool.run(os._exit, 3)
+
+	# The worker is replaced.
+	assert pool.run(os.getpid) != pid
+	assert pool._started == 1
+
+
+def test_shutdown(pool: WorkerPool):
+	pool.run(os.getpid)
+	assert pool._idle
+
+	pool.shutdown()
+
+	assert not pool._idle
+	assert pool._started == 0
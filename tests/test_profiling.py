@@ -0,0 +1,150 @@
+# stdlib
+import marshal
+import os
+import subprocess
+import sys
+import time
+
+# 3rd party
+import pytest
+from domdf_python_tools.paths import PathPlus
+
+# this package
+from repo_helper_bot import profiling
+from repo_helper_bot.db import ProfileArtifact
+from repo_helper_bot.pool import WorkerPool
+from repo_helper_bot.profiling import UpdateProfiler
+from repo_helper_bot.sampling import _merge_stats, profile_call
+from repo_helper_bot.utils import disk_usage
+
+
+def _functions(stats: dict) -> set:
+	return {name for (_, _, name) in stats}
+
+
+@pytest.fixture()
+def pool():
+	pool = WorkerPool(size=1)
+
+	try:
+		yield pool
+	finally:
+		pool.shutdown()
+
+
+@pytest.fixture()
+def directory(tmp_pathplus: PathPlus) -> str:
+	for i in range(10):
+		(tmp_pathplus / f"{i}.txt").write_text("Hello world\n" * i)
+
+	return os.fspath(tmp_pathplus)
+
+
+def test_merge_stats():
+	func = ("utils.py", 1, "disk_usage")
+	other = ("utils.py", 2, "get_rss")
+
+	target = {func: (1, 2, 0.5, 1.0, {("updater.py", 10, "update"): (1, 2, 0.5, 1.0)})}
+	source = {
+			func: (2, 3, 0.25, 0.5, {("updater.py", 10, "update"): (2, 3, 0.25, 0.5)}),
+			other: (1, 1, 0.1, 0.1, {}),
+			}
+
+	_merge_stats(target, source)
+
+	assert target[func][:4] == (3, 5, 0.75, 1.5)
+	assert target[func][4] == {("updater.py", 10, "update"): (3, 5, 0.75, 1.5)}
+	assert target[other] == source[other]
+
+
+def test_profile_call(directory: str):
+	result, profile = profile_call(disk_usage, directory)
+
+	assert result == disk_usage(directory)
+	assert "disk_usage" in _functions(marshal.loads(profile.stats))
+	assert profile.peak_rss > 0
+
+
+def test_sampling_imports():
+	# Workers unpickle profile_call, so importing it mustn't start the web app or connect to the database.
+	code = "import sys, repo_helper_bot.sampling; print(sorted(sys.modules))"
+	modules = subprocess.check_output([sys.executable, "-c", code], text=True)
+
+	assert "repo_helper_bot.constants" not in modules
+	assert "repo_helper_bot.db" not in modules
+	assert "repo_helper_bot.profiling" not in modules
+
+
+def test_run_in_pool(pool: WorkerPool, directory: str):
+	with UpdateProfiler(enabled=True) as profiler:
+		assert profiler.run_in_pool(pool, disk_usage, directory) == disk_usage(directory)
+
+	# The worker's statistics are merged into the profile.
+	assert "disk_usage" in _functions(profiler._worker_stats)
+	assert "disk_usage" in _functions(profiler._stats())
+	assert profiler._worker_rss > 0
+
+
+def test_run_in_pool_stacks(pool: WorkerPool):
+	with UpdateProfiler(enabled=True) as profiler:
+		profiler.run_in_pool(pool, time.sleep, 0.2)
+
+	# The worker's stacks are nested under the call to run_in_pool, replacing this process waiting for it.
+	stacks = [stack.split(';') for stack in profiler._stacks]
+	nested = [stack for stack in stacks if any(frame.startswith("profile_call (sampling.py") for frame in stack)]
+	assert nested
+
+	for stack in nested:
+		assert any(frame.startswith("test_run_in_pool_stacks (test_profiling.py") for frame in stack)
+
+	for stack in stacks:
+		assert not any(frame.startswith("run (pool.py") for frame in stack)
+
+
+def test_run_in_pool_disabled(pool: WorkerPool, directory: str, monkeypatch):
+
+	def fail(*args, **kwargs):
+		raise AssertionError("Not profiling, so profile_call() shouldn't be used.")
+
+	monkeypatch.setattr(profiling, "profile_call", fail)
+
+	with UpdateProfiler(enabled=False) as profiler:
+		assert profiler.run_in_pool(pool, disk_usage, directory) == disk_usage(directory)
+
+	assert not profiler._worker_stats
+
+
+def test_run_in_pool_no_workers(directory: str):
+	# Without worker processes the call is profiled in this process.
+	with UpdateProfiler(enabled=True) as profiler:
+		profiler.run_in_pool(WorkerPool(size=0), disk_usage, directory)
+
+	assert not profiler._worker_stats
+	assert "disk_usage" in _functions(profiler._stats())
+
+
+def test_save(database, pool: WorkerPool, directory: str, monkeypatch):
+	monkeypatch.setattr(profiling, "PROFILE_RETENTION", 2)
+
+	ids = []
+
+	for _ in range(3):
+		with UpdateProfiler(enabled=True) as profiler:
+			profiler.run_in_pool(pool, disk_usage, directory)
+
+		ids.append(profiler.save(1, "octocat/hello-world"))
+
+	artifact = ProfileArtifact.query.get(ids[-1])
+	assert artifact.peak_rss == profiler.peak_rss + profiler._worker_rss
+	assert "disk_usage" in _functions(marshal.loads(artifact.pstats))
+
+	# Only the newest profiles are kept.
+	assert sorted(row.id for row in ProfileArtifact.query) == sorted(ids[1:])
+
+
+def test_save_disabled(database):
+	with UpdateProfiler(enabled=False) as profiler:
+		pass
+
+	assert profiler.save(1, "octocat/hello-world") is None
+	assert ProfileArtifact.query.count() == 0
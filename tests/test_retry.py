@@ -0,0 +1,256 @@
+# stdlib
+import socket
+import time
+from subprocess import CalledProcessError
+from typing import Dict, List
+
+# 3rd party
+import pytest
+import requests
+from dulwich.client import HTTPUnauthorized
+from dulwich.errors import GitProtocolError, HangupException
+from github3.exceptions import ForbiddenError, GitHubError, NotFoundError, ServerError, TransportError
+
+# this package
+from repo_helper_bot import retry
+from repo_helper_bot.retry import CircuitBreaker, CircuitOpen, RetryBudget, is_transient, with_retries
+
+
+class FakeResponse:
+
+	def __init__(self, status_code: int, message: str = ''):
+		self.status_code = status_code
+		self.message = message
+		self.content = message.encode("UTF-8")
+		self.headers: Dict[str, str] = {}
+
+	def json(self) -> Dict:
+		return {"message": self.message}
+
+
+def _http_error(status_code: int) -> requests.HTTPError:
+	response = requests.Response()
+	response.status_code = status_code
+	return requests.HTTPError(response=response)
+
+
+@pytest.mark.parametrize(
+		"exception, transient",
+		[
+				pytest.param(ServerError(FakeResponse(502)), True, id="server_error"),
+				pytest.param(TransportError(requests.ConnectionError()), True, id="transport_error"),
+				pytest.param(GitHubError(FakeResponse(429)), True, id="too_many_requests"),
+				pytest.param(
+						ForbiddenError(FakeResponse(403, "You have exceeded a secondary rate limit.")),
+						True,
+						id="secondary_rate_limit",
+						),
+				pytest.param(ForbiddenError(FakeResponse(403, "Resource not accessible")), False, id="forbidden"),
+				pytest.param(NotFoundError(FakeResponse(404, "Not Found")), False, id="not_found"),
+				pytest.param(HangupException(), True, id="hangup"),
+				pytest.param(HTTPUnauthorized("Unauthorized", "https://github.com"), False, id="unauthorized"),
+				pytest.param(GitProtocolError("early EOF"), True, id="early_eof"),
+				pytest.param(GitProtocolError("unexpected http resp 503 for https://github.com"), True, id="git_503"),
+				pytest.param(GitProtocolError("unexpected http resp 404 for https://github.com"), False, id="git_404"),
+				pytest.param(
+						CalledProcessError(128, "git", stderr=b"fatal: Could not resolve host: github.com"),
+						True,
+						id="git_dns",
+						),
+				pytest.param(
+						CalledProcessError(128, "git", stderr="fatal: repository not found"),
+						False,
+						id="git_not_found",
+						),
+				pytest.param(CalledProcessError(128, "git"), False, id="git_no_output"),
+				pytest.param(requests.ConnectionError(), True, id="requests_connection"),
+				pytest.param(_http_error(503), True, id="requests_503"),
+				pytest.param(_http_error(429), True, id="requests_429"),
+				pytest.param(_http_error(404), False, id="requests_404"),
+				pytest.param(socket.timeout(), True, id="socket_timeout"),
+				pytest.param(ConnectionResetError(), True, id="connection_reset"),
+				pytest.param(ValueError(), False, id="value_error"),
+				],
+		)
+def test_is_transient(exception: BaseException, transient: bool):
+	assert is_transient(exception) is transient
+
+
+def _expire(breaker: CircuitBreaker) -> None:
+	# Wind the clock forward past the breaker's reset timeout.
+	breaker.opened -= breaker.reset_timeout
+
+
+def test_circuit_breaker():
+	breaker = CircuitBreaker("api", threshold=2, reset_timeout=60)
+	assert breaker.state == "closed"
+	assert breaker.retry_after == 0
+
+	breaker.record_failure()
+	assert breaker.state == "closed"
+	breaker.check()
+
+	breaker.record_failure()
+	assert breaker.state == "open"
+	assert 0 < breaker.retry_after <= 60
+
+	with pytest.raises(CircuitOpen, match="GitHub api calls are failing"):
+		breaker.check()
+
+	# Only a single trial call is let through once the timeout has passed.
+	_expire(breaker)
+	assert breaker.state == "half_open"
+	breaker.check()
+
+	with pytest.raises(CircuitOpen):
+		breaker.check()
+
+	# The trial succeeded.
+	breaker.record_success()
+	assert breaker.state == "closed"
+	assert breaker.to_dict() == {"state": "closed", "consecutive_failures": 0, "retry_after": 0}
+	breaker.check()
+
+
+def test_circuit_breaker_trial_failed():
+	breaker = CircuitBreaker("git", threshold=2, reset_timeout=60)
+	breaker.record_failure()
+	breaker.record_failure()
+
+	_expire(breaker)
+	breaker.check()
+
+	# The trial failed, so the breaker opens again for another timeout.
+	breaker.record_failure()
+	assert breaker.state == "open"
+	assert breaker.retry_after > 59
+
+	with pytest.raises(CircuitOpen):
+		breaker.check()
+
+	_expire(breaker)
+	assert breaker.state == "half_open"
+	breaker.check()
+
+
+def test_retry_budget():
+	budget = RetryBudget(retries=2, window=60)
+
+	assert budget.spend(1)
+	assert budget.spend(1)
+	assert not budget.spend(1)
+
+	# Each repository has its own budget.
+	assert budget.spend(2)
+
+	# Retries older than the window are returned to the budget.
+	budget._spent[1][0] -= 61
+	assert budget.spend(1)
+	assert not budget.spend(1)
+
+
+class Flaky:
+	# Raises the given exceptions in turn, then returns "done".
+
+	def __init__(self, *exceptions: Exception):
+		self.exceptions = list(exceptions)
+		self.calls = 0
+
+	def __call__(self) -> str:
+		self.calls += 1
+
+		if self.exceptions:
+			raise self.exceptions.pop(0)
+
+		return "done"
+
+
+@pytest.fixture()
+def sleeps(monkeypatch) -> List[float]:
+	# Fresh breakers and budget, and the delays between attempts instead of sleeping.
+
+	sleeps: List[float] = []
+	monkeypatch.setattr(retry, "breakers", {"api": CircuitBreaker("api", threshold=5)})
+	monkeypatch.setattr(retry, "retry_budget", RetryBudget(retries=10))
+	monkeypatch.setattr(retry, "RETRY_ATTEMPTS", 3)
+	monkeypatch.setattr(time, "sleep", sleeps.append)
+	return sleeps
+
+
+def _transient() -> Exception:
+	return ServerError(FakeResponse(502, "Bad Gateway"))
+
+
+def test_with_retries(sleeps: List[float]):
+	func = Flaky(_transient(), _transient())
+
+	assert with_retries("api", 1, func) == "done"
+	assert func.calls == 3
+
+	# Exponential backoff, with jitter.
+	assert len(sleeps) == 2
+	assert 1 <= sleeps[0] <= 2
+	assert 2 <= sleeps[1] <= 4
+
+	assert retry.breakers["api"].failures == 0
+
+
+def test_with_retries_attempts(sleeps: List[float]):
+	func = Flaky(_transient(), _transient(), _transient(), _transient())
+
+	with pytest.raises(ServerError):
+		with_retries("api", 1, func)
+
+	assert func.calls == retry.RETRY_ATTEMPTS == 3
+	assert retry.breakers["api"].failures == 3
+
+
+def test_with_retries_not_transient(sleeps: List[float]):
+	retry.breakers["api"].record_failure()
+	func = Flaky(NotFoundError(FakeResponse(404, "Not Found")))
+
+	with pytest.raises(NotFoundError):
+		with_retries("api", 1, func)
+
+	assert func.calls == 1
+	assert not sleeps
+
+	# GitHub responded, so the failure doesn't count towards the breaker.
+	assert retry.breakers["api"].failures == 0
+
+
+def test_with_retries_budget(sleeps: List[float], monkeypatch):
+	monkeypatch.setattr(retry, "retry_budget", RetryBudget(retries=1))
+
+	func = Flaky(_transient(), _transient())
+	with pytest.raises(ServerError):
+		with_retries("api", 1, func)
+
+	# Only one retry was left in the repository's budget.
+	assert func.calls == 2
+
+	func = Flaky(_transient())
+	with pytest.raises(ServerError):
+		with_retries("api", 1, func)
+
+	assert func.calls == 1
+
+	# Other repositories are unaffected.
+	assert with_retries("api", 2, Flaky(_transient())) == "done"
+
+
+def test_with_retries_circuit_open(sleeps: List[float], monkeypatch):
+	monkeypatch.setattr(retry, "breakers", {"api": CircuitBreaker("api", threshold=2)})
+
+	func = Flaky(_transient(), _transient(), _transient())
+	with pytest.raises(CircuitOpen):
+		with_retries("api", 1, func)
+
+	# The breaker opened after the second failure, so there was no third attempt.
+	assert func.calls == 2
+
+	func = Flaky()
+	with pytest.raises(CircuitOpen):
+		with_retries("api", 2, func)
+
+	assert func.calls == 0
@@ -0,0 +1,161 @@
+# stdlib
+import json
+import time
+from typing import Dict, Sequence
+
+# this package
+from repo_helper_bot.db import Rollout
+from repo_helper_bot.rollout import get_active_rollout, in_rollout, record_result, rollout_for
+
+
+def _repository(repo_id: int, owner: str = "octocat") -> Dict:
+	return {"id": repo_id, "full_name": f"{owner}/repo-{repo_id}", "owner": {"login": owner}}
+
+
+def _rollout(
+		database,
+		steps: Sequence[float] = (1, 5, 25, 50, 100),
+		cohort: Sequence[str] = (),
+		min_runs: int = 10,
+		min_step_duration: float = 0,
+		) -> Rollout:
+	rollout = Rollout(
+			requirement="repo_helper==999.0.0",
+			version="999.0.0",
+			steps=json.dumps(list(steps)),
+			cohort=json.dumps(list(cohort)),
+			created=time.time(),
+			step_started=time.time(),
+			min_runs=min_runs,
+			min_success_rate=0.9,
+			min_step_duration=min_step_duration,
+			)
+	database.session.add(rollout)
+	database.session.commit()
+	return rollout
+
+
+def _reload(rollout: Rollout) -> Rollout:
+	return Rollout.query.populate_existing().get(rollout.id)
+
+
+def test_in_rollout_stable(database):
+	rollout = _rollout(database, steps=(10, ))
+	repositories = [_repository(i) for i in range(1000)]
+
+	included = [in_rollout(rollout, repository) for repository in repositories]
+	assert included == [in_rollout(rollout, repository) for repository in repositories]
+
+	# Roughly the step's share of repositories is included.
+	assert 50 < sum(included) < 150
+
+
+def test_in_rollout_grows(database):
+	rollout = _rollout(database)
+	repositories = [_repository(i) for i in range(1000)]
+
+	included = set()
+
+	for step in range(5):
+		rollout.step = step
+		now_included = {r["id"] for r in repositories if in_rollout(rollout, r)}
+
+		# Repositories stay in the rollout as it widens.
+		assert included <= now_included
+		included = now_included
+
+	assert len(included) == 1000
+
+
+def test_in_rollout_shuffled(database):
+	# Each rollout includes a different sample, so the same repositories aren't always the canaries.
+	first = _rollout(database, steps=(10, ))
+	second = _rollout(database, steps=(10, ))
+	repositories = [_repository(i) for i in range(1000)]
+
+	assert [in_rollout(first, r) for r in repositories] != [in_rollout(second, r) for r in repositories]
+
+
+def test_in_rollout_cohort(database):
+	rollout = _rollout(database, steps=(0, ), cohort=["octocat/repo-1", "hubot"])
+
+	assert in_rollout(rollout, _repository(1))
+	assert not in_rollout(rollout, _repository(2))
+	assert in_rollout(rollout, _repository(2, owner="hubot"))
+
+
+def test_active_rollout(database):
+	assert get_active_rollout() is None
+
+	rollout = _rollout(database, steps=(100, ))
+	assert get_active_rollout().id == rollout.id
+	assert rollout_for(_repository(1)).id == rollout.id
+
+	rollout.status = "aborted"
+	database.session.commit()
+	assert get_active_rollout() is None
+	assert rollout_for(_repository(1)) is None
+
+
+def test_record_result_waits_for_min_runs(database):
+	rollout = _rollout(database, min_runs=10)
+
+	for _ in range(9):
+		record_result(rollout.id, success=False)
+
+	rollout = _reload(rollout)
+	assert rollout.status == "active"
+	assert rollout.failures == 9
+
+
+def test_record_result_pauses(database):
+	rollout = _rollout(database, min_runs=10)
+
+	for _ in range(8):
+		record_result(rollout.id, success=True)
+	for _ in range(2):
+		record_result(rollout.id, success=False)
+
+	rollout = _reload(rollout)
+	assert rollout.status == "paused"
+	assert rollout.step == 0
+
+	# Paused rollouts are left alone.
+	record_result(rollout.id, success=True)
+	assert _reload(rollout).status == "paused"
+
+
+def test_record_result_widens(database):
+	rollout = _rollout(database, steps=(1, 50), min_runs=10)
+
+	for _ in range(10):
+		record_result(rollout.id, success=True)
+
+	rollout = _reload(rollout)
+	assert rollout.status == "active"
+	assert rollout.step == 1
+	assert rollout.percentage == 50
+	assert (rollout.successes, rollout.failures) == (0, 0)
+
+	for _ in range(10):
+		record_result(rollout.id, success=True)
+
+	assert _reload(rollout).status == "complete"
+
+
+def test_record_result_min_step_duration(database):
+	rollout = _rollout(database, min_runs=10, min_step_duration=3600)
+
+	for _ in range(20):
+		record_result(rollout.id, success=True)
+
+	# The step can't be widened until it has run for long enough...
+	rollout = _reload(rollout)
+	assert rollout.step == 0
+	assert rollout.successes == 20
+
+	# ...but it can still be paused.
+	for _ in range(5):
+		record_result(rollout.id, success=False)
+
+	assert _reload(rollout).status == "paused"
@@ -0,0 +1,194 @@
+# stdlib
+import threading
+from typing import Dict, List
+
+# 3rd party
+import pytest
+import sqlalchemy.exc
+
+# this package
+from repo_helper_bot import scheduler as scheduler_module
+from repo_helper_bot.constants import app
+from repo_helper_bot.db import QueuedUpdate
+from repo_helper_bot.scheduler import AGING_INTERVAL, Job, Priority, Scheduler
+
+
+def _repository(repo_id: int, owner: str = "octocat") -> Dict:
+	return {"id": repo_id, "full_name": f"{owner}/repo-{repo_id}", "owner": {"login": owner}}
+
+
+@pytest.fixture()
+def scheduler(database, monkeypatch) -> Scheduler:
+	monkeypatch.setattr(scheduler_module, "check_throttle", lambda repository: None)
+	monkeypatch.setattr(Scheduler, "start", lambda self: None)
+	return Scheduler(run_jobs=False)
+
+
+def _age(job_id: str, seconds: float) -> None:
+	QueuedUpdate.query.get(job_id).submitted -= seconds
+	scheduler_module.db.session.commit()
+
+
+def test_claim_priority_order(scheduler):
+	sweep = scheduler.submit(_repository(1), Priority.SWEEP)
+	push = scheduler.submit(_repository(2), Priority.PUSH)
+	interactive = scheduler.submit(_repository(3), Priority.INTERACTIVE)
+
+	assert scheduler._claim() is interactive
+	assert scheduler._claim() is push
+	assert scheduler._claim() is sweep
+	assert scheduler._claim() is None
+
+
+def test_effective_priority():
+	job = Job(_repository(1), Priority.SWEEP)
+	now = job.submitted
+
+	assert job.effective_priority(now) == Priority.SWEEP
+	assert job.effective_priority(now + AGING_INTERVAL - 1) == Priority.SWEEP
+	assert job.effective_priority(now + AGING_INTERVAL) == Priority.PUSH
+	assert job.effective_priority(now + AGING_INTERVAL * 2) == Priority.INTERACTIVE
+
+	# Never promoted beyond the highest class.
+	assert job.effective_priority(now + AGING_INTERVAL * 100) == Priority.INTERACTIVE
+
+
+def test_claim_aged_sweep(scheduler):
+	sweep = scheduler.submit(_repository(1, "sweeper"), Priority.SWEEP)
+	_age(sweep.id, AGING_INTERVAL * 1.5)
+
+	# Pushes keep arriving, but the sweep has waited long enough to be promoted to their class, and is older.
+	pushes = [scheduler.submit(_repository(i, "pusher"), Priority.PUSH) for i in range(2, 5)]
+
+	assert scheduler._claim() is sweep
+	assert scheduler._claim() is pushes[0]
+
+
+def test_claim_aging_bounded(scheduler):
+	sweep = scheduler.submit(_repository(1), Priority.SWEEP)
+	_age(sweep.id, AGING_INTERVAL * 1.5)
+	interactive = scheduler.submit(_repository(2), Priority.INTERACTIVE)
+
+	# One interval only promotes the sweep to the push class.
+	assert scheduler._claim() is interactive
+	assert scheduler._claim() is sweep
+
+	# Even the oldest jobs are only promoted as far as the interactive class, where the oldest runs first.
+	old_sweep = scheduler.submit(_repository(3), Priority.SWEEP)
+	_age(old_sweep.id, AGING_INTERVAL * 100)
+	newer_interactive = scheduler.submit(_repository(4), Priority.INTERACTIVE)
+
+	assert scheduler._claim() is old_sweep
+	assert scheduler._claim() is newer_interactive
+
+
+def test_claim_oldest_first(scheduler):
+	first = scheduler.submit(_repository(1), Priority.PUSH)
+	second = scheduler.submit(_repository(2), Priority.PUSH)
+	_age(second.id, 60)
+
+	assert scheduler._claim() is second
+	assert scheduler._claim() is first
+
+
+def test_claim_installations_take_turns(scheduler):
+	busy = [scheduler.submit(_repository(i, "busy"), Priority.SWEEP) for i in range(3)]
+	quiet = scheduler.submit(_repository(10, "quiet"), Priority.SWEEP)
+
+	assert scheduler._claim() is busy[0]
+	assert scheduler._claim() is quiet
+	assert scheduler._claim() is busy[1]
+	assert scheduler._claim() is busy[2]
+
+
+def test_claim_installations_beyond_batch(scheduler, monkeypatch):
+	monkeypatch.setattr(scheduler_module, "CLAIM_BATCH", 2)
+
+	# The busy installation's jobs fill every batch of the oldest jobs.
+	busy = [scheduler.submit(_repository(i, "busy"), Priority.SWEEP) for i in range(5)]
+	quiet = scheduler.submit(_repository(10, "quiet"), Priority.SWEEP)
+
+	assert scheduler._claim() is busy[0]
+	assert scheduler._claim() is quiet
+	assert scheduler._claim() is busy[1]
+
+
+def test_claim_installations_shared_between_processes(scheduler):
+	busy = [scheduler.submit(_repository(i, "busy"), Priority.SWEEP) for i in range(2)]
+	quiet = scheduler.submit(_repository(10, "quiet"), Priority.SWEEP)
+
+	# Another process claimed the busy installation's first job, so it's the quiet installation's turn here.
+	other = Scheduler(run_jobs=False)
+	assert other._claim().id == busy[0].id
+	assert scheduler._claim() is quiet
+	assert scheduler._claim() is busy[1]
+
+
+def test_claim_marks_running(scheduler):
+	job = scheduler.submit(_repository(1), Priority.PUSH)
+	assert scheduler._claim() is job
+
+	queued = QueuedUpdate.query.populate_existing().get(job.id)
+	assert queued.status == "running"
+	assert queued.attempts == 1
+	assert queued.claimed_by is not None
+
+
+def test_claim_concurrent(scheduler):
+	jobs = {scheduler.submit(_repository(i, f"owner-{i % 3}"), Priority.SWEEP).id for i in range(30)}
+	claimed: List[str] = []
+	errors: List[Exception] = []
+
+	def claimer() -> None:
+		# Each thread stands in for another worker process.
+		other = Scheduler(run_jobs=False)
+
+		while True:
+			try:
+				with app.app_context():
+					job = other._claim()
+			except sqlalchemy.exc.OperationalError:
+				# SQLite reports contention between writers as "database is locked"; the worker retries.
+				continue
+			except Exception as e:
+				errors.append(e)
+				return
+			finally:
+				scheduler_module.db.session.remove()
+
+			if job is None:
+				return
+
+			claimed.append(job.id)
+
+	threads = [threading.Thread(target=claimer) for _ in range(4)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join(timeout=60)
+
+	assert not errors
+	assert sorted(claimed) == sorted(jobs)
+
+
+def test_submit_commit_fails(scheduler, monkeypatch):
+
+	def commit() -> None:
+		raise sqlalchemy.exc.OperationalError("INSERT", {}, Exception("disk I/O error"))
+
+	monkeypatch.setattr(scheduler_module.db.session, "commit", commit)
+
+	with pytest.raises(sqlalchemy.exc.OperationalError):
+		scheduler.submit(_repository(1), Priority.PUSH)
+
+	assert not scheduler._waiting
+
+
+def test_cancelled_after_claim(scheduler):
+	job = scheduler.submit(_repository(1), Priority.PUSH)
+	assert scheduler._claim() is job
+
+	job.future.cancel()
+	scheduler._run(job)
+
+	assert QueuedUpdate.query.populate_existing().get(job.id).status == "cancelled"
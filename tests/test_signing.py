@@ -0,0 +1,141 @@
+# stdlib
+import os
+import shutil
+import subprocess
+
+# 3rd party
+import dulwich.porcelain
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from domdf_python_tools.paths import PathPlus
+from dulwich.repo import Repo
+
+# this package
+from repo_helper_bot.signing import SSHSigner, get_signer, sign_head
+
+_email = "bot@example.com"
+
+requires_ssh_keygen = pytest.mark.skipif(not shutil.which("ssh-keygen"), reason="Requires ssh-keygen")
+
+
+def _private_key(key_type: str) -> bytes:
+	if key_type == "ed25519":
+		key = ed25519.Ed25519PrivateKey.generate()
+	elif key_type == "rsa":
+		key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+	elif key_type == "ecdsa":
+		key = ec.generate_private_key(ec.SECP256R1())
+	else:
+		raise ValueError(key_type)
+
+	return key.private_bytes(
+			serialization.Encoding.PEM,
+			serialization.PrivateFormat.OpenSSH,
+			serialization.NoEncryption(),
+			)
+
+
+@pytest.fixture(params=["ed25519", "rsa"])
+def signer(request) -> SSHSigner:
+	return SSHSigner(_private_key(request.param))
+
+
+@pytest.fixture()
+def allowed_signers(tmp_pathplus: PathPlus, signer: SSHSigner) -> PathPlus:
+	allowed_signers = tmp_pathplus / "allowed_signers"
+	allowed_signers.write_text(f"{_email} {signer.public_key.decode('UTF-8')}\n")
+	return allowed_signers
+
+
+def _verify(allowed_signers: PathPlus, signature: bytes, data: bytes) -> subprocess.CompletedProcess:
+	signature_file = allowed_signers.parent / "data.sig"
+	signature_file.write_bytes(signature)
+
+	return subprocess.run(
+			["ssh-keygen", "-Y", "verify", "-f", allowed_signers, "-I", _email, "-n", "git", "-s", signature_file],
+			input=data,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.STDOUT,
+			)
+
+
+@requires_ssh_keygen
+def test_sign(signer: SSHSigner, allowed_signers: PathPlus):
+	signature = signer.sign(b"Hello world\n")
+	assert signature.startswith(b"-----BEGIN SSH SIGNATURE-----\n")
+
+	assert _verify(allowed_signers, signature, b"Hello world\n").returncode == 0
+	assert _verify(allowed_signers, signature, b"Goodbye world\n").returncode != 0
+
+
+@requires_ssh_keygen
+def test_sign_head(tmp_pathplus: PathPlus, signer: SSHSigner, allowed_signers: PathPlus):
+	repo_dir = tmp_pathplus / "repo"
+	repo_dir.maybe_make()
+	(repo_dir / "README.rst").write_text("Hello world\n")
+
+	committer = f"Bot <{_email}>".encode("UTF-8")
+
+	with Repo.init(os.fspath(repo_dir)) as repo:
+		dulwich.porcelain.add(repo, [os.fspath(repo_dir / "README.rst")])
+		unsigned = dulwich.porcelain.commit(repo, b"Initial commit", author=committer, committer=committer)
+
+		signed = sign_head(repo, signer)
+		assert signed is not None
+		assert signed != unsigned
+		assert repo.head() == signed
+
+		# Only the signature differs.
+		commit, original = repo[signed], repo[unsigned]
+		assert commit.tree == original.tree
+		assert commit.message == original.message
+		assert commit.gpgsig.startswith(b"-----BEGIN SSH SIGNATURE-----")
+
+	process = subprocess.run(
+			[
+					"git",
+					"-c",
+					"gpg.format=ssh",
+					"-c",
+					f"gpg.ssh.allowedSignersFile={allowed_signers}",
+					"verify-commit",
+					"--verbose",
+					"HEAD",
+					],
+			cwd=repo_dir,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.STDOUT,
+			text=True,
+			)
+
+	assert process.returncode == 0, process.stdout
+	assert f'Good "git" signature for {_email}' in process.stdout
+
+
+def test_unsupported_key():
+	with pytest.raises(ValueError, match="Unsupported key type"):
+		SSHSigner(_private_key("ecdsa"))
+
+
+def test_get_signer(monkeypatch):
+	private_key = _private_key("ed25519")
+	monkeypatch.delenv("RH_BOT_SIGNING_KEY_PATH", raising=False)
+	monkeypatch.delenv("RH_BOT_SIGNING_KEY_PASSWORD", raising=False)
+
+	get_signer.cache_clear()
+	monkeypatch.delenv("RH_BOT_SIGNING_KEY", raising=False)
+	assert get_signer() is None
+
+	get_signer.cache_clear()
+	monkeypatch.setenv("RH_BOT_SIGNING_KEY", private_key.decode("UTF-8"))
+
+	try:
+		signer = get_signer()
+		assert signer is not None
+		assert signer.public_key == SSHSigner(private_key).public_key
+
+		# The key is only loaded once.
+		assert get_signer() is signer
+	finally:
+		get_signer.cache_clear()
@@ -0,0 +1,135 @@
+# stdlib
+import json
+import time
+from typing import Dict, List
+
+# 3rd party
+import pytest
+
+# this package
+from repo_helper_bot import sweep
+from repo_helper_bot.db import RepositoryState, Rollout
+from repo_helper_bot.sweep import RemoteState, needs_update, plan_sweep
+
+_HEAD = "a" * 40
+
+
+def _remote(**kwargs) -> RemoteState:
+	return RemoteState(**{"head_sha": _HEAD, "config_sha": "b" * 40, "pr_open": False, **kwargs})
+
+
+def _stored(**kwargs) -> RepositoryState:
+	defaults = {"repo_id": 1, "head_sha": _HEAD, "repo_helper_version": "1.0.0", "pr_open": False}
+	return RepositoryState(**{**defaults, **kwargs})
+
+
+def test_needs_update_unchanged():
+	assert not needs_update(_remote(), _stored(), "1.0.0")
+
+
+def test_needs_update_never_updated():
+	assert needs_update(_remote(), None, "1.0.0")
+
+
+@pytest.mark.parametrize(
+		"remote",
+		[
+				pytest.param(_remote(is_archived=True), id="archived"),
+				pytest.param(_remote(config_sha=None), id="no_config"),
+				pytest.param(_remote(head_sha=None), id="empty"),
+				],
+		)
+def test_needs_update_never(remote: RemoteState):
+	assert not needs_update(remote, None, "1.0.0")
+	assert not needs_update(remote, _stored(head_sha="c" * 40), "2.0.0")
+
+
+def test_needs_update_new_commit():
+	assert needs_update(_remote(head_sha="c" * 40), _stored(), "1.0.0")
+
+
+def test_needs_update_new_version():
+	assert needs_update(_remote(), _stored(), "2.0.0")
+
+
+def test_needs_update_default_version(monkeypatch):
+	monkeypatch.setattr(sweep, "get_repo_helper_version", lambda: "2.0.0")
+	assert needs_update(_remote(), _stored())
+	assert not needs_update(_remote(), _stored(repo_helper_version="2.0.0"))
+
+
+def test_needs_update_pull_request():
+	# The pull request was closed without being merged, or opened by hand.
+	assert needs_update(_remote(pr_open=False), _stored(pr_open=True), "1.0.0")
+	assert needs_update(_remote(pr_open=True), _stored(pr_open=False), "1.0.0")
+
+	# Unknown, e.g. for states recorded before pull requests were tracked.
+	assert not needs_update(_remote(pr_open=True), _stored(pr_open=None), "1.0.0")
+
+
+def _repository(repo_id: int, owner: str = "octocat") -> Dict:
+	return {"id": repo_id, "full_name": f"{owner}/repo-{repo_id}", "owner": {"login": owner}}
+
+
+@pytest.fixture()
+def installations(database, monkeypatch) -> List[List[Dict]]:
+	installations = [[_repository(i) for i in range(1, 6)], [_repository(i, "hubot") for i in range(6, 11)]]
+	remote_states = {i: _remote() for i in range(1, 11)}
+
+	monkeypatch.setattr(sweep, "iter_installation_repos", lambda: iter(installations))
+	monkeypatch.setattr(sweep, "fetch_remote_state", lambda repositories: remote_states)
+	monkeypatch.setattr(sweep, "get_repo_helper_version", lambda: "1.0.0")
+
+	return installations
+
+
+def _store(database, *repo_ids: int, version: str = "1.0.0") -> None:
+	for repo_id in repo_ids:
+		database.session.add(_stored(repo_id=repo_id, repo_helper_version=version))
+
+	database.session.commit()
+
+
+def _planned() -> List[int]:
+	return [repository["id"] for repository in plan_sweep()]
+
+
+def test_plan_sweep(database, installations):
+	_store(database, 1, 2, 3, 6, 7)
+	assert _planned() == [4, 5, 8, 9, 10]
+
+
+def test_plan_sweep_missing_remote_state(database, installations, monkeypatch):
+	# e.g. the repository was deleted since the installation's repositories were listed.
+	monkeypatch.setattr(sweep, "fetch_remote_state", lambda repositories: {})
+	assert _planned() == []
+
+
+def test_plan_sweep_limits_version_updates(database, installations, monkeypatch):
+	monkeypatch.setattr(sweep, "MAX_VERSION_UPDATES", 3)
+	_store(database, *range(1, 9), version="0.9.0")
+
+	# Repositories which changed aren't limited, only those with a new version of repo_helper.
+	assert _planned() == [1, 2, 3, 9, 10]
+
+
+def test_plan_sweep_rollout(database, installations):
+	_store(database, *range(1, 11))
+
+	database.session.add(
+			Rollout(
+					requirement="repo_helper==2.0.0",
+					version="2.0.0",
+					steps="[0]",
+					cohort=json.dumps(["hubot"]),
+					created=time.time(),
+					step_started=time.time(),
+					min_runs=10,
+					min_success_rate=0.95,
+					min_step_duration=3600,
+					)
+			)
+	database.session.commit()
+
+	# Only the rollout's cohort is due the new version.
+	assert _planned() == [6, 7, 8, 9, 10]
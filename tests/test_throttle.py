@@ -0,0 +1,149 @@
+# stdlib
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, Iterator
+
+# 3rd party
+import pytest
+
+# this package
+from repo_helper_bot import throttle as throttle_module
+from repo_helper_bot.db import ThrottleEvent
+from repo_helper_bot.throttle import Throttle, check_throttle, record_pull_request
+
+_DAY = 24 * 60 * 60
+_repository = {"id": 1, "full_name": "octocat/hello-world", "owner": {"login": "octocat"}}
+
+
+def _utc(*args: int) -> float:
+	return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+def _event(database, created: float, scope: str = "repository", key: str = '1') -> None:
+	database.session.add(ThrottleEvent(scope=scope, key=key, created=created))
+	database.session.commit()
+
+
+@pytest.fixture()
+def local_timezone(monkeypatch) -> Iterator[None]:
+	# The windows are aligned to UTC, whatever the server's timezone.
+	monkeypatch.setenv("TZ", "Pacific/Auckland")
+	time.tzset()
+
+	try:
+		yield
+	finally:
+		monkeypatch.undo()
+		time.tzset()
+
+
+def test_daily_window_edges(database, local_timezone):
+	daily = Throttle("repository", window=_DAY, limit=1, cooldown=0)
+	_event(database, _utc(2021, 3, 1, 23, 59, 59))
+
+	throttled = daily.throttled_until('1', _utc(2021, 3, 1, 23, 59, 59, 500000))
+	assert throttled is not None
+	assert throttled[0] == _utc(2021, 3, 2)
+	assert "since 2021-03-01 00:00 UTC" in throttled[1]
+
+	# A new window starts at midnight UTC.
+	assert daily.throttled_until('1', _utc(2021, 3, 2)) is None
+
+
+def test_window_start_inclusive(database):
+	daily = Throttle("repository", window=_DAY, limit=1, cooldown=0)
+	_event(database, _utc(2021, 3, 2))
+
+	# An event at midnight counts towards the window which starts then.
+	assert daily.throttled_until('1', _utc(2021, 3, 2)) is not None
+	assert daily.throttled_until('1', _utc(2021, 3, 2, 23, 59, 59)) is not None
+	assert daily.throttled_until('1', _utc(2021, 3, 3)) is None
+
+
+def test_limit(database):
+	daily = Throttle("installation", window=_DAY, limit=3, cooldown=0)
+
+	for hour in range(2):
+		_event(database, _utc(2021, 3, 1, hour), scope="installation", key="octocat")
+
+	# Events from the previous window don't count.
+	_event(database, _utc(2021, 2, 28, 23), scope="installation", key="octocat")
+
+	assert daily.throttled_until("octocat", _utc(2021, 3, 1, 12)) is None
+
+	_event(database, _utc(2021, 3, 1, 2), scope="installation", key="octocat")
+	assert daily.throttled_until("octocat", _utc(2021, 3, 1, 12)) is not None
+
+	# Other keys are counted separately.
+	assert daily.throttled_until("hubot", _utc(2021, 3, 1, 12)) is None
+
+
+def test_cooldown(database):
+	# The cooldown isn't aligned to the windows, so it applies across midnight.
+	cooldown = Throttle("repository", window=_DAY, limit=0, cooldown=3600)
+	_event(database, _utc(2021, 3, 1, 23, 30))
+
+	throttled = cooldown.throttled_until('1', _utc(2021, 3, 2, 0, 15))
+	assert throttled is not None
+	assert throttled[0] == _utc(2021, 3, 2, 0, 30)
+
+	assert cooldown.throttled_until('1', _utc(2021, 3, 2, 0, 30)) is None
+
+
+def test_disabled():
+	assert not Throttle("repository", window=_DAY, limit=0, cooldown=0).enabled
+	assert Throttle("repository", window=_DAY, limit=1, cooldown=0).enabled
+	assert Throttle("repository", window=_DAY, limit=0, cooldown=60).enabled
+
+
+def test_key():
+	assert Throttle("repository", window=_DAY, limit=1, cooldown=0).key(_repository) == '1'
+	assert Throttle("installation", window=_DAY, limit=1, cooldown=0).key(_repository) == "octocat"
+
+
+@pytest.fixture()
+def clock(monkeypatch) -> Dict[str, float]:
+	clock = {"now": _utc(2021, 3, 1, 12)}
+
+	monkeypatch.setattr(throttle_module, "time", SimpleNamespace(time=lambda: clock["now"]))
+	monkeypatch.setattr(throttle_module, "_throttled", {})
+	monkeypatch.setattr(
+			throttle_module,
+			"THROTTLES",
+			(
+					Throttle("repository", window=_DAY, limit=1, cooldown=0),
+					Throttle("installation", window=_DAY, limit=0, cooldown=0),
+					),
+			)
+
+	return clock
+
+
+def test_check_throttle(database, clock: Dict[str, float]):
+	assert check_throttle(_repository) is None
+
+	record_pull_request(_repository)
+	reason = check_throttle(_repository)
+	assert reason is not None
+	assert reason.startswith("Throttled octocat/hello-world: 1 pull request(s) already created for repository 1")
+
+	# Disabled throttles don't record anything.
+	assert ThrottleEvent.query.filter_by(scope="installation").count() == 0
+
+	# The throttle is remembered until it expires, then checked again.
+	clock["now"] = _utc(2021, 3, 1, 23, 59, 59)
+	assert check_throttle(_repository) == reason
+
+	clock["now"] = _utc(2021, 3, 2)
+	assert check_throttle(_repository) is None
+
+
+def test_record_pull_request_forgets_expired(database, clock: Dict[str, float]):
+	_event(database, _utc(2021, 2, 27, 12))
+	_event(database, _utc(2021, 2, 28, 13))
+
+	record_pull_request(_repository)
+
+	# Only events older than the window are forgotten.
+	assert sorted(event.created for event in ThrottleEvent.query) == [_utc(2021, 2, 28, 13), clock["now"]]
@@ -0,0 +1,93 @@
+# stdlib
+from typing import Dict, List
+
+# 3rd party
+import dulwich.porcelain
+import pytest
+from domdf_python_tools.paths import PathPlus
+from dulwich.repo import Repo
+
+# this package
+from repo_helper_bot import updater
+from repo_helper_bot.constants import BRANCH_NAME
+from repo_helper_bot.db import RepositoryState
+from repo_helper_bot.retry import CircuitOpen
+from repo_helper_bot.updater import _skip_update, has_open_pull_request, is_bot_commit
+from repo_helper_bot.utils import commit_as_bot
+
+_bot = f"{commit_as_bot.name} <{commit_as_bot.email}>".encode("UTF-8")
+_user = b"Joe Bloggs <joe@example.com>"
+_repository = {"id": 1, "full_name": "octocat/hello-world", "owner": {"login": "octocat"}}
+
+
+class FakeRepository:
+
+	def __init__(self, open_pull_requests: List[str]):
+		self.open_pull_requests = open_pull_requests
+		self.calls: List[Dict] = []
+
+	def pull_requests(self, **kwargs):
+		self.calls.append(kwargs)
+		return iter(self.open_pull_requests if kwargs["state"] == "open" else [])
+
+
+@pytest.fixture()
+def repo(tmp_pathplus: PathPlus) -> Repo:
+	(tmp_pathplus / "README.rst").write_text("Hello world\n")
+	repo = dulwich.porcelain.init(tmp_pathplus)
+	dulwich.porcelain.add(repo, [str(tmp_pathplus / "README.rst")])
+	return repo
+
+
+@pytest.mark.parametrize("author, expected", [(_bot, True), (_user, False)])
+def test_is_bot_commit(repo: Repo, author: bytes, expected: bool):
+	sha = dulwich.porcelain.commit(repo, message=b"Update files", author=author, committer=author)
+	assert is_bot_commit(repo, sha) is expected
+
+
+def test_is_bot_commit_committer(repo: Repo):
+	# Only the author counts, e.g. when someone rebases the bot's commit.
+	sha = dulwich.porcelain.commit(repo, message=b"Update files", author=_user, committer=_bot)
+	assert not is_bot_commit(repo, sha)
+
+
+def test_is_bot_commit_not_a_commit(repo: Repo):
+	sha = dulwich.porcelain.commit(repo, message=b"Update files", author=_bot, committer=_bot)
+	assert not is_bot_commit(repo, repo[sha].tree)
+
+
+@pytest.mark.parametrize("open_pull_requests, expected", [(["#1"], True), ([], False)])
+def test_has_open_pull_request(open_pull_requests: List[str], expected: bool):
+	github_repo = FakeRepository(open_pull_requests)
+
+	assert has_open_pull_request(github_repo, "octocat") is expected
+	assert github_repo.calls == [{"state": "open", "head": f"octocat:{BRANCH_NAME}", "number": 1}]
+
+
+@pytest.mark.parametrize("open_pull_requests, expected", [(["#1"], True), ([], False)])
+def test_skip_update_records_pull_request(database, open_pull_requests: List[str], expected: bool):
+	# The recorded state is left as it was by the last update, so a pull request closed since is noticed.
+	database.session.add(RepositoryState(repo_id=1, head_sha="a" * 40, repo_helper_version="1.0.0", pr_open=True))
+	database.session.commit()
+
+	github_repo = FakeRepository(open_pull_requests)
+	result = _skip_update(_repository, github_repo, "b" * 40, "2.0.0", msg="Up to date")
+	assert (result.ret, result.msg) == (1, "Up to date")
+
+	state = RepositoryState.query.populate_existing().get(1)
+	assert (state.head_sha, state.repo_helper_version, state.pr_open) == ("b" * 40, "2.0.0", expected)
+
+
+def test_skip_update_unknown_pull_request(database, monkeypatch):
+
+	def with_retries(*args, **kwargs):
+		raise CircuitOpen("The GitHub API is unavailable.")
+
+	monkeypatch.setattr(updater, "with_retries", with_retries)
+
+	result = _skip_update(_repository, FakeRepository([]), "b" * 40, "2.0.0", msg="Up to date")
+	assert result.ret == 1
+	assert isinstance(result.exception, CircuitOpen)
+
+	# Nothing is recorded, so the next sweep tries again.
+	assert RepositoryState.query.get(1) is None